@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+キーワード判定のマイクロベンチマーク
+従来の `any(k in text for k in [...])` の連鎖と共有の KeywordMatcher（Aho-Corasick法）を
+同じキーワード表とメッセージで比較し、1メッセージあたりの処理時間（マイクロ秒）を表示する
+"""
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from utils.keyword_matcher import KeywordMatcher
+
+# メール送信判定・診療報酬分析・病床管理・薬剤チェックで使っているキーワード表
+KEYWORD_TABLE = {
+    "email": ["メール", "送信", "送って", "連絡", "報告", "通知", "お知らせ", "共有", "転送", "配信"],
+    "tanaka_email": ["田中さんにメール", "田中さんに連絡", "田中さんに報告", "田中にメール", "田中に連絡"],
+    "password": ["パスワード", "ログイン", "ログインできない", "侍", "販売管理ソフト", "システム"],
+    "followup": ["もう一度メール送って", "再度メール送信", "メール再送", "もう一回送って", "再送して"],
+    "returns": ["返戻", "返戻率", "処置", "疾患コード", "返戻理由"],
+    "assessment": ["査定", "減点", "審査"],
+    "occupancy": ["稼働率", "占床率", "ベッド", "病床"],
+    "los": ["在院日数", "平均在院", "los", "滞在"],
+    "medication_check": [
+        "チェック", "確認", "処方", "投薬", "薬", "相互作用", "副作用",
+        "ワーファリン", "ワルファリン", "ロセフィン", "セフトリアキソン",
+        "メトグルコ", "メトホルミン", "大丈夫", "安全"
+    ]
+}
+
+MESSAGES = [
+    "有給休暇の申請方法を教えてください",
+    "こんにちは",
+    "官需課の高見の今期の売り上げは？",
+    "田中さんに侍のパスワードリセットをメールで送って",
+    "患者A2024-0001にワーファリン5mgを処方して大丈夫？",
+    "今月の返戻率と査定の傾向を分析して",
+    "複合機のトナー交換のやり方を詳しく教えてください。TASKalfa 2553ciを使っています。" * 3,
+]
+
+def scan_with_any(text: str) -> set:
+    """従来の方式：ラベルごとにキーワードを1つずつ部分文字列検索する"""
+    return {label for label, keywords in KEYWORD_TABLE.items() if any(keyword in text for keyword in keywords)}
+
+def measure(function, text: str, number: int) -> float:
+    """1回あたりの処理時間（マイクロ秒）"""
+    return min(timeit.repeat(lambda: function(text), number=number, repeat=5)) / number * 1e6
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+
+    matcher = KeywordMatcher(KEYWORD_TABLE)
+    keyword_count = sum(len(keywords) for keywords in KEYWORD_TABLE.values())
+    print(f"🔍 キーワード {keyword_count}件 / ラベル {len(KEYWORD_TABLE)}件 / 各 {number}回")
+    print(f"{'メッセージ':<24} {'any()連鎖':>10} {'Matcher':>10}  ラベル")
+
+    totals = [0.0, 0.0]
+    for text in MESSAGES:
+        expected = scan_with_any(text)
+        if matcher.labels(text) != expected:
+            print(f"❌ 判定結果が一致しません: {text[:20]}")
+            sys.exit(1)
+        timings = [
+            measure(scan_with_any, text, number),
+            measure(matcher.labels, text, number),
+        ]
+        totals = [total + timing for total, timing in zip(totals, timings)]
+        label = text[:20] + ("…" if len(text) > 20 else "")
+        print(f"{label:<24} {timings[0]:>8.2f}us {timings[1]:>8.2f}us  {sorted(expected)}")
+
+    print(f"{'合計':<24} {totals[0]:>8.2f}us {totals[1]:>8.2f}us")
+    print(f"✅ KeywordMatcher は any()連鎖の {totals[0] / totals[1]:.1f}倍の速さです")
+
+if __name__ == "__main__":
+    main()
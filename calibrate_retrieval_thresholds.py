@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+DB→Web検索フォールバック用の距離閾値を校正する
+社内DBで回答できる質問とWeb検索に回すべき質問の最良L2距離を比較し、閾値の目安を表示する
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from langchain_openai import OpenAIEmbeddings
+from langchain_community.vectorstores import FAISS
+
+# インデックスごとの校正用質問（DBで回答できる質問, Web検索に回すべき質問）
+CALIBRATION_QUERIES = {
+    "office": (
+        "src/faiss_index_office",
+        ["有給申請の方法は？", "経費精算のルールは？", "交通費の申請方法", "就業規則について教えて"],
+        ["TASKalfaのトナー交換方法", "プリンターの設定方法", "今日の天気は？", "コピー機の紙詰まりの直し方"]
+    ),
+    "procedures": (
+        "src/faiss_index_procedures",
+        ["有給休暇の申請手順", "出張申請の流れ", "備品購入の手続き"],
+        ["MX-2650のインク交換", "Wi-Fiの設定方法", "おすすめのランチは？"]
+    ),
+    "sales": (
+        "src/faiss_index_sales",
+        ["官需課の高見の今期の売り上げは？", "辻川さんの実績は？", "RISOの販売台数"],
+        ["トナーの交換方法", "明日の天気", "有給申請の方法は？"]
+    ),
+}
+
+def best_distance(vectorstore, query: str) -> float:
+    """質問に対する最良（最小）L2距離を取得"""
+    results = vectorstore.similarity_search_with_score(query, k=3)
+    return min(float(score) for _, score in results) if results else float("inf")
+
+def calibrate():
+    """各インデックスの距離分布を表示し、閾値の目安を算出"""
+    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+    
+    for index_name, (path, in_domain, out_of_domain) in CALIBRATION_QUERIES.items():
+        print(f"\n📊 インデックス: {index_name} ({path})")
+        if not os.path.exists(path):
+            print(f"❌ データベースが見つかりません: {path}")
+            continue
+        
+        vectorstore = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+        
+        in_scores = []
+        for query in in_domain:
+            score = best_distance(vectorstore, query)
+            in_scores.append(score)
+            print(f"  ✅ DB回答可能  {score:.3f}  {query}")
+        
+        out_scores = []
+        for query in out_of_domain:
+            score = best_distance(vectorstore, query)
+            out_scores.append(score)
+            print(f"  🔍 Web検索対象 {score:.3f}  {query}")
+        
+        worst_in = max(in_scores)
+        best_out = min(out_scores)
+        suggested = (worst_in + best_out) / 2
+        print(f"  DB回答可能の最大距離: {worst_in:.3f} / Web検索対象の最小距離: {best_out:.3f}")
+        if worst_in < best_out:
+            print(f"  💡 推奨閾値: RAG_MAX_DISTANCE_{index_name.upper()}={suggested:.2f}")
+        else:
+            print(f"  ⚠️ 分布が重なっています。校正用の質問を見直してください（中間値: {suggested:.2f}）")
+
+if __name__ == "__main__":
+    calibrate()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+検索モードのオフライン評価
+固定k件と適応型top-kで、正解ファイルの再現率とプロンプトのトークン数を比較する
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from services.rag_service import RAGService
+
+# (インデックス, 質問, 正解の元ファイル名に含まれる文字列)
+EVALUATION_SET = [
+    ("office", "有給休暇は何日もらえますか？", "leave_policy"),
+    ("office", "経費精算のルールは？", "expense_policy"),
+    ("office", "通勤手当の支給条件", "commuting_allowance"),
+    ("office", "育児休業の期間は？", "childcare_leave"),
+    ("office", "福利厚生にはどんなものがありますか", "welfare_benefits"),
+    ("office", "始業時刻と終業時刻を教えて", "work_regulations"),
+    ("procedures", "有給申請の方法は？", "leave"),
+    ("procedures", "経費精算の手順を教えて", "expense"),
+    ("procedures", "会議室の予約方法", "meeting_room"),
+    ("sales", "官需課の高見の今期の売り上げは？", "sales_meeting_data"),
+    ("sales", "辻川さんの実績は？", "sales_meeting_data"),
+]
+
+FIXED_K_VALUES = [1, 3]
+
+def evaluate_mode(rag_service: RAGService, mode: str, k: int = 3):
+    """1つの検索モードで評価セット全体を検索し、再現率と平均トークン数を返す"""
+    hits = 0
+    total_tokens = 0
+    total_chunks = 0
+    evaluated = 0
+
+    for index_name, question, expected_source in EVALUATION_SET:
+        vectorstore = getattr(rag_service, f"{index_name}_vectorstore")
+        if vectorstore is None:
+            continue
+
+        results = rag_service.retrieve(vectorstore, question, k=k, mode=mode)
+        sources = [doc.metadata.get("source", "") for doc, _ in results]
+        context = "\n\n".join(doc.page_content for doc, _ in results)
+
+        evaluated += 1
+        hits += any(expected_source in source for source in sources)
+        total_tokens += rag_service.context_builder.counter.count(context)
+        total_chunks += len(results)
+
+    if not evaluated:
+        return None
+    return {
+        "recall": hits / evaluated,
+        "avg_prompt_tokens": total_tokens / evaluated,
+        "avg_chunks": total_chunks / evaluated,
+        "questions": evaluated
+    }
+
+def main():
+    """固定k件と適応型の評価結果を表形式で表示"""
+    print("🔍 検索モードの評価を開始します...")
+    rag_service = RAGService()
+    rag_service.setup_vectorstores()
+
+    rows = [(f"fixed k={k}", evaluate_mode(rag_service, "fixed", k)) for k in FIXED_K_VALUES]
+    rows.append(("adaptive", evaluate_mode(rag_service, "adaptive")))
+
+    print("\n📊 評価結果")
+    print(f"{'モード':<12} {'再現率':>8} {'平均トークン':>12} {'平均チャンク数':>14} {'質問数':>6}")
+    for name, result in rows:
+        if result is None:
+            print(f"{name:<12} 評価できるインデックスがありません")
+            continue
+        print(f"{name:<12} {result['recall']:>8.1%} {result['avg_prompt_tokens']:>12.0f} "
+              f"{result['avg_chunks']:>14.2f} {result['questions']:>6}")
+
+if __name__ == "__main__":
+    main()
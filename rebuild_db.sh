@@ -9,9 +9,8 @@ cd /Users/akamatsu/Desktop/ai-agent
 # 仮想環境を有効化
 source venv/bin/activate
 
-# データベース再構築実行
-python setup_vector_db.py
+# 新しいバージョンにデータベースを再構築し、成功したら稼働中のバージョンを切り替える
+python setup_vector_db.py --publish || { echo "❌ データベース再構築に失敗しました（再実行するとチェックポイントから再開します）"; exit 1; }
 
 echo "✅ データベース再構築完了"
-echo "💡 次にサーバーを再起動してください："
-echo "   cd src && uvicorn main:app --host 0.0.0.0 --port 8000 --reload"
+echo "💡 稼働中のサーバーはCURRENTの監視または /admin/indexes/reload で新しいバージョンに切り替わります（再起動は不要です）"
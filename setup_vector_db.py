@@ -1,138 +1,105 @@
 # setup_vector_db.py (事務作業専用秘書エージェント版)
 import os
 import sys
+import argparse
 from dotenv import load_dotenv
 
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
 # srcフォルダをパスに追加
-sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
 
 # 必要なクラスをインポート
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import TextLoader, DirectoryLoader
+from config import Config
+from services.embedding_cache import CachedEmbeddings
+from services.index_builder import INDEX_TARGETS, IncrementalIndexBuilder
+from services.index_versions import IndexVersionStore
 
-def build_and_save_dbs():
+def build_and_save_dbs(index_names=None, batch_size: int = 64, max_workers: int = 4, checkpoint_every: int = 5,
+                       publish: bool = False) -> bool:
     """
-    ベクトルデータベースを構築し、ローカルに保存するスクリプト (事務作業専用版)
+    ベクトルデータベースを差分ビルドし、ローカルに保存するスクリプト (事務作業専用版)
+
+    変更のないチャンクは再埋め込みせず、削除されたチャンクはインデックスから取り除く。
+    中断した場合は再実行すると保存済みのチェックポイントから続きを処理する。
+    publish=True の場合は稼働中のバージョンをコピーした新しいバージョンディレクトリにビルドし、
+    成功したらCURRENTを切り替える（稼働中のサーバーはCURRENTの監視または /admin/indexes/reload で無停止で切り替わる）
     """
     print("事務作業専用AIアシスタントのデータベースを構築します...")
-    
+
     # スクリプトのディレクトリを取得
     script_dir = os.path.dirname(os.path.abspath(__file__))
     os.chdir(script_dir)  # 作業ディレクトリをスクリプトの場所に変更
-    
-    # OpenAIのEmbeddingモデルを指定
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
 
-    try:
-        # --- 販売会議資料データベースの構築 ---
-        print("\n--- 販売会議資料データベースの構築を開始 ---")
-        print("FAISS(販売会議資料)を初期化中...")
-        
-        # 販売会議資料データを読み込み
-        sales_data_path = "data/sales_meeting_data.txt"
-        if os.path.exists(sales_data_path):
-            loader_sales = TextLoader(sales_data_path, encoding='utf-8')
-            docs_sales = loader_sales.load()
-            
-            text_splitter_sales = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=100
-            )
-            texts_sales = text_splitter_sales.split_documents(docs_sales)
-            
-            for i, doc in enumerate(texts_sales, 1):
-                print(f"  -> 販売会議資料 チャンク {i}/{len(texts_sales)} を追加しました。")
-            
-            db_sales = FAISS.from_documents(texts_sales, embeddings)
-            db_sales.save_local("faiss_index_sales")
-            print("✅ 販売会議資料データベースを 'faiss_index_sales' フォルダに保存しました。")
-        else:
-            print("❌ 販売会議資料データが見つかりませんでした。")
-
-        # --- 事務規定データベースの構築 ---
-        print("\n--- 事務規定データベースの構築を開始 ---")
-        print("FAISS(事務規定)を初期化中...")
-        
-        loader_office = DirectoryLoader(
-            "src/data/office_docs/", 
-            glob="**/*.md", 
-            loader_cls=TextLoader, 
-            loader_kwargs={'encoding': 'utf-8'}
-        )
-        docs_office = loader_office.load()
-        
-        if docs_office:
-            text_splitter_office = RecursiveCharacterTextSplitter(
-                chunk_size=1000, 
-                chunk_overlap=100
-            )
-            texts_office = text_splitter_office.split_documents(docs_office)
-            
-            for i, doc in enumerate(texts_office, 1):
-                print(f"  -> 事務規定文書 {i}/{len(texts_office)} を追加しました。")
-            
-            db_office = FAISS.from_documents(texts_office, embeddings)
-            db_office.save_local("faiss_index_office")
-            print("✅ 事務規定データベースを 'faiss_index_office' フォルダに保存しました。")
-        else:
-            print("❌ 事務規定文書が見つかりませんでした。")
-
-        # --- 手続きガイドデータベースの構築 ---
-        print("\n--- 手続きガイドデータベースの構築を開始 ---")
-        print("FAISS(手続きガイド)を初期化中...")
-        
-        # Markdownファイルを読み込み
-        loader_procedures_md = DirectoryLoader(
-            "src/data/procedures_docs/", 
-            glob="**/*.md", 
-            loader_cls=TextLoader, 
-            loader_kwargs={'encoding': 'utf-8'}
-        )
-        docs_procedures_md = loader_procedures_md.load()
-        
-        # テキストファイルも読み込み
-        loader_procedures_txt = DirectoryLoader(
-            "data/procedures/", 
-            glob="**/*.txt", 
-            loader_cls=TextLoader, 
-            loader_kwargs={'encoding': 'utf-8'}
-        )
-        docs_procedures_txt = loader_procedures_txt.load()
-        
-        # 両方のドキュメントを結合
-        docs_procedures = docs_procedures_md + docs_procedures_txt
-        
-        if docs_procedures:
-            text_splitter_procedures = RecursiveCharacterTextSplitter(
-                chunk_size=1000, 
-                chunk_overlap=100
-            )
-            texts_procedures = text_splitter_procedures.split_documents(docs_procedures)
-            
-            for i, doc in enumerate(texts_procedures, 1):
-                print(f"  -> 手続きガイド文書 {i}/{len(texts_procedures)} を追加しました。")
-            
-            db_procedures = FAISS.from_documents(texts_procedures, embeddings)
-            db_procedures.save_local("faiss_index_procedures")
-            print("✅ 手続きガイドデータベースを 'faiss_index_procedures' フォルダに保存しました。")
+    # OpenAIのEmbeddingモデルを指定（変更のないチャンクはキャッシュから再利用）
+    embeddings = CachedEmbeddings(
+        OpenAIEmbeddings(model="text-embedding-3-small"),
+        max_entries=Config.EMBEDDING_CACHE_MAX_ENTRIES,
+        db_path=Config.EMBEDDING_CACHE_DB_PATH
+    )
+    builder = IncrementalIndexBuilder(
+        embeddings,
+        batch_size=batch_size,
+        max_workers=max_workers,
+        checkpoint_every=checkpoint_every
+    )
+
+    version_store = IndexVersionStore(Config.VECTORSTORE_VERSIONS_DIR, keep=Config.VECTORSTORE_KEEP_VERSIONS)
+    version = None
+    if publish:
+        # 中断した未公開のバージョンがあればそのチェックポイントから再開する
+        version = version_store.latest_unpublished()
+        if version:
+            print(f"♻️ 未公開のバージョン {version} のビルドを再開します")
         else:
-            print("❌ 手続きガイド文書が見つかりませんでした。")
-        
+            version = version_store.create_version()
+            print(f"📦 新しいインデックスのバージョンにビルドします: {version}")
+    output_root = version_store.path(version) if version else "."
+
+    success = True
+    try:
+        for index_name in index_names or list(INDEX_TARGETS):
+            success = builder.build(index_name, os.path.join(output_root, INDEX_TARGETS[index_name][0])) and success
+
+        if version:
+            if success:
+                version_store.publish(version)
+                version_store.prune()
+            else:
+                print(f"⚠️ ビルドに失敗したため {version} は公開しません")
+
         print("\n🎉 事務作業専用AIアシスタントのデータベース構築が完了しました！")
         print("\n📋 構築されたデータベース:")
         print("  - faiss_index_sales (販売会議資料)")
         print("  - faiss_index_office (事務規定)")
         print("  - faiss_index_procedures (手続きガイド - MD & TXTファイル含む)")
+        print("  - faiss_index_unified (統合 - collection/source/versionメタデータ付き)")
+
+        cache_stats = embeddings.get_stats()
+        print(f"\n📦 埋め込みキャッシュ: API呼び出し {cache_stats['api_calls']}回, ヒット率 {cache_stats['hit_rate']:.1%}")
 
     except Exception as e:
         print(f"\n❌ エラーが発生しました: {e}")
+        print("💡 もう一度実行すると、保存済みのチェックポイントから再開します。")
         import traceback
         traceback.print_exc()
+        return False
+
+    return success
 
 if __name__ == "__main__":
-    build_and_save_dbs()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="ベクトルデータベースの差分ビルド")
+    parser.add_argument("indexes", nargs="*", help=f"ビルドするインデックス {list(INDEX_TARGETS)}（省略時はすべて）")
+    parser.add_argument("--batch-size", type=int, default=64, help="1回のAPI呼び出しで埋め込むチャンク数")
+    parser.add_argument("--workers", type=int, default=4, help="同時に実行する埋め込みバッチ数")
+    parser.add_argument("--checkpoint-every", type=int, default=5, help="チェックポイントを保存するバッチ間隔")
+    parser.add_argument("--publish", action="store_true", help="新しいバージョンディレクトリにビルドして稼働中のバージョンを切り替える")
+    args = parser.parse_args()
+    unknown = [name for name in args.indexes if name not in INDEX_TARGETS]
+    if unknown:
+        parser.error(f"不明なインデックス: {unknown}")
+
+    ok = build_and_save_dbs(args.indexes, args.batch_size, args.workers, args.checkpoint_every, args.publish)
+    sys.exit(0 if ok else 1)
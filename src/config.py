@@ -20,4 +20,141 @@ class Config:
     N8N_WEBHOOK_URL = os.getenv('N8N_WEBHOOK_URL', '')  # デフォルト値を空文字に設定
     
     # Web検索API設定
-    SERPER_API_KEY = os.getenv('SERPER_API_KEY')  # Serper API（Google検索）
\ No newline at end of file
+    SERPER_API_KEY = os.getenv('SERPER_API_KEY')  # Serper API（Google検索）
+    
+    # Webhookイベント処理設定（ユーザー単位で順序保証、ユーザー間は並列処理）
+    WEBHOOK_WORKER_COUNT = int(os.getenv('WEBHOOK_WORKER_COUNT', '4'))  # 同時処理数の上限
+    WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '100'))  # 全ユーザー合計の未処理イベント上限
+    WEBHOOK_SHUTDOWN_TIMEOUT = float(os.getenv('WEBHOOK_SHUTDOWN_TIMEOUT', '30'))
+    
+    # Webhook重複排除設定（LINEの再送による二重処理防止）
+    WEBHOOK_DEDUP_MAX_ENTRIES = int(os.getenv('WEBHOOK_DEDUP_MAX_ENTRIES', '10000'))
+    WEBHOOK_DEDUP_TTL_SECONDS = float(os.getenv('WEBHOOK_DEDUP_TTL_SECONDS', '86400'))
+    WEBHOOK_DEDUP_DB_PATH = os.getenv('WEBHOOK_DEDUP_DB_PATH', '')  # 空文字の場合はメモリのみ
+    
+    # 質問分類設定（ローカル高速分類器）
+    ROUTER_LOCAL_ENABLED = os.getenv('ROUTER_LOCAL_ENABLED', 'true').lower() == 'true'
+    ROUTER_LOCAL_MIN_SCORE = float(os.getenv('ROUTER_LOCAL_MIN_SCORE', '2.0'))
+    ROUTER_LOCAL_MIN_MARGIN = float(os.getenv('ROUTER_LOCAL_MIN_MARGIN', '1.5'))
+    ROUTER_LOCAL_MAX_LENGTH = int(os.getenv('ROUTER_LOCAL_MAX_LENGTH', '80'))
+    ROUTER_LOCAL_SHADOW_RATE = float(os.getenv('ROUTER_LOCAL_SHADOW_RATE', '0.05'))  # LLMとの一致率計測のサンプリング率
+    
+    # 質問分類キャッシュ設定
+    ROUTER_CACHE_MAX_ENTRIES = int(os.getenv('ROUTER_CACHE_MAX_ENTRIES', '2000'))
+    ROUTER_CACHE_TTL_SECONDS = float(os.getenv('ROUTER_CACHE_TTL_SECONDS', '21600'))
+    ROUTER_PROMPT_VERSION = os.getenv('ROUTER_PROMPT_VERSION', '1')  # 分類基準を変えた場合に更新するとキャッシュが無効化される
+    
+    # DB→Web検索フォールバック判定（FAISSのL2距離の上限。超えた場合はLLMを呼ばずにWeb検索）
+    # 既定は未設定（距離では判定せず、従来どおり生成した回答の内容でフォールバックする）
+    # 値は calibrate_retrieval_thresholds.py で実際のインデックスの距離分布から求めた推奨閾値を設定する
+    RAG_MAX_DISTANCE_OFFICE = float(os.getenv('RAG_MAX_DISTANCE_OFFICE')) if os.getenv('RAG_MAX_DISTANCE_OFFICE') else None
+    RAG_MAX_DISTANCE_PROCEDURES = float(os.getenv('RAG_MAX_DISTANCE_PROCEDURES')) if os.getenv('RAG_MAX_DISTANCE_PROCEDURES') else None
+    RAG_MAX_DISTANCE_SALES = float(os.getenv('RAG_MAX_DISTANCE_SALES')) if os.getenv('RAG_MAX_DISTANCE_SALES') else None
+    
+    # 埋め込みキャッシュ設定（同じテキストの再埋め込みを防ぐ）
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '5000'))  # メモリLRUの件数上限
+    EMBEDDING_CACHE_DB_PATH = os.getenv('EMBEDDING_CACHE_DB_PATH', 'data/embedding_cache.sqlite3')  # 空文字ならメモリのみ
+    
+    # 意味的回答キャッシュ設定（言い換えの質問に保存済みの回答を返す）
+    ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() == 'true'
+    ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', '0.95'))  # コサイン類似度の下限
+    ANSWER_CACHE_TTL_SECONDS = float(os.getenv('ANSWER_CACHE_TTL_SECONDS', '3600'))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '500'))  # カテゴリごとの件数上限
+    
+    # ベクトルデータベース読み込み設定
+    VECTORSTORE_LAZY_LOAD = os.getenv('VECTORSTORE_LAZY_LOAD', 'false').lower() == 'true'  # 初回検索時に読み込む
+    VECTORSTORE_MMAP = os.getenv('VECTORSTORE_MMAP', 'false').lower() == 'true'  # メモリマップで読み込みワーカー間でページを共有
+    VECTORSTORE_WARMUP = os.getenv('VECTORSTORE_WARMUP', '')  # 遅延読み込み時に先読みするインデックス（all または sales,office,procedures）
+    
+    # 統合ベクトルインデックス設定（sales/office/proceduresを1つのインデックスで管理）
+    RAG_UNIFIED_INDEX = os.getenv('RAG_UNIFIED_INDEX', 'false').lower() == 'true'
+    RAG_UNIFIED_FETCH_K = int(os.getenv('RAG_UNIFIED_FETCH_K', '40'))  # コレクション絞り込み前の候補数
+    
+    # インデックスのバージョン管理設定（無停止切り替え・ロールバック）
+    VECTORSTORE_VERSIONS_DIR = os.getenv('VECTORSTORE_VERSIONS_DIR', 'index_versions')  # CURRENTがなければ従来のfaiss_index_*を使用
+    VECTORSTORE_KEEP_VERSIONS = int(os.getenv('VECTORSTORE_KEEP_VERSIONS', '3'))  # ロールバック用に保持する世代数
+    VECTORSTORE_WATCH_INTERVAL = float(os.getenv('VECTORSTORE_WATCH_INTERVAL', '30'))  # CURRENT監視間隔（秒、0で無効）
+    
+    # 管理用エンドポイントの認証トークン（未設定なら管理用エンドポイントは無効）
+    ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN', '')
+    
+    # RAGコンテキストのトークン予算（カテゴリ別）
+    RAG_CONTEXT_BUDGET_OFFICE = int(os.getenv('RAG_CONTEXT_BUDGET_OFFICE', '1500'))
+    RAG_CONTEXT_BUDGET_PROCEDURES = int(os.getenv('RAG_CONTEXT_BUDGET_PROCEDURES', '1500'))
+    RAG_CONTEXT_BUDGET_SALES = int(os.getenv('RAG_CONTEXT_BUDGET_SALES', '2000'))
+    RAG_CONTEXT_BUDGET_DETAILED_SALES = int(os.getenv('RAG_CONTEXT_BUDGET_DETAILED_SALES', '2500'))
+    RAG_CONTEXT_BUDGET_HISTORY = int(os.getenv('RAG_CONTEXT_BUDGET_HISTORY', '800'))  # 会話履歴（最新の発言を優先）
+    
+    # 検索モード設定（fixed: 固定k件 / adaptive: スコア分布に応じて件数を調整）
+    RAG_RETRIEVAL_MODE = os.getenv('RAG_RETRIEVAL_MODE', 'fixed')
+    RAG_ADAPTIVE_CANDIDATES = int(os.getenv('RAG_ADAPTIVE_CANDIDATES', '8'))  # スコア付きで取得する候補数
+    RAG_ADAPTIVE_MAX_K = int(os.getenv('RAG_ADAPTIVE_MAX_K', '6'))
+    RAG_ADAPTIVE_DOMINANCE_GAP = float(os.getenv('RAG_ADAPTIVE_DOMINANCE_GAP', '0.15'))  # 1位と2位の距離差がこれ以上なら1件のみ
+    RAG_ADAPTIVE_FLAT_WINDOW = float(os.getenv('RAG_ADAPTIVE_FLAT_WINDOW', '0.1'))  # 1位からこの距離差以内は横並びとして採用
+    RAG_ADAPTIVE_MAX_DISTANCE = float(os.getenv('RAG_ADAPTIVE_MAX_DISTANCE', '1.4'))  # これより遠い候補は採用しない
+    
+    # ハイブリッド検索設定（文字n-gram/BM25の語彙検索をベクトル検索とRRFで統合）
+    RAG_HYBRID_ENABLED = os.getenv('RAG_HYBRID_ENABLED', 'false').lower() == 'true'  # 有効時は初回検索で語彙インデックスを構築
+    RAG_HYBRID_LEXICAL_K = int(os.getenv('RAG_HYBRID_LEXICAL_K', '5'))  # 語彙検索の取得件数
+    RAG_HYBRID_RRF_K = int(os.getenv('RAG_HYBRID_RRF_K', '60'))  # Reciprocal Rank Fusionの減衰定数
+    
+    # Web検索の先行実行設定（DB検索と並行してSerper検索を開始し、不要なら破棄）
+    RAG_SPECULATIVE_WEB_ENABLED = os.getenv('RAG_SPECULATIVE_WEB_ENABLED', 'false').lower() == 'true'
+    # カテゴリ別の方針（off: 先行しない / borderline: Web向きの質問・境界付近のスコアのみ / always: 常に先行）
+    RAG_SPECULATIVE_POLICY = os.getenv('RAG_SPECULATIVE_POLICY', 'office:borderline,procedures:borderline')
+    RAG_SPECULATIVE_MARGIN = float(os.getenv('RAG_SPECULATIVE_MARGIN', '0.1'))  # 閾値からこの距離差以内を境界付近とみなす
+    RAG_SPECULATIVE_WORKERS = int(os.getenv('RAG_SPECULATIVE_WORKERS', '4'))
+    
+    # Web検索結果キャッシュ設定（正規化したクエリ単位、TTLはクエリの種類ごと）
+    WEB_SEARCH_CACHE_ENABLED = os.getenv('WEB_SEARCH_CACHE_ENABLED', 'true').lower() == 'true'
+    WEB_SEARCH_CACHE_DB_PATH = os.getenv('WEB_SEARCH_CACHE_DB_PATH', 'data/web_search_cache.sqlite3')  # 空ならメモリのみ
+    WEB_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('WEB_SEARCH_CACHE_MAX_ENTRIES', '1000'))
+    WEB_SEARCH_CACHE_TTL_MANUAL = float(os.getenv('WEB_SEARCH_CACHE_TTL_MANUAL', '604800'))  # 製品マニュアル・トナー交換など（7日）
+    WEB_SEARCH_CACHE_TTL_NEWS = float(os.getenv('WEB_SEARCH_CACHE_TTL_NEWS', '3600'))  # ニュース・価格など（1時間）
+    WEB_SEARCH_CACHE_TTL_DEFAULT = float(os.getenv('WEB_SEARCH_CACHE_TTL_DEFAULT', '86400'))  # その他（1日）
+    WEB_SEARCH_CACHE_STALE_SECONDS = float(os.getenv('WEB_SEARCH_CACHE_STALE_SECONDS', '86400'))  # TTL切れ後に古い結果を返しつつ再取得する猶予
+    
+    # 役割別のLLMモデル設定（小さいモデルに切り替えるのは分類・雑談・整形のみ。その他の役割は各サービスの従来のモデルと温度が既定値）
+    LLM_MODEL_ROUTER = os.getenv('LLM_MODEL_ROUTER', 'gpt-4o-mini')
+    LLM_TEMPERATURE_ROUTER = float(os.getenv('LLM_TEMPERATURE_ROUTER', '0.3'))
+    LLM_MODEL_CHAT = os.getenv('LLM_MODEL_CHAT', 'gpt-4o-mini')
+    LLM_TEMPERATURE_CHAT = float(os.getenv('LLM_TEMPERATURE_CHAT', '0.7'))
+    LLM_MODEL_RAG_ANSWER = os.getenv('LLM_MODEL_RAG_ANSWER', 'gpt-4o')
+    LLM_TEMPERATURE_RAG_ANSWER = float(os.getenv('LLM_TEMPERATURE_RAG_ANSWER', '0.7'))
+    LLM_MODEL_FORMATTER = os.getenv('LLM_MODEL_FORMATTER', 'gpt-4o-mini')
+    LLM_TEMPERATURE_FORMATTER = float(os.getenv('LLM_TEMPERATURE_FORMATTER', '0.3'))
+    LLM_MODEL_EMAIL_DRAFT = os.getenv('LLM_MODEL_EMAIL_DRAFT', 'gpt-4o')
+    LLM_TEMPERATURE_EMAIL_DRAFT = float(os.getenv('LLM_TEMPERATURE_EMAIL_DRAFT', '0.7'))
+    LLM_MODEL_ANALYSIS = os.getenv('LLM_MODEL_ANALYSIS', 'gpt-4o-mini')
+    LLM_TEMPERATURE_ANALYSIS = float(os.getenv('LLM_TEMPERATURE_ANALYSIS', '0'))
+    LLM_MODEL_REPORT = os.getenv('LLM_MODEL_REPORT', 'gpt-4o')
+    LLM_TEMPERATURE_REPORT = float(os.getenv('LLM_TEMPERATURE_REPORT', '0.3'))
+    LLM_MODEL_BILLING = os.getenv('LLM_MODEL_BILLING', 'gpt-4o')
+    LLM_TEMPERATURE_BILLING = float(os.getenv('LLM_TEMPERATURE_BILLING', '0.7'))
+    
+    # LLM応答キャッシュ設定（モデル設定とプロンプトが完全一致する呼び出しはAPIを呼ばない）
+    LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_DB_PATH = os.getenv('LLM_CACHE_DB_PATH', 'data/llm_cache.sqlite3')
+    LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))  # 合計サイズの上限（超えたら古い順に削除）
+    
+    # 外部連携のHTTP接続設定（宛先ごとにKeep-Aliveの接続プールを共有）
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))  # 1ホストあたりの最大接続数
+    HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))  # 接続エラー時のリトライ回数
+    HTTP_TIMEOUT_N8N = float(os.getenv('HTTP_TIMEOUT_N8N', '30'))
+    HTTP_TIMEOUT_SERPER = float(os.getenv('HTTP_TIMEOUT_SERPER', '10'))
+    HTTP_TIMEOUT_LINE = float(os.getenv('HTTP_TIMEOUT_LINE', '30'))
+    
+    # n8n送信のアウトボックス設定（送信はバックグラウンドで行い、失敗時は指数バックオフで再送）
+    N8N_OUTBOX_ENABLED = os.getenv('N8N_OUTBOX_ENABLED', 'true').lower() == 'true'
+    N8N_OUTBOX_DB_PATH = os.getenv('N8N_OUTBOX_DB_PATH', 'data/n8n_outbox.sqlite3')
+    N8N_OUTBOX_MAX_ATTEMPTS = int(os.getenv('N8N_OUTBOX_MAX_ATTEMPTS', '8'))  # これを超えたらデッドレターに移す
+    N8N_OUTBOX_BASE_DELAY = float(os.getenv('N8N_OUTBOX_BASE_DELAY', '5'))  # 1回目の再送までの秒数
+    N8N_OUTBOX_MAX_DELAY = float(os.getenv('N8N_OUTBOX_MAX_DELAY', '900'))  # 再送間隔の上限（秒）
+    N8N_OUTBOX_DEDUP_SECONDS = float(os.getenv('N8N_OUTBOX_DEDUP_SECONDS', '600'))  # 同じ送信の二重登録を無視する秒数
+    
+    # メール送信設定（自由記述メールのLLM下書きを返信後にバックグラウンドで行う）
+    EMAIL_DEFER_DRAFT = os.getenv('EMAIL_DEFER_DRAFT', 'true').lower() == 'true'
+    
+    # 会話履歴の保持上限（超過時は最終発言が最も古いユーザーの履歴から破棄）
+    CONVERSATION_MAX_USERS = int(os.getenv('CONVERSATION_MAX_USERS', '10000'))
+    CONVERSATION_MAX_BYTES = int(os.getenv('CONVERSATION_MAX_BYTES', str(50 * 1024 * 1024)))
@@ -1,5 +1,6 @@
 # src/main.py
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Header
+from typing import Optional
 from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError
 from linebot.models import MessageEvent, TextMessage, TextSendMessage, ImageMessage
@@ -24,15 +25,21 @@ from services.staff_training_service import StaffTrainingService
 from services.conversation_manager import ConversationManager
 from services.agent_service import OfficeAIAgent
 from services.shift_scheduling_service import ShiftSchedulingService
+from services.event_worker_pool import EventWorkerPool
+from services.event_dedup_cache import EventDedupCache
+from services.message_dispatcher import MessageDispatcher, answer_generator
 from utils.report_parser import ReportParser
-from langchain_openai import ChatOpenAI
+from utils.keyword_matcher import KeywordMatcher
+from utils.http_transport import PooledLineHttpClient, http_transport
+from services.n8n_outbox import n8n_outbox
+from services.llm_registry import get_llm, llm_registry, llm_response_cache, llm_run_metadata
 import uuid
 
 # FastAPIアプリケーションの初期化
 app = FastAPI(title="Smart Office Assistant Demo")
 
 # 各サービスのインスタンスを作成（タイムアウト設定を延長）
-line_bot_api = LineBotApi(Config.LINE_CHANNEL_ACCESS_TOKEN, timeout=30)  # 30秒に延長
+line_bot_api = LineBotApi(Config.LINE_CHANNEL_ACCESS_TOKEN, timeout=Config.HTTP_TIMEOUT_LINE, http_client=PooledLineHttpClient)  # 接続プールを共有
 handler = WebhookHandler(Config.LINE_CHANNEL_SECRET)
 router = QuestionRouter()
 
@@ -40,6 +47,7 @@ router = QuestionRouter()
 rag_service = RAGService()  # rag_serviceを先に作成
 from services.web_search_service import WebSearchService
 web_search_service = WebSearchService()  # web_search_serviceも先に作成
+rag_service.web_search_service = web_search_service  # Web検索結果キャッシュをRAGのフォールバックと共有
 from services.email_send_service import EmailSendService
 email_send_service = EmailSendService()  # メール送信サービス追加
 # --- ここまで変更点1 ---
@@ -54,7 +62,10 @@ bed_service = BedManagementService()
 admin_service = AdminEfficiencyService()
 staff_training_service = StaffTrainingService()
 shift_service = ShiftSchedulingService(n8n_connector=n8n_connector)
-conversation_manager = ConversationManager()
+conversation_manager = ConversationManager(
+    max_users=Config.CONVERSATION_MAX_USERS,
+    max_bytes=Config.CONVERSATION_MAX_BYTES
+)
 
 # 構造化レポート履歴の管理
 structured_report_history = {}  # user_id -> {report_id: structured_data}
@@ -62,14 +73,7 @@ report_parser = ReportParser()
 
 def get_natural_leave_application_info():
     """LLMを使って自然な会話調の有給申請情報を生成"""
-    from langchain_openai import ChatOpenAI
-    from config import Config
-    
-    llm = ChatOpenAI(
-        model="gpt-4o",
-        temperature=0.7,
-        api_key=Config.OPENAI_API_KEY
-    )
+    llm = get_llm("rag_answer")
     
     # 完全な情報を含むプロンプト
     prompt = f"""あなたは阪南ビジネスマシンの優秀で親しみやすい事務アシスタントです。
@@ -139,19 +143,30 @@ def store_structured_report(user_id: str, response_text: str, report_type: str =
 office_agent = OfficeAIAgent(rag_service=rag_service, web_search_service=web_search_service, structured_report_history=structured_report_history)
 # --- ここまで変更点2 ---
 
-# 一般的な雑談用のChatOpenAIモデル
-general_chat_model = ChatOpenAI(
-    model="gpt-4o",
-    temperature=0.7,
-    api_key=Config.OPENAI_API_KEY
-)
+# 一般的な雑談用のモデル（軽い処理のため小さいモデル）
+general_chat_model = get_llm("chat")
 
 # アプリケーション起動時に一度だけ実行される処理
 @app.on_event("startup")
 def startup_event():
     """アプリケーション起動時にベクトルデータベースを構築する"""
     rag_service.setup_vectorstores()
+    if Config.VECTORSTORE_WATCH_INTERVAL > 0:
+        rag_service.start_index_watcher(Config.VECTORSTORE_WATCH_INTERVAL)
+    if n8n_outbox is not None:
+        # 前回の停止時に未送信だったn8n送信を再開
+        n8n_outbox.start()
     print("事務作業用AIアシスタントの知識データベースの準備が完了しました。")
+    event_worker_pool.start()
+
+# アプリケーション終了時に処理中のイベントを処理し終えてから停止する
+@app.on_event("shutdown")
+def shutdown_event():
+    """キューに残っているWebhookイベントを処理してからワーカーを停止する"""
+    event_worker_pool.shutdown(timeout=Config.WEBHOOK_SHUTDOWN_TIMEOUT)
+    if n8n_outbox is not None:
+        n8n_outbox.stop()
+    http_transport.close()
 
 # LINEからのWebhook通信を受け取るエンドポイント
 @app.post("/webhook")
@@ -176,15 +191,31 @@ async def callback(request: Request):
         print(f"Full body: {body_str}")  # デバッグ用：全体を表示
         print(f"Request body length: {len(body_str)}")
         
-        # LINE Bot SDKでリクエストを処理
-        handler.handle(body_str, signature)
+        # 署名検証とイベントのパースのみ行い、処理はワーカープールに任せる
+        events = handler.parser.parse(body_str, signature)
+        
+        queued = 0
+        for event in events:
+            # 再送された処理済みイベントはLLM処理に進めず破棄する
+            dedup_keys = get_event_dedup_keys(event)
+            if not event_dedup_cache.claim(dedup_keys):
+                print(f"♻️ 重複イベントをスキップしました: {dedup_keys}")
+                continue
+            
+            if not event_worker_pool.submit(event):
+                # キュー満杯時は登録を取り消して503を返し、LINE側の再送に任せる
+                event_dedup_cache.release(dedup_keys)
+                raise HTTPException(status_code=503, detail="Event queue is full")
+            queued += 1
         
-        print("Webhook processed successfully")
+        print(f"Webhook accepted: {queued}/{len(events)} event(s) queued")
         return "OK"
         
     except InvalidSignatureError as e:
         print(f"Invalid signature error: {e}")
         raise HTTPException(status_code=400, detail="Invalid signature")
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Webhook processing error: {e}")
         # デバッグ情報を出力
@@ -229,6 +260,95 @@ async def root():
         }
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Webhookイベント処理・質問分類などの処理統計を返す"""
+    return {
+        "webhook_queue": event_worker_pool.get_stats(),
+        "webhook_dedup": event_dedup_cache.get_stats(),
+        "router": router.get_stats(),
+        "dispatch": message_dispatcher.get_stats(),
+        "embedding_cache": rag_service.embeddings.get_stats(),
+        "answer_cache": rag_service.answer_cache.get_stats() if rag_service.answer_cache else None,
+        "vectorstores": rag_service.get_vectorstore_status(),
+        "context_builder": rag_service.context_builder.get_stats(),
+        "retrieval": rag_service.get_retrieval_stats(),
+        "web_search_cache": web_search_service.get_cache_stats(),
+        "llm_clients": llm_registry.get_stats(),
+        "llm_cache": llm_response_cache.get_stats() if llm_response_cache else None,
+        "http": http_transport.get_stats(),
+        "n8n_outbox": n8n_outbox.get_stats() if n8n_outbox else None,
+        "conversations": conversation_manager.get_stats()
+    }
+
+def verify_admin_token(token: Optional[str]):
+    """管理用エンドポイントの認証（ADMIN_API_TOKEN未設定時は無効）"""
+    if not Config.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if token != Config.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.get("/admin/indexes")
+async def list_index_versions(x_admin_token: Optional[str] = Header(None)):
+    """保存済みのインデックスのバージョンと稼働中のバージョンを返す"""
+    verify_admin_token(x_admin_token)
+    return rag_service.get_index_versions()
+
+@app.post("/admin/indexes/reload")
+async def reload_index_version(version: Optional[str] = None, x_admin_token: Optional[str] = Header(None)):
+    """インデックスの新しいバージョンをバックグラウンドで読み込み、読み込み完了後に切り替える"""
+    verify_admin_token(x_admin_token)
+    if version and version not in rag_service.index_store.list_versions():
+        raise HTTPException(status_code=404, detail=f"Unknown index version: {version}")
+    rag_service.reload_vectorstores_async(version)
+    return {"status": "reloading", "target_version": version or rag_service.index_store.current(), "active_version": rag_service.active_index_version}
+
+@app.post("/admin/indexes/rollback")
+async def rollback_index_version(x_admin_token: Optional[str] = Header(None)):
+    """1つ前のバージョンのインデックスに戻す"""
+    verify_admin_token(x_admin_token)
+    previous_version = rag_service.index_store.previous(rag_service.active_index_version)
+    if not previous_version:
+        raise HTTPException(status_code=409, detail="No previous index version")
+    rag_service.reload_vectorstores_async(previous_version)
+    return {"status": "rolling_back", "target_version": previous_version, "active_version": rag_service.active_index_version}
+
+def require_outbox():
+    """アウトボックスが無効なら404"""
+    if n8n_outbox is None:
+        raise HTTPException(status_code=404, detail="n8n outbox is disabled")
+    return n8n_outbox
+
+@app.get("/admin/outbox")
+async def list_outbox(status: Optional[str] = None, limit: int = 50, x_admin_token: Optional[str] = Header(None)):
+    """n8nアウトボックスの登録（pending / delivered）とデッドレターを返す"""
+    verify_admin_token(x_admin_token)
+    outbox = require_outbox()
+    if status not in (None, "pending", "delivered"):
+        raise HTTPException(status_code=400, detail="status must be pending or delivered")
+    return {
+        "stats": outbox.get_stats(),
+        "entries": outbox.list_entries(status, limit),
+        "dead_letters": outbox.list_dead_letters(limit)
+    }
+
+@app.post("/admin/outbox/{entry_id}/retry")
+async def retry_outbox_entry(entry_id: int, x_admin_token: Optional[str] = Header(None)):
+    """再送待ちの登録をすぐに送信し直す"""
+    verify_admin_token(x_admin_token)
+    if not require_outbox().retry_now(entry_id):
+        raise HTTPException(status_code=404, detail=f"Pending outbox entry not found: {entry_id}")
+    return {"status": "retrying", "id": entry_id}
+
+@app.post("/admin/outbox/dead-letters/{dead_letter_id}/replay")
+async def replay_dead_letter(dead_letter_id: int, x_admin_token: Optional[str] = Header(None)):
+    """デッドレターをアウトボックスに戻して再送する"""
+    verify_admin_token(x_admin_token)
+    entry_id = require_outbox().replay_dead_letter(dead_letter_id)
+    if entry_id is None:
+        raise HTTPException(status_code=404, detail=f"Dead letter not found: {dead_letter_id}")
+    return {"status": "replaying", "dead_letter_id": dead_letter_id, "id": entry_id}
+
 @app.get("/health")
 async def health_check():
     """詳細ヘルスチェック用エンドポイント"""
@@ -330,15 +450,25 @@ QUICK_RESPONSES = {
 詳細分析を準備中です。少々お待ちください..."""
 }
 
+# 即座応答の判定に使うキーワード（ラベルの組み合わせで判定）
+QUICK_RESPONSE_MATCHER = KeywordMatcher({
+    "経費精算": ["経費精算"],
+    "締切": ["締切", "いつ"],
+    "達成状況": ["達成状況", "実績"],
+    "官需課": ["官需課", "7月"]
+})
+
 def should_use_quick_response(user_message: str) -> str:
     """即座応答を使うべきかチェックし、該当する応答を返す"""
     
+    labels = QUICK_RESPONSE_MATCHER.labels(user_message)
+    
     # 経費精算の締切に関する質問
-    if "経費精算" in user_message and ("締切" in user_message or "いつ" in user_message):
+    if {"経費精算", "締切"} <= labels:
         return QUICK_RESPONSES["経費精算の締切"]
     
     # 達成状況に関する複雑な質問  
-    if ("達成状況" in user_message or "実績" in user_message) and ("官需課" in user_message or "7月" in user_message):
+    if {"達成状況", "官需課"} <= labels:
         return QUICK_RESPONSES["達成状況"]
     
     return None
@@ -366,219 +496,96 @@ def should_provide_context_help(user_message: str, has_context: bool) -> str:
     
     return None
 
-# テキストメッセージを処理するハンドラー
-@handler.add(MessageEvent, message=TextMessage)
-def handle_text_message(event):
-    """ユーザーからのテキストメッセージに応じて応答を生成する"""
-    user_message = event.message.text
-    reply_token = event.reply_token
-    user_id = event.source.user_id  # LINEユーザーIDを取得
-    response_text = ""
+# === カテゴリ別ハンドラー ===
+# 各ハンドラーはメッセージコンテキスト（dict）を受け取り応答文を返す。
+# 会話履歴の要否・構造化レポートの保存・確認メッセージの付与は登録時に宣言する。
+
+def _query_with_history(message: dict) -> str:
+    """会話履歴がある場合は履歴付きの問い合わせ文を作る（医療事務向け分析サービス用）"""
+    if message["conversation_context"]:
+        return f"# 前回までの会話内容\n{message['conversation_context']}\n\n# 現在の質問\n{message['user_message']}"
+    return message["user_message"]
+
+def handle_agent_query(message: dict) -> str:
+    """AIエージェントで回答し、専用レポートが含まれていれば構造化保存する"""
+    print(f"AIエージェント使用 - カテゴリ: {message['category']}")
+    response_text = office_agent.process_query(message["query"], message["conversation_context"], message["user_id"])
     
-    # 🚀 即座応答チェック（LINEタイムアウト回避）
-    quick_response = should_use_quick_response(user_message)
-    if quick_response:
-        print(f"⚡ 即座応答使用: '{user_message}' -> {len(quick_response)}文字")
+    # レポート検出と構造化保存
+    report_keywords = [
+        "A病院 診療報酬返戻分析レポート",
+        "A病院 診療報酬分析レポート", 
+        "診療報酬返戻分析レポート",
+        "診療報酬分析レポート"
+    ]
+    if any(keyword in response_text for keyword in report_keywords):
         try:
-            line_bot_api.reply_message(reply_token, TextSendMessage(text=quick_response))
-            
-            # 🔥 重要：即座応答でも会話履歴に保存
-            conversation_manager.add_message(user_id, user_message, quick_response, "quick_response")
-            print(f"✅ 即座応答の会話履歴を保存しました")
-            
-            return
+            report_id = store_structured_report(message["user_id"], response_text, "billing_analysis")
+            print(f"✅ レポート構造化保存完了: {report_id}")
         except Exception as e:
-            print(f"❌ 即座応答送信エラー: {e}")
-            # 即座応答が失敗した場合は通常処理に進む
-
-    # 会話履歴の確認
-    has_context = conversation_manager.has_recent_conversation(user_id)
-    is_follow_up = conversation_manager.is_follow_up_question(user_message) if has_context else False
-    
-    # 🔍 デバッグ: 会話履歴の状態を確認
-    print(f"🔍 DEBUG: user_id = {user_id}")
-    print(f"🔍 DEBUG: has_context = {has_context}")
-    print(f"🔍 DEBUG: is_follow_up = {is_follow_up}")
-    print(f"🔍 DEBUG: user_message = '{user_message}'")
+            print(f"❌ レポート解析エラー: {str(e)}")
+    return response_text
+
+def handle_shift_scheduling(message: dict) -> str:
+    return shift_service.generate_provisional_schedule(message["user_message"])
+
+def handle_admin(message: dict) -> str:
+    query = message["query"]
+    # 🔥 有給申請の特別処理
+    if "有給" in query and "申請" in query:
+        return get_natural_leave_application_info()
+    if message["conversation_context"]:
+        return rag_service.query_office_with_history(query, message["conversation_context"])
+    # DB検索 → Web検索のフォールバック統合
+    return rag_service.query_with_fallback_search(query, "admin")
+
+def handle_sales_query(message: dict) -> str:
+    if message["conversation_context"]:
+        return rag_service.query_sales_with_history(message["query"], message["conversation_context"])
+    # DB検索 → Web検索のフォールバック統合
+    return rag_service.query_with_fallback_search(message["query"], "sales_query")
+
+def handle_detailed_sales_query(message: dict) -> str:
+    # 詳細営業データ専用クエリ（みなみちゃんキャラクター）
+    return rag_service.query_detailed_sales(message["query"], message["conversation_context"])
+
+def handle_report_generation(message: dict) -> str:
+    """レポート生成・配信処理"""
+    from services.report_generation_service import ReportGenerationService
+    from services.n8n_workflow_service import N8NWorkflowService
     
-    # 🎯 文脈推測機能: 不完全な質問を補完
-    enhanced_query = user_message
-    was_enhanced = False
-    contextual_confirmation = ""
+    user_message = message["user_message"]
+    report_service = ReportGenerationService()
+    n8n_service = N8NWorkflowService()
     
-    # 🔍 デバッグ: 文脈推測の条件チェック
-    if has_context:
-        is_incomplete = conversation_manager.is_incomplete_query(user_message)
-        print(f"🔍 DEBUG: is_incomplete_query = {is_incomplete}")
-        
-        if is_incomplete:
-            print(f"🔍 DEBUG: 文脈推測を実行します...")
-            enhanced_query, was_enhanced = conversation_manager.enhance_query_with_context(user_id, user_message)
-            print(f"🔍 DEBUG: enhanced_query = '{enhanced_query}'")
-            print(f"🔍 DEBUG: was_enhanced = {was_enhanced}")
-            
-            if was_enhanced:
-                contextual_confirmation = conversation_manager.generate_contextual_confirmation(user_id, user_message, enhanced_query)
-                print(f"🧠 文脈推測: '{user_message}' → '{enhanced_query}'")
-                print(f"🧠 確認メッセージ: '{contextual_confirmation}'")
-            else:
-                print(f"🔍 DEBUG: 文脈推測に失敗しました")
-        else:
-            print(f"🔍 DEBUG: 完全な質問として判定されました")
+    # レポートタイプの判定
+    if "月次" in user_message or "monthly" in user_message.lower():
+        report_content = report_service.generate_monthly_analysis()
+        report_type = "monthly"
+    elif "日次" in user_message or "daily" in user_message.lower():
+        report_content = report_service.generate_daily_report()
+        report_type = "daily"
     else:
-        print(f"🔍 DEBUG: 会話履歴なし - 文脈推測をスキップ")
+        # カスタムレポート
+        report_content = report_service.generate_custom_report(user_message)
+        report_type = "custom"
     
-    # 質問を分類（補完された質問を使用）
-    category = router.classify_question(enhanced_query)
+    # 配信が要求されていない場合はレポートのみ返す
+    if not any(word in user_message for word in ["送信", "配信", "メール", "送って"]):
+        return report_content
     
-    # フォローアップ質問の特別処理（feedback, summary, double_check は除外）
-    if is_follow_up and has_context and category not in ['feedback', 'summary', 'double_check', 'unknown']:
-        last_category = conversation_manager.get_last_category(user_id)
-        # 前回と同じカテゴリで継続する場合のみフォローアップとして扱う
-        if last_category and category == last_category:
-            print(f"フォローアップ質問 - カテゴリ: {category} (前回: {last_category})")
-        else:
-            print(f"新規質問 - カテゴリ: {category} (文脈あり)")
-    else:
-        if category in ['feedback', 'summary']:
-            print(f"独立質問 - カテゴリ: {category}")
-        else:
-            print(f"新規質問 - カテゴリ: {category}")
-
-    # 会話コンテキストを取得
-    conversation_context = conversation_manager.get_conversation_context(user_id)
-
-    # 🚨 タイムアウト対策: 文脈推測が成功した場合は簡易応答
-    if was_enhanced and contextual_confirmation:
-        print(f"🚀 文脈推測成功 - 簡易応答でタイムアウト回避")
-        response_text = f"{contextual_confirmation}\n\n富士フィルムの複合機について詳しい情報を検索中です。少々お待ちください..."
-    else:
-        # エージェントを使用すべきかどうかを判断（補完された質問を使用）
-        query_for_agent_check = enhanced_query if was_enhanced else user_message
-        use_agent = office_agent.should_use_agent(query_for_agent_check, category)
-        
-        if use_agent:
-            print(f"AIエージェント使用 - カテゴリ: {category}")
-            # 文脈推測で補完された質問を使用
-            query_to_process = enhanced_query if was_enhanced else user_message
-            response_text = office_agent.process_query(query_to_process, conversation_context, user_id)
-            
-            # 文脈推測の確認メッセージを追加
-            if was_enhanced and contextual_confirmation:
-                response_text = f"{contextual_confirmation}\n\n{response_text}"
-        
-        # レポート検出と構造化保存
-        report_keywords = [
-            "A病院 診療報酬返戻分析レポート",
-            "A病院 診療報酬分析レポート", 
-            "診療報酬返戻分析レポート",
-            "診療報酬分析レポート"
-        ]
-        
-        detected_report = None
-        for keyword in report_keywords:
-            if keyword in response_text:
-                detected_report = keyword
-                break
-        
-        if detected_report:
-            try:
-                # レポートのパース
-                structured_data = report_parser.parse_report(response_text, "billing_analysis")
-                
-                # レポートIDを生成
-                import time
-                report_id = f"report_{int(time.time())}"
-                
-                # ユーザー別履歴に保存
-                if user_id not in structured_report_history:
-                    structured_report_history[user_id] = {}
-                
-                structured_report_history[user_id][report_id] = structured_data
-                print(f"✅ レポート構造化保存完了: {report_id}")
-                    
-            except Exception as e:
-                print(f"❌ レポート解析エラー: {str(e)}")
-        
-            # エージェントが生成した複雑な回答も構造化レポートとして保存（従来の処理）
-            if len(response_text) > 200 and not detected_report:  # 専用レポート以外の長い回答
-                store_structured_report(user_id, response_text, category)
-    
-    # シフト組みの処理
-    if category == "shift_scheduling":
-        response_text = shift_service.generate_provisional_schedule(user_message)
-    # 従来のカテゴリ別処理
-    elif category == "admin":
-        # 文脈推測で補完された質問を使用
-        query_to_process = enhanced_query if was_enhanced else user_message
-        
-        # 🔥 有給申請の特別処理
-        if "有給" in query_to_process and "申請" in query_to_process:
-            response_text = get_natural_leave_application_info()
-        elif conversation_context:
-            response_text = rag_service.query_office_with_history(query_to_process, conversation_context)
-        else:
-            # DB検索 → Web検索のフォールバック統合
-            response_text = rag_service.query_with_fallback_search(query_to_process, "admin")
-        
-        # 文脈推測の確認メッセージを追加
-        if was_enhanced and contextual_confirmation:
-            response_text = f"{contextual_confirmation}\n\n{response_text}"
-    elif category == "sales_query":
-        # 文脈推測で補完された質問を使用
-        query_to_process = enhanced_query if was_enhanced else user_message
-        if conversation_context:
-            response_text = rag_service.query_sales_with_history(query_to_process, conversation_context)
-        else:
-            # DB検索 → Web検索のフォールバック統合
-            response_text = rag_service.query_with_fallback_search(query_to_process, "sales_query")
-        
-        # 文脈推測の確認メッセージを追加
-        if was_enhanced and contextual_confirmation:
-            response_text = f"{contextual_confirmation}\n\n{response_text}"
-    elif category == "detailed_sales_query":
-        # 詳細営業データ専用クエリ（みなみちゃんキャラクター）
-        # 文脈推測で補完された質問を使用
-        query_to_process = enhanced_query if was_enhanced else user_message
-        response_text = rag_service.query_detailed_sales(query_to_process, conversation_context)
-        
-        # 文脈推測の確認メッセージを追加
-        if was_enhanced and contextual_confirmation:
-            response_text = f"{contextual_confirmation}\n\n{response_text}"
-    elif category == "report_generation":
-        # レポート生成・配信処理
-        from services.report_generation_service import ReportGenerationService
-        from services.n8n_workflow_service import N8NWorkflowService
-        
-        report_service = ReportGenerationService()
-        n8n_service = N8NWorkflowService()
-        
-        # レポートタイプの判定
-        if "月次" in user_message or "monthly" in user_message.lower():
-            report_content = report_service.generate_monthly_analysis()
-            report_type = "monthly"
-        elif "日次" in user_message or "daily" in user_message.lower():
-            report_content = report_service.generate_daily_report()
-            report_type = "daily"
-        else:
-            # カスタムレポート
-            report_content = report_service.generate_custom_report(user_message)
-            report_type = "custom"
-        
-        # 配信が要求されている場合
-        if any(word in user_message for word in ["送信", "配信", "メール", "送って"]):
-            # 受信者の判定
-            recipient = "部長"  # デフォルト
-            if "課長" in user_message:
-                recipient = "課長"
-            elif "チーム" in user_message or "メンバー" in user_message:
-                recipient = "チーム"
-            
-            # N8N経由で配信
-            report_data = n8n_service.format_webhook_data(report_content, report_type, recipient)
-            delivery_result = n8n_service.trigger_report_email(report_data)
-            
-            response_text = f"""📊 **レポート生成・配信完了**
+    # 受信者の判定
+    recipient = "部長"  # デフォルト
+    if "課長" in user_message:
+        recipient = "課長"
+    elif "チーム" in user_message or "メンバー" in user_message:
+        recipient = "チーム"
+    
+    # N8N経由で配信
+    report_data = n8n_service.format_webhook_data(report_content, report_type, recipient)
+    delivery_result = n8n_service.trigger_report_email(report_data)
+    
+    return f"""📊 **レポート生成・配信完了**
 
 {report_content[:300]}...
 
@@ -589,22 +596,21 @@ def handle_text_message(event):
 **レポートタイプ**: {report_type}
 
 ※全文は配信メールでご確認ください。"""
-        else:
-            # レポートのみ生成
-            response_text = report_content
-    elif category == "workflow_integration":
-        # シンプルなワークフロー実行メッセージ
-        response_text = "✅ ワークフローを実行しました"
-    elif category == "medical":
-        if conversation_context:
-            response_text = rag_service.query_medical_with_history(user_message, conversation_context)
-        else:
-            response_text = rag_service.query_medical(user_message)
-    elif category == "summary":
-        if conversation_context:
-            response_text = rag_service.summarize_previous_response(conversation_context, user_message)
-        else:
-            response_text = """
+
+def handle_workflow_integration(message: dict) -> str:
+    # シンプルなワークフロー実行メッセージ
+    return "✅ ワークフローを実行しました"
+
+def handle_medical(message: dict) -> str:
+    # 診療実績分析はRAGサービスの医療データベースを使用
+    if message["conversation_context"]:
+        return rag_service.query_medical_with_history(message["user_message"], message["conversation_context"])
+    return rag_service.query_medical(message["user_message"])
+
+def handle_summary(message: dict) -> str:
+    if message["conversation_context"]:
+        return rag_service.summarize_previous_response(message["conversation_context"], message["user_message"])
+    return """
 📋 **阪南ビジネスマシン 要約機能**
 
 申し訳ございませんが、要約する前回の会話が見つかりません。
@@ -621,154 +627,100 @@ def handle_text_message(event):
 - 業務効率化分析
 
 お気軽にお試しください！"""
-    elif category == "double_check":
-        # 基本的なダブルチェックサービス（患者名表示対応）を使用
-        double_check_service = DoubleCheckService()
-        response_text = double_check_service.check_medication(user_message)
-    elif category == "task":
-        # taskカテゴリも統合検索システム（DB → Web検索）を使用
-        print(f"task カテゴリ - 統合検索を実行します。")
-        # 文脈推測で補完された質問を使用
-        query_to_process = enhanced_query if was_enhanced else user_message
-        try:
-            response_text = rag_service.query_with_fallback_search(query_to_process, "task")
-        except Exception as e:
-            print(f"task統合検索中にエラーが発生しました: {e}")
-            # エラー時はN8Nコネクターにフォールバック
-            response_text = n8n_connector.execute_task(query_to_process)
-        
-        # 文脈推測の確認メッセージを追加
-        if was_enhanced and contextual_confirmation:
-            response_text = f"{contextual_confirmation}\n\n{response_text}"
-    # 新しい医療事務向け高度分析機能
-    elif category == "billing_analysis":
-        # 会話履歴を考慮した診療報酬分析
-        if conversation_context:
-            enhanced_query = f"# 前回までの会話内容\n{conversation_context}\n\n# 現在の質問\n{user_message}"
-            response_text = billing_service.query_billing_analysis(enhanced_query)
-        else:
-            response_text = billing_service.query_billing_analysis(user_message)
-        # 構造化レポートとして保存
-        store_structured_report(user_id, response_text, "billing")
-    elif category == "bed_management":
-        # 会話履歴を考慮した病床管理分析
-        if conversation_context:
-            enhanced_query = f"# 前回までの会話内容\n{conversation_context}\n\n# 現在の質問\n{user_message}"
-            response_text = bed_service.query_bed_management(enhanced_query)
-        else:
-            response_text = bed_service.query_bed_management(user_message)
-        # 構造化レポートとして保存
-        store_structured_report(user_id, response_text, "bed_management")
-    elif category == "admin_efficiency":
-        # 会話履歴を考慮した事務効率分析
-        if conversation_context:
-            enhanced_query = f"# 前回までの会話内容\n{conversation_context}\n\n# 現在の質問\n{user_message}"
-            response_text = admin_service.query_admin_efficiency(enhanced_query)
-        else:
-            response_text = admin_service.query_admin_efficiency(user_message)
-        # 構造化レポートとして保存
-        store_structured_report(user_id, response_text, "admin_efficiency")
-    elif category == "revenue_analysis":
-        # 会話履歴を考慮した収益分析
-        if conversation_context:
-            enhanced_query = f"# 前回までの会話内容\n{conversation_context}\n\n# 現在の質問\n{user_message}"
-            response_text = billing_service.analyze_revenue_performance(enhanced_query)
-        else:
-            response_text = billing_service.analyze_revenue_performance(user_message)
-        # 構造化レポートとして保存
-        store_structured_report(user_id, response_text, "revenue_analysis")
-    elif category == "clinical_analysis":
-        # 診療実績分析はRAGサービスの医療データベースを使用
-        if conversation_context:
-            response_text = rag_service.query_medical_with_history(user_message, conversation_context)
-        else:
-            response_text = rag_service.query_medical(user_message)
-        # 構造化レポートとして保存
-        store_structured_report(user_id, response_text, "clinical")
-    elif category == "waiting_analysis":
-        response_text = "⚠️ 待ち時間分析機能は現在開発中です。電子カルテシステムとの連携により、リアルタイム患者動線分析を提供予定です。"
-    elif category == "staff_training":
-        # 会話履歴を考慮したスタッフ研修分析
-        if conversation_context:
-            enhanced_query = f"# 前回までの会話内容\n{conversation_context}\n\n# 現在の質問\n{user_message}"
-            response_text = staff_training_service.analyze_staff_training(enhanced_query)
-        else:
-            response_text = staff_training_service.analyze_staff_training(user_message)
-        # 構造化レポートとして保存
-        store_structured_report(user_id, response_text, "staff_training")
-    elif category == "patient_info_query":
-        # --- 修正点: 患者ID抽出の正規表現を変更 ---
-        # 'A2024-0156' の形式に対応する正規表現
-        patient_id_match = re.search(r'[A|a]\d{4}-\d{4}', user_message)
-        # もし 'P-001' 形式もサポートしたい場合は、 OR で結合できます (例: r'([P|p]-\d{3}|[A|a]\d{4}-\d{4})')
-        # 現状は 'A2024-0156' のみ対応
-        # --- ここまで修正 ---
-        
-        patient_id = patient_id_match.group(0).upper() if patient_id_match else None
-
-        if patient_id:
-            # double_checkサービスから患者データをロード
-            patient_info_data = enhanced_double_check.detailed_patients
-            target_patient = patient_info_data.get(patient_id)
-
-            if target_patient and "name" in target_patient:
-                # --- 修正点: 改行コードを '\r\n' に変更 ---
-                response_text = (
-                    f"📋 **患者情報**\r\n\r\n"  # \n\n を \r\n\r\n に変更
-                    f"患者ID: {patient_id}\r\n"   # \n を \r\n に変更
-                    f"お名前: 「{target_patient['name']}」様"
-                )
-                # --- ここまで修正 ---
-            else:
-                response_text = f"申し訳ありません。患者ID {patient_id} の情報が見つからないか、お名前が登録されていません。"
-        else:
-            response_text = "患者IDを認識できませんでした。AXXXX-XXXX（例：A2024-0156）の形式で患者IDを教えてください。"  # エラーメッセージも修正
-    elif category == "feedback":
-        # ユーザーからの肯定的なフィードバックに対する応答
-        import random
-        feedback_responses = [
-            "ありがとうございます！😊 お役に立てて嬉しいです。他にも阪南ビジネスマシンの業務についてお聞きになりたいことがございましたら、お気軽にお声がけください。",
-            "そう言っていただけると幸いです！💼 阪南ビジネスマシンの業務改善に少しでも貢献できていれば何よりです。",
-            "恐縮です！💪 引き続き阪南ビジネスマシンの業務効率化をサポートしてまいります。何か他にもご質問がございましたらどうぞ。",
-            "お褒めの言葉をいただき、ありがとうございます！✨ 阪南ビジネスマシンの皆様の業務効率化に貢献できるよう、今後も精進いたします。",
-            "ありがとうございます！📊 阪南ビジネスマシンの売上実績や業務分析について、他にも何かお調べしたいことがございましたらお申し付けください。"
-        ]
-        response_text = random.choice(feedback_responses)
-    elif category == "general_chat":
-        # 一般的な雑談・会話処理
-        chat_prompt = f"""
-        あなたは友好的で、様々な話題に対応できるAIアシスタントです。
-        以下のユーザーのメッセージに対して、自然で、かつ親しみやすい会話応答を生成してください。
-        阪南ビジネスマシンの特定の業務に関する質問であれば、その旨を案内することもできますが、まずは一般的な会話として応答してください。
-
-        # ユーザーのメッセージ:
-        {user_message}
-
-        # あなたの応答:
-        """
-        try:
-            response_text = general_chat_model.invoke(chat_prompt).content
-        except Exception as e:
-            print(f"一般会話応答生成中にエラーが発生しました: {e}")
-            response_text = "申し訳ありません、現在一般的な会話の応答を生成できません。何か阪南ビジネスマシンの業務についてお手伝いできることはありますか？"
-    else:
-        # DBにない質問の場合、統合検索を実行（DB → Web検索）
-        # 文脈推測で補完された質問を使用
-        query_to_process = enhanced_query if was_enhanced else user_message
-        print(f"カテゴリ不明 ('{query_to_process}') - 統合検索を実行します。")
-        
-        try:
-            # 統合検索を実行（DB → Web検索のフォールバック）
-            response_text = rag_service.query_with_fallback_search(query_to_process, "admin")
-            
-            # 文脈推測の確認メッセージを追加
-            if was_enhanced and contextual_confirmation:
-                response_text = f"{contextual_confirmation}\n\n{response_text}"
-            
-        except Exception as e:
-            print(f"統合検索中にエラーが発生しました: {e}")
-            # エラー時は従来通りの案内を表示
-            response_text = f"""🤖 **阪南ビジネスマシン Smart Office Assistant**
+
+def handle_double_check(message: dict) -> str:
+    # 基本的なダブルチェックサービス（患者名表示対応）を使用
+    double_check_service = DoubleCheckService()
+    return double_check_service.check_medication(message["user_message"])
+
+def handle_task(message: dict) -> str:
+    # taskカテゴリも統合検索システム（DB → Web検索）を使用
+    print(f"task カテゴリ - 統合検索を実行します。")
+    try:
+        return rag_service.query_with_fallback_search(message["query"], "task")
+    except Exception as e:
+        print(f"task統合検索中にエラーが発生しました: {e}")
+        # エラー時はN8Nコネクターにフォールバック
+        return n8n_connector.execute_task(message["query"])
+
+def handle_billing_analysis(message: dict) -> str:
+    return billing_service.query_billing_analysis(_query_with_history(message))
+
+def handle_bed_management(message: dict) -> str:
+    return bed_service.query_bed_management(_query_with_history(message))
+
+def handle_admin_efficiency(message: dict) -> str:
+    return admin_service.query_admin_efficiency(_query_with_history(message))
+
+def handle_revenue_analysis(message: dict) -> str:
+    return billing_service.analyze_revenue_performance(_query_with_history(message))
+
+def handle_waiting_analysis(message: dict) -> str:
+    return "⚠️ 待ち時間分析機能は現在開発中です。電子カルテシステムとの連携により、リアルタイム患者動線分析を提供予定です。"
+
+def handle_staff_training(message: dict) -> str:
+    return staff_training_service.analyze_staff_training(_query_with_history(message))
+
+def handle_patient_info_query(message: dict) -> str:
+    # 'A2024-0156' の形式に対応する正規表現
+    patient_id_match = re.search(r'[A|a]\d{4}-\d{4}', message["user_message"])
+    # もし 'P-001' 形式もサポートしたい場合は、 OR で結合できます (例: r'([P|p]-\d{3}|[A|a]\d{4}-\d{4})')
+    patient_id = patient_id_match.group(0).upper() if patient_id_match else None
+    
+    if not patient_id:
+        return "患者IDを認識できませんでした。AXXXX-XXXX（例：A2024-0156）の形式で患者IDを教えてください。"
+    
+    # double_checkサービスから患者データをロード
+    target_patient = enhanced_double_check.detailed_patients.get(patient_id)
+    if target_patient and "name" in target_patient:
+        return (
+            f"📋 **患者情報**\r\n\r\n"
+            f"患者ID: {patient_id}\r\n"
+            f"お名前: 「{target_patient['name']}」様"
+        )
+    return f"申し訳ありません。患者ID {patient_id} の情報が見つからないか、お名前が登録されていません。"
+
+def handle_feedback(message: dict) -> str:
+    # ユーザーからの肯定的なフィードバックに対する応答
+    import random
+    feedback_responses = [
+        "ありがとうございます！😊 お役に立てて嬉しいです。他にも阪南ビジネスマシンの業務についてお聞きになりたいことがございましたら、お気軽にお声がけください。",
+        "そう言っていただけると幸いです！💼 阪南ビジネスマシンの業務改善に少しでも貢献できていれば何よりです。",
+        "恐縮です！💪 引き続き阪南ビジネスマシンの業務効率化をサポートしてまいります。何か他にもご質問がございましたらどうぞ。",
+        "お褒めの言葉をいただき、ありがとうございます！✨ 阪南ビジネスマシンの皆様の業務効率化に貢献できるよう、今後も精進いたします。",
+        "ありがとうございます！📊 阪南ビジネスマシンの売上実績や業務分析について、他にも何かお調べしたいことがございましたらお申し付けください。"
+    ]
+    return random.choice(feedback_responses)
+
+@answer_generator
+def handle_general_chat(message: dict) -> str:
+    # 一般的な雑談・会話処理
+    chat_prompt = f"""
+    あなたは友好的で、様々な話題に対応できるAIアシスタントです。
+    以下のユーザーのメッセージに対して、自然で、かつ親しみやすい会話応答を生成してください。
+    阪南ビジネスマシンの特定の業務に関する質問であれば、その旨を案内することもできますが、まずは一般的な会話として応答してください。
+
+    # ユーザーのメッセージ:
+    {message["user_message"]}
+
+    # あなたの応答:
+    """
+    try:
+        return general_chat_model.invoke(chat_prompt).content
+    except Exception as e:
+        print(f"一般会話応答生成中にエラーが発生しました: {e}")
+        return "申し訳ありません、現在一般的な会話の応答を生成できません。何か阪南ビジネスマシンの業務についてお手伝いできることはありますか？"
+
+def handle_unknown(message: dict) -> str:
+    # DBにない質問の場合、統合検索を実行（DB → Web検索）
+    query_to_process = message["query"]
+    print(f"カテゴリ不明 ('{query_to_process}') - 統合検索を実行します。")
+    return rag_service.query_with_fallback_search(query_to_process, "admin")
+
+def handle_unknown_error(message: dict, error: Exception) -> str:
+    # 統合検索でエラーが発生した場合は従来通りの案内を表示（文脈推測の確認メッセージは付けない）
+    query_to_process = message["query"]
+    return f"""🤖 **阪南ビジネスマシン Smart Office Assistant**
 
 申し訳ございません。「{query_to_process}」についてうまく理解できませんでした。
 
@@ -821,6 +773,131 @@ def handle_text_message(event):
 
 お気軽にお試しください！"""
 
+# カテゴリ → ハンドラーの登録表（1メッセージにつきいずれか1つだけが実行される）
+message_dispatcher = MessageDispatcher(report_store=store_structured_report)
+# 1メッセージあたりのLLM呼び出し回数を数える（実行メタデータのメッセージキーで別スレッドの呼び出しも集計）
+llm_registry.add_invocation_listener(message_dispatcher.record_llm_call)
+message_dispatcher.register("agent", handle_agent_query, uses_context=True, prepend_confirmation=True)
+message_dispatcher.register("shift_scheduling", handle_shift_scheduling)
+message_dispatcher.register("admin", handle_admin, uses_context=True, prepend_confirmation=True)
+message_dispatcher.register("sales_query", handle_sales_query, uses_context=True, prepend_confirmation=True)
+message_dispatcher.register("detailed_sales_query", handle_detailed_sales_query, uses_context=True, prepend_confirmation=True)
+message_dispatcher.register("report_generation", handle_report_generation)
+message_dispatcher.register("workflow_integration", handle_workflow_integration)
+message_dispatcher.register("medical", handle_medical, uses_context=True)
+message_dispatcher.register("summary", handle_summary, uses_context=True)
+message_dispatcher.register("double_check", handle_double_check)
+message_dispatcher.register("task", handle_task, prepend_confirmation=True)
+# 医療事務向け高度分析機能
+message_dispatcher.register("billing_analysis", handle_billing_analysis, uses_context=True, report_type="billing")
+message_dispatcher.register("bed_management", handle_bed_management, uses_context=True, report_type="bed_management")
+message_dispatcher.register("admin_efficiency", handle_admin_efficiency, uses_context=True, report_type="admin_efficiency")
+message_dispatcher.register("revenue_analysis", handle_revenue_analysis, uses_context=True, report_type="revenue_analysis")
+message_dispatcher.register("clinical_analysis", handle_medical, uses_context=True, report_type="clinical")
+message_dispatcher.register("waiting_analysis", handle_waiting_analysis)
+message_dispatcher.register("staff_training", handle_staff_training, uses_context=True, report_type="staff_training")
+message_dispatcher.register("patient_info_query", handle_patient_info_query)
+message_dispatcher.register("feedback", handle_feedback)
+message_dispatcher.register("general_chat", handle_general_chat)
+message_dispatcher.register("unknown", handle_unknown, prepend_confirmation=True, default=True, on_error=handle_unknown_error)
+
+# テキストメッセージを処理するハンドラー
+@handler.add(MessageEvent, message=TextMessage)
+def handle_text_message(event):
+    """ユーザーからのテキストメッセージに応じて応答を生成する"""
+    user_message = event.message.text
+    reply_token = event.reply_token
+    user_id = event.source.user_id  # LINEユーザーIDを取得
+    response_text = ""
+    
+    # 🚀 即座応答チェック（LINEタイムアウト回避）
+    quick_response = should_use_quick_response(user_message)
+    if quick_response:
+        print(f"⚡ 即座応答使用: '{user_message}' -> {len(quick_response)}文字")
+        try:
+            line_bot_api.reply_message(reply_token, TextSendMessage(text=quick_response))
+            
+            # 🔥 重要：即座応答でも会話履歴に保存
+            conversation_manager.add_message(user_id, user_message, quick_response, "quick_response")
+            print(f"✅ 即座応答の会話履歴を保存しました")
+            
+            return
+        except Exception as e:
+            print(f"❌ 即座応答送信エラー: {e}")
+            # 即座応答が失敗した場合は通常処理に進む
+
+    # 会話履歴の確認
+    has_context = conversation_manager.has_recent_conversation(user_id)
+    is_follow_up = conversation_manager.is_follow_up_question(user_message) if has_context else False
+    
+    # 🔍 デバッグ: 会話履歴の状態を確認
+    print(f"🔍 DEBUG: user_id = {user_id}")
+    print(f"🔍 DEBUG: has_context = {has_context}")
+    print(f"🔍 DEBUG: is_follow_up = {is_follow_up}")
+    print(f"🔍 DEBUG: user_message = '{user_message}'")
+    
+    # 🎯 文脈推測機能: 不完全な質問を補完
+    enhanced_query = user_message
+    was_enhanced = False
+    contextual_confirmation = ""
+    
+    # 🔍 デバッグ: 文脈推測の条件チェック
+    if has_context:
+        is_incomplete = conversation_manager.is_incomplete_query(user_message)
+        print(f"🔍 DEBUG: is_incomplete_query = {is_incomplete}")
+        
+        if is_incomplete:
+            print(f"🔍 DEBUG: 文脈推測を実行します...")
+            enhanced_query, was_enhanced = conversation_manager.enhance_query_with_context(user_id, user_message)
+            print(f"🔍 DEBUG: enhanced_query = '{enhanced_query}'")
+            print(f"🔍 DEBUG: was_enhanced = {was_enhanced}")
+            
+            if was_enhanced:
+                contextual_confirmation = conversation_manager.generate_contextual_confirmation(user_id, user_message, enhanced_query)
+                print(f"🧠 文脈推測: '{user_message}' → '{enhanced_query}'")
+                print(f"🧠 確認メッセージ: '{contextual_confirmation}'")
+            else:
+                print(f"🔍 DEBUG: 文脈推測に失敗しました")
+        else:
+            print(f"🔍 DEBUG: 完全な質問として判定されました")
+    else:
+        print(f"🔍 DEBUG: 会話履歴なし - 文脈推測をスキップ")
+    
+    # 質問を分類（補完された質問を使用）
+    category = router.classify_question(enhanced_query)
+    
+    # フォローアップ質問の特別処理（feedback, summary, double_check は除外）
+    if is_follow_up and has_context and category not in ['feedback', 'summary', 'double_check', 'unknown']:
+        last_category = conversation_manager.get_last_category(user_id)
+        # 前回と同じカテゴリで継続する場合のみフォローアップとして扱う
+        if last_category and category == last_category:
+            print(f"フォローアップ質問 - カテゴリ: {category} (前回: {last_category})")
+        else:
+            print(f"新規質問 - カテゴリ: {category} (文脈あり)")
+    else:
+        if category in ['feedback', 'summary']:
+            print(f"独立質問 - カテゴリ: {category}")
+        else:
+            print(f"新規質問 - カテゴリ: {category}")
+
+    # 会話コンテキストを取得
+    conversation_context = conversation_manager.get_conversation_context(user_id)
+
+    # エージェントを使用すべきかどうかを判断し、1つのハンドラーだけで応答を生成する
+    query_to_process = enhanced_query if was_enhanced else user_message
+    route = "agent" if office_agent.should_use_agent(query_to_process, category) else category
+    
+    response_text = message_dispatcher.dispatch(route, {
+        "message_id": getattr(event.message, "id", None),
+        "user_id": user_id,
+        "category": category,
+        "user_message": user_message,
+        "query": query_to_process,
+        "conversation_context": conversation_context,
+        "contextual_confirmation": contextual_confirmation if was_enhanced else ""
+    })
+    if not response_text:
+        return
     
     # === メール送信処理 ===
     # 全てのカテゴリ処理後にメール送信の必要性をチェック
@@ -848,7 +925,7 @@ def handle_text_message(event):
         traceback.print_exc()
         # メール送信エラーは回答には影響させない
     
-    # 古いセッションのクリーンアップ（定期的に実行）
+    # 古いセッションのクリーンアップ（期限切れの分だけ先頭から削除する）
     conversation_manager.cleanup_old_sessions()
 
     # 最終的な応答をLINEに送信（再試行機能付き）
@@ -860,7 +937,7 @@ def handle_text_message(event):
             line_bot_api.reply_message(
                 reply_token,
                 TextSendMessage(text=response_text),
-                timeout=30  # 個別リクエストのタイムアウトも30秒に設定
+                timeout=Config.HTTP_TIMEOUT_LINE  # 個別リクエストにもLINE APIのタイムアウト設定を使う
             )
             print(f"✅ LINE応答送信成功 (試行{attempt + 1}回目)")
             
@@ -892,6 +969,45 @@ def handle_image_message(event):
         TextSendMessage(text=response_text)
     )
 
+def process_line_event(event):
+    """ワーカースレッドでLINEイベントを種類に応じたハンドラーへ振り分ける"""
+    if isinstance(event, MessageEvent):
+        if isinstance(event.message, TextMessage):
+            # 分類・応答生成・先行Web検索・メール下書きのLLM呼び出しをこのメッセージに集計する
+            with message_dispatcher.track_message(getattr(event.message, "id", None)) as message_key:
+                with llm_run_metadata(message_key=message_key):
+                    handle_text_message(event)
+            return
+        if isinstance(event.message, ImageMessage):
+            handle_image_message(event)
+            return
+    print(f"未対応のイベントをスキップします: {type(event).__name__}")
+
+def get_event_dedup_keys(event) -> list:
+    """重複判定に使うキー（webhookEventIdとreplyToken）を取得"""
+    keys = []
+    webhook_event_id = getattr(event, "webhook_event_id", None)
+    if webhook_event_id:
+        keys.append(f"event:{webhook_event_id}")
+    reply_token = getattr(event, "reply_token", None)
+    if reply_token:
+        keys.append(f"reply:{reply_token}")
+    return keys
+
+# LINEの再送による二重処理を防ぐ重複排除キャッシュ
+event_dedup_cache = EventDedupCache(
+    max_entries=Config.WEBHOOK_DEDUP_MAX_ENTRIES,
+    ttl_seconds=Config.WEBHOOK_DEDUP_TTL_SECONDS,
+    db_path=Config.WEBHOOK_DEDUP_DB_PATH
+)
+
+# Webhookイベントのバックグラウンド処理用ワーカープール
+event_worker_pool = EventWorkerPool(
+    process_line_event,
+    num_workers=Config.WEBHOOK_WORKER_COUNT,
+    max_queue_size=Config.WEBHOOK_QUEUE_SIZE
+)
+
 if __name__ == "__main__":
     import uvicorn
     print("サーバーを起動します。 http://127.0.0.1:8000")
@@ -0,0 +1,39 @@
+# src/services/adaptive_retriever.py
+"""
+スコア分布に応じて取得件数を変える適応型top-k検索
+1位が明確に抜けていれば1件だけ、スコアが横並びなら件数を広げ、距離の上限（類似度の下限）で打ち切る
+"""
+
+from typing import Any, List, Sequence, Tuple
+
+def select_adaptive(results: Sequence[Tuple[Any, float]], min_k: int = 1, max_k: int = 6,
+                    dominance_gap: float = 0.15, flat_window: float = 0.1,
+                    max_distance: float = 1.4) -> List[Tuple[Any, float]]:
+    """
+    候補からスコア分布に応じて採用するチャンクを選ぶ
+
+    Args:
+        results: (Document, L2距離) の候補（距離が小さいほど類似）
+        min_k: 最低限採用する件数
+        max_k: 最大採用件数
+        dominance_gap: 1位と2位の距離差がこれ以上なら1位のみで十分とみなす
+        flat_window: 1位からの距離差がこの範囲内の候補は横並びとみなして採用する
+        max_distance: これより遠い候補は採用しない（類似度の下限）
+
+    Returns:
+        採用した (Document, L2距離) のリスト（距離の小さい順）
+    """
+    ranked = sorted(results, key=lambda item: item[1])
+    if not ranked:
+        return []
+
+    best = ranked[0][1]
+    if len(ranked) == 1 or ranked[1][1] - best >= dominance_gap:
+        return ranked[:max(1, min_k)]
+
+    selected = []
+    for doc, score in ranked[:max_k]:
+        if len(selected) >= min_k and (score > max_distance or score - best > flat_window):
+            break
+        selected.append((doc, score))
+    return selected
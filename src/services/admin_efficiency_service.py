@@ -7,18 +7,14 @@
 import json
 import os
 from datetime import datetime
-from langchain_openai import ChatOpenAI
-from config import Config
+from services.llm_registry import get_llm
+from services.message_dispatcher import answer_generator
 from collections import defaultdict
 import statistics
 
 class AdminEfficiencyService:
     def __init__(self):
-        self.model = ChatOpenAI(
-            model_name="gpt-4o-mini",
-            openai_api_key=Config.OPENAI_API_KEY,
-            temperature=0
-        )
+        self.model = get_llm("analysis")
         self.staff_data = self._load_staff_data()
         
     def _load_staff_data(self):
@@ -324,6 +320,7 @@ class AdminEfficiencyService:
         except Exception as e:
             return f"スキル開発分析中にエラーが発生しました: {e}"
     
+    @answer_generator
     def query_admin_efficiency(self, query: str) -> str:
         """事務効率化分析のメインエントリーポイント"""
         query_lower = query.lower()
@@ -1,9 +1,11 @@
 # src/services/agent_service.py
+import threading
 from typing import List, Dict, Any, Optional
 from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain_core.tools import Tool
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from services.llm_registry import get_llm
+from services.message_dispatcher import answer_generator
 from config import Config
 from services.web_search_service import WebSearchService
 from services.rag_service import RAGService
@@ -13,17 +15,14 @@ class OfficeAIAgent:
     
     def __init__(self, rag_service: RAGService, web_search_service: Optional[WebSearchService] = None, structured_report_history: Optional[Dict[str, Any]] = None):
         """エージェントを初期化"""
-        self.llm = ChatOpenAI(
-            model="gpt-4o",
-            temperature=0.7,
-            api_key=Config.OPENAI_API_KEY
-        )
+        # ツール呼び出しの結果に応じて応答が変わるため、エージェントは応答キャッシュを使わない（rag_answer の既定）
+        self.llm = get_llm("rag_answer")
         
         # 各種サービスの初期化: 引数で受け取ったものを使用
         self.web_search_service = web_search_service if web_search_service else WebSearchService()
         self.rag_service = rag_service  # main.pyから渡された初期化済みrag_serviceを使用
         self.structured_report_history = structured_report_history if structured_report_history is not None else {}
-        self.current_user_id = None  # process_queryで設定される
+        self._local = threading.local()  # current_user_idはワーカースレッドごとに保持
         
         # ツールリストの準備
         self.tools = self._setup_tools()
@@ -31,6 +30,15 @@ class OfficeAIAgent:
         # エージェントの作成
         self.agent_executor = self._create_agent()
     
+    @property
+    def current_user_id(self) -> Optional[str]:
+        """process_queryで設定されるユーザーID（複数ユーザーの並列処理に備えスレッド単位）"""
+        return getattr(self._local, "user_id", None)
+    
+    @current_user_id.setter
+    def current_user_id(self, user_id: Optional[str]):
+        self._local.user_id = user_id
+    
     def _setup_tools(self) -> List[Tool]:
         """エージェントが使用するツールを設定"""
         tools = []
@@ -220,8 +228,9 @@ class OfficeAIAgent:
             if "有給" in query and "申請" in query:
                 return self._get_natural_leave_application_info()
             
-            # 通常のRAG検索を実行
-            return self.rag_service.query_office(query)
+            # 事務規定と手続きガイドを1回の検索で横断してからRAG回答を生成
+            docs = self.rag_service.search_collections(query, ["office", "procedures"])
+            return self.rag_service.query_office(query, docs=docs or None)
         except Exception as e:
             return f"事務規定データベース検索エラー: {str(e)}"
     
@@ -235,14 +244,7 @@ class OfficeAIAgent:
     def _get_natural_leave_application_info(self) -> str:
         """自然な会話スタイルで有給申請情報を返す"""
         try:
-            from langchain_openai import ChatOpenAI
-            from config import Config
-            
-            llm = ChatOpenAI(
-                model="gpt-4o",
-                temperature=0.7,
-                api_key=Config.OPENAI_API_KEY
-            )
+            llm = get_llm("rag_answer")
             
             prompt = """以下の有給申請情報を、自然な会話スタイルで親しみやすく伝えてください。
 
@@ -382,6 +384,7 @@ AIから田中さんへの自動メール送信も可能。"""
         
         return f"「{query}」に関する情報を最新のレポートから見つけることができませんでした。より具体的な質問をお試しください。"
     
+    @answer_generator
     def process_query(self, user_query: str, conversation_context: Optional[str] = None, user_id: Optional[str] = None) -> str:
         """ユーザーの質問を処理"""
         try:
@@ -7,17 +7,21 @@
 import json
 import os
 from datetime import datetime
-from langchain_openai import ChatOpenAI
-from config import Config
+from services.llm_registry import get_llm
+from services.message_dispatcher import answer_generator
 from collections import defaultdict
+from utils.keyword_matcher import KeywordMatcher
+
+# 分析の種類 -> キーワード（上から順に優先）
+BED_MANAGEMENT_MATCHER = KeywordMatcher({
+    "occupancy": ["稼働率", "占床率", "ベッド", "病床"],
+    "los": ["在院日数", "平均在院", "los", "滞在"],
+    "discharge": ["退院調整", "地域連携", "転院", "在宅"]
+}, ignore_case=True)
 
 class BedManagementService:
     def __init__(self):
-        self.model = ChatOpenAI(
-            model_name="gpt-4o-mini",
-            openai_api_key=Config.OPENAI_API_KEY,
-            temperature=0
-        )
+        self.model = get_llm("analysis")
         self.bed_data = self._load_bed_data()
         self.comprehensive_data = self._load_comprehensive_medical_data()
         
@@ -209,16 +213,16 @@ class BedManagementService:
         except Exception as e:
             return f"退院調整分析中にエラーが発生しました: {e}"
     
+    @answer_generator
     def query_bed_management(self, query: str) -> str:
         """病床管理分析のメインエントリーポイント"""
-        query_lower = query.lower()
-        
         # キーワードによる機能振り分け
-        if any(keyword in query_lower for keyword in ["稼働率", "占床率", "ベッド", "病床"]):
+        analysis_type = BED_MANAGEMENT_MATCHER.first_label(query)
+        if analysis_type == "occupancy":
             return self.analyze_occupancy_performance(query)
-        elif any(keyword in query_lower for keyword in ["在院日数", "平均在院", "los", "滞在"]):
+        elif analysis_type == "los":
             return self.analyze_los_optimization(query)
-        elif any(keyword in query_lower for keyword in ["退院調整", "地域連携", "転院", "在宅"]):
+        elif analysis_type == "discharge":
             return self.analyze_discharge_planning(query)
         else:
             # 汎用的な病床管理分析
@@ -7,18 +7,23 @@ A病院の査定傾向分析、収益性分析、ベンチマーク比較を提
 import json
 import os
 from datetime import datetime, timedelta
-from langchain_openai import ChatOpenAI
-from config import Config
+from services.llm_registry import get_llm
+from services.message_dispatcher import answer_generator
 import pandas as pd
 from collections import defaultdict
+from utils.keyword_matcher import KeywordMatcher
+
+# 分析の種類 -> キーワード（上から順に優先）
+BILLING_ANALYSIS_MATCHER = KeywordMatcher({
+    "returns": ["返戻", "返戻率", "処置", "疾患コード", "返戻理由"],
+    "assessment": ["査定", "減点", "審査"],
+    "revenue": ["収益", "売上", "収入", "点数"],
+    "benchmark": ["競合", "比較", "ベンチマーク", "他院"]
+}, ignore_case=True)
 
 class BillingAnalysisService:
     def __init__(self):
-        self.model = ChatOpenAI(
-            model_name="gpt-4o",
-            openai_api_key=Config.OPENAI_API_KEY,
-            temperature=0.7
-        )
+        self.model = get_llm("billing")
         self.billing_data = self._load_billing_data()
         self.comprehensive_data = self._load_comprehensive_medical_data()
         self.billing_return_data = self._load_billing_return_data()
@@ -168,6 +173,7 @@ class BillingAnalysisService:
         except Exception as e:
             return f"査定分析中にエラーが発生しました: {e}"
     
+    @answer_generator
     def analyze_revenue_performance(self, query: str) -> str:
         """収益性分析"""
         # 月別収益分析
@@ -278,18 +284,18 @@ class BillingAnalysisService:
         except Exception as e:
             return f"競合分析中にエラーが発生しました: {e}"
     
+    @answer_generator
     def query_billing_analysis(self, query: str) -> str:
         """診療報酬分析のメインエントリーポイント"""
-        query_lower = query.lower()
-        
         # キーワードによる機能振り分け
-        if any(keyword in query_lower for keyword in ["返戻", "返戻率", "処置", "疾患コード", "返戻理由"]):
+        analysis_type = BILLING_ANALYSIS_MATCHER.first_label(query)
+        if analysis_type == "returns":
             return self.analyze_return_trends(query)
-        elif any(keyword in query_lower for keyword in ["査定", "減点", "審査"]):
+        elif analysis_type == "assessment":
             return self.analyze_assessment_trends(query)
-        elif any(keyword in query_lower for keyword in ["収益", "売上", "収入", "点数"]):
+        elif analysis_type == "revenue":
             return self.analyze_revenue_performance(query)
-        elif any(keyword in query_lower for keyword in ["競合", "比較", "ベンチマーク", "他院"]):
+        elif analysis_type == "benchmark":
             return self.analyze_competitive_benchmarking(query)
         else:
             # 汎用的な診療報酬分析
@@ -7,18 +7,14 @@
 import json
 import os
 from datetime import datetime
-from langchain_openai import ChatOpenAI
+from services.llm_registry import get_llm
 from config import Config
 from collections import defaultdict
 import random
 
 class ClinicalAnalysisService:
     def __init__(self):
-        self.model = ChatOpenAI(
-            model_name="gpt-4o-mini",
-            openai_api_key=Config.OPENAI_API_KEY,
-            temperature=0
-        )
+        self.model = get_llm("analysis")
         self.clinical_data = self._generate_clinical_summary()
         
     def _generate_clinical_summary(self):
@@ -0,0 +1,192 @@
+# src/services/context_builder.py
+"""
+トークン予算付きのRAGコンテキスト組み立て
+検索結果を関連度順のまま、隣接チャンクの重複部分（chunk_overlap）を取り除き、
+カテゴリごとのトークン予算に収まるまで詰めてからプロンプトに渡す
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken未導入の環境では文字数から概算する
+    tiktoken = None
+
+# 重複とみなす最小文字数（短い一致は偶然の一致として扱わない）
+MIN_OVERLAP_CHARS = 20
+# 重複を探す最大文字数（chunk_overlapの設定値より大きめに取る）
+MAX_OVERLAP_CHARS = 300
+# 予算の残りがこれ未満なら途中で切ったチャンクを追加しない
+MIN_PARTIAL_TOKENS = 50
+
+class TokenCounter:
+    """モデルのトークナイザーでトークン数を数える（未導入時は文字数で概算）"""
+
+    def __init__(self, model_name: str = "gpt-4o"):
+        self.encoding = None
+        if tiktoken is not None:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count(self, text: str) -> int:
+        """トークン数を数える"""
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text))
+        # 日本語はおおむね1文字1トークン前後のため、多めに見積もる
+        return len(text)
+
+    def truncate(self, text: str, max_tokens: int, keep_tail: bool = False) -> str:
+        """
+        テキストを最大トークン数に切り詰める
+
+        Args:
+            text: 対象のテキスト
+            max_tokens: 最大トークン数
+            keep_tail: Trueなら末尾（最新の会話など）を残す
+        """
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text)
+            tokens = tokens[-max_tokens:] if keep_tail else tokens[:max_tokens]
+            return self.encoding.decode(tokens)
+        return text[-max_tokens:] if keep_tail else text[:max_tokens]
+
+class ContextBuilder:
+    """検索結果をカテゴリ別のトークン予算に収めてコンテキスト文字列にする"""
+
+    def __init__(self, budgets: Dict[str, int], default_budget: int = 1500,
+                 model_name: str = "gpt-4o"):
+        """
+        Args:
+            budgets: カテゴリ -> トークン予算
+            default_budget: 未登録カテゴリのトークン予算
+            model_name: トークン数を数えるモデル名
+        """
+        self.budgets = dict(budgets)
+        self.default_budget = default_budget
+        self.counter = TokenCounter(model_name)
+        self._lock = threading.Lock()
+        self._stats = {
+            "builds": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "overlap_tokens_removed": 0,
+            "budget_tokens_dropped": 0,
+            "by_category": {}
+        }
+
+    def build(self, results: Sequence[Any], category: str, budget: Optional[int] = None) -> str:
+        """
+        検索結果からコンテキストを組み立てる
+
+        Args:
+            results: 関連度の高い順の Document または (Document, L2距離) のリスト
+            category: 予算を決めるカテゴリ名
+            budget: トークン予算（未指定ならカテゴリの設定値）
+
+        Returns:
+            予算内に収めたコンテキスト文字列
+        """
+        budget = self.budgets.get(category, self.default_budget) if budget is None else budget
+        ordered = self._ranked_documents(results)
+
+        input_tokens = sum(self.counter.count(doc.page_content) for doc in ordered)
+        kept: List[Tuple[str, str]] = []  # (source, text)
+        used_tokens = 0
+        overlap_removed = 0
+
+        for doc in ordered:
+            source = (getattr(doc, "metadata", None) or {}).get("source", "")
+            original = doc.page_content.strip()
+            text = self._strip_overlap(original, [t for s, t in kept if s == source])
+            overlap_removed += self.counter.count(original) - self.counter.count(text)
+            if not text:
+                continue
+
+            remaining = budget - used_tokens
+            tokens = self.counter.count(text)
+            if tokens > remaining:
+                if remaining < MIN_PARTIAL_TOKENS:
+                    break
+                text = self.counter.truncate(text, remaining)
+                tokens = self.counter.count(text)
+            kept.append((source, text))
+            used_tokens += tokens
+
+        context = "\n\n".join(text for _, text in kept)
+        self._record(category, input_tokens, used_tokens, overlap_removed)
+        return context
+
+    def fit(self, text: str, category: str, keep_tail: bool = False) -> str:
+        """
+        会話履歴などの付加情報を予算内に切り詰める
+
+        Args:
+            text: 対象のテキスト
+            category: 予算を決めるカテゴリ名（history, detailed_salesなど）
+            keep_tail: Trueなら末尾（最新の会話）を残す
+        """
+        if not text:
+            return text
+        budget = self.budgets.get(category, self.default_budget)
+        input_tokens = self.counter.count(text)
+        fitted = self.counter.truncate(text, budget, keep_tail=keep_tail)
+        self._record(category, input_tokens, self.counter.count(fitted), 0)
+        return fitted
+
+    def get_stats(self) -> Dict[str, Any]:
+        """節約できたトークン数の累計を取得"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["by_category"] = {category: dict(values) for category, values in self._stats["by_category"].items()}
+        stats["tokens_saved"] = stats["input_tokens"] - stats["output_tokens"]
+        stats["budgets"] = dict(self.budgets)
+        stats["exact_token_count"] = self.counter.encoding is not None
+        return stats
+
+    @staticmethod
+    def _ranked_documents(results: Sequence[Any]) -> List[Any]:
+        """
+        Documentのリストに揃える
+        RAGService.retrieve の結果はスコア順（ベクトル距離、またはハイブリッド検索の統合順位）に並んでいるため順序は変えない
+        """
+        return [item[0] if isinstance(item, tuple) else item for item in results]
+
+    @staticmethod
+    def _strip_overlap(text: str, previous_texts: List[str]) -> str:
+        """採用済みチャンクと重なる先頭・末尾を取り除く（完全に含まれる場合は空文字）"""
+        for previous in previous_texts:
+            if text in previous:
+                return ""
+            limit = min(len(text), len(previous), MAX_OVERLAP_CHARS)
+            for length in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+                if previous.endswith(text[:length]):
+                    text = text[length:].lstrip()
+                    break
+                if previous.startswith(text[-length:]):
+                    text = text[:-length].rstrip()
+                    break
+        return text
+
+    def _record(self, category: str, input_tokens: int, output_tokens: int, overlap_removed: int):
+        """統計を更新してログを出力"""
+        saved = input_tokens - output_tokens
+        with self._lock:
+            self._stats["builds"] += 1
+            self._stats["input_tokens"] += input_tokens
+            self._stats["output_tokens"] += output_tokens
+            self._stats["overlap_tokens_removed"] += overlap_removed
+            self._stats["budget_tokens_dropped"] += max(0, saved - overlap_removed)
+            by_category = self._stats["by_category"].setdefault(category, {"builds": 0, "tokens_saved": 0})
+            by_category["builds"] += 1
+            by_category["tokens_saved"] += saved
+        if saved > 0:
+            print(f"🧮 コンテキスト [{category}]: {input_tokens}→{output_tokens} tokens (節約 {saved}, 重複除去 {overlap_removed})")
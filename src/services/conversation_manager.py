@@ -2,24 +2,58 @@
 """
 会話履歴管理サービス
 LINE Bot での継続的な会話をサポート
+
+セッションは最終発言時刻の古い順に並べたOrderedDictで保持し、期限切れの削除は先頭から期限内のセッションに
+当たるまで取り除くだけにする（ユーザー数に関係なく1件あたりO(1)）
+履歴はユーザーごとの固定長deque、全体はユーザー数と会話の合計サイズの上限を超えたら最も古いセッションから破棄する
 """
 
 import json
+import threading
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
+
+from utils.keyword_matcher import KeywordMatcher
+
+# 不完全な質問の語尾パターン
+INCOMPLETE_SUFFIXES = ("で", "なら", "だと", "について", "の", "は？", "って", "だったら")
+
+# 文脈補完が必要な表現パターン
+CONTEXT_DEPENDENT_MATCHER = KeywordMatcher({
+    "context": [
+        "の話です", "の話", "について", "に関して", "のことです",
+        "複合機で", "複合機の", "プリンターで", "プリンターの",
+        "カメラで", "カメラの", "トナーで", "トナーの"
+    ]
+})
 
 class ConversationManager:
-    def __init__(self, max_history: int = 5, session_timeout_hours: int = 24):
+    def __init__(self, max_history: int = 5, session_timeout_hours: int = 24,
+                 max_users: int = 10000, max_bytes: int = 50 * 1024 * 1024):
         """
         会話履歴管理の初期化
         
         Args:
             max_history: 保持する会話履歴の最大数
             session_timeout_hours: セッションのタイムアウト時間（時間）
+            max_users: 保持するセッション数の上限（超過時は最終発言が最も古いユーザーから破棄）
+            max_bytes: 保持する会話の合計サイズの上限（UTF-8のバイト数）
         """
-        self.conversations: Dict[str, Dict] = {}
-        self.max_history = max_history
+        # user_id -> セッション（最終発言時刻の古い順）
+        self.conversations: "OrderedDict[str, Dict]" = OrderedDict()
+        self.max_history = max(1, max_history)
         self.session_timeout = timedelta(hours=session_timeout_hours)
+        self.max_users = max(1, max_users)
+        self.max_bytes = max(1, max_bytes)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        
+        # 統計情報
+        self._stats = {
+            "expired": 0,
+            "evicted": 0
+        }
     
     def add_message(self, user_id: str, user_message: str, ai_response: str, category: str = None):
         """
@@ -33,21 +67,6 @@ class ConversationManager:
         """
         now = datetime.now()
         
-        # 新規ユーザーまたはセッション初期化
-        if user_id not in self.conversations:
-            self.conversations[user_id] = {
-                "history": [],
-                "last_activity": now,
-                "session_start": now
-            }
-        
-        # セッションタイムアウトチェック
-        session = self.conversations[user_id]
-        if now - session["last_activity"] > self.session_timeout:
-            # セッションリセット
-            session["history"] = []
-            session["session_start"] = now
-        
         # メッセージ追加
         message_entry = {
             "timestamp": now.isoformat(),
@@ -55,13 +74,53 @@ class ConversationManager:
             "ai_response": ai_response,
             "category": category
         }
+        entry_size = len(user_message.encode("utf-8")) + len(ai_response.encode("utf-8"))
         
-        session["history"].append(message_entry)
-        session["last_activity"] = now
-        
-        # 履歴数制限
-        if len(session["history"]) > self.max_history:
-            session["history"] = session["history"][-self.max_history:]
+        with self._lock:
+            session = self.conversations.get(user_id)
+            
+            # 新規ユーザーまたはセッション初期化
+            if session is None:
+                session = {
+                    "history": deque(maxlen=self.max_history),
+                    "last_activity": now,
+                    "session_start": now,
+                    "size": 0
+                }
+                self.conversations[user_id] = session
+            
+            # セッションタイムアウトチェック
+            elif now - session["last_activity"] > self.session_timeout:
+                # セッションリセット
+                session["history"].clear()
+                self._total_bytes -= session["size"]
+                session["size"] = 0
+                session["session_start"] = now
+            
+            # 履歴数制限（固定長のため、満杯なら最も古い会話が押し出される）
+            history = session["history"]
+            if len(history) == history.maxlen:
+                pushed_out_size = self._entry_size(history[0])
+                session["size"] -= pushed_out_size
+                self._total_bytes -= pushed_out_size
+            history.append(message_entry)
+            session["size"] += entry_size
+            self._total_bytes += entry_size
+            session["last_activity"] = now
+            self.conversations.move_to_end(user_id)
+            
+            # 上限を超えた分は最終発言が最も古いセッションから破棄
+            while len(self.conversations) > 1 and (
+                len(self.conversations) > self.max_users or self._total_bytes > self.max_bytes
+            ):
+                _, oldest = self.conversations.popitem(last=False)
+                self._total_bytes -= oldest["size"]
+                self._stats["evicted"] += 1
+    
+    @staticmethod
+    def _entry_size(entry: Dict[str, Any]) -> int:
+        """会話1件のサイズ（UTF-8のバイト数）"""
+        return len(entry["user_message"].encode("utf-8")) + len(entry["ai_response"].encode("utf-8"))
     
     def get_conversation_context(self, user_id: str) -> str:
         """
@@ -91,7 +150,7 @@ class ConversationManager:
         context_parts = []
         context_parts.append("# 前回までの会話履歴")
         
-        for i, entry in enumerate(history[-3:], 1):  # 直近3件
+        for i, entry in enumerate(list(history)[-3:], 1):  # 直近3件
             context_parts.append(f"## 会話{i}")
             context_parts.append(f"**ユーザー質問**: {entry['user_message']}")
             context_parts.append(f"**AI回答要約**: {entry['ai_response'][:200]}...")
@@ -264,30 +323,17 @@ class ConversationManager:
             print(f"🔍 ConversationManager: too short -> incomplete")
             return True
         
-        # 不完全なパターン
-        incomplete_patterns = [
-            "で", "なら", "だと", "について", "の", "は？", "って", "だったら"
-        ]
-        
-        # 文脈補完が必要な表現パターン
-        context_dependent_patterns = [
-            "の話です", "の話", "について", "に関して", "のことです", 
-            "複合機で", "複合機の", "プリンターで", "プリンターの",
-            "カメラで", "カメラの", "トナーで", "トナーの"
-        ]
-        
-        # 質問が特定のパターンのみの場合
+        # 質問が特定のパターンのみ・特定のパターンで終わる場合
         stripped = user_message.strip()
-        for pattern in incomplete_patterns:
-            if stripped == pattern or stripped.endswith(pattern):
-                print(f"🔍 ConversationManager: matches pattern '{pattern}' -> incomplete")
-                return True
+        if stripped.endswith(INCOMPLETE_SUFFIXES):
+            print(f"🔍 ConversationManager: ends with incomplete pattern -> incomplete")
+            return True
         
         # 文脈補完が必要な表現パターンのチェック
-        for pattern in context_dependent_patterns:
-            if pattern in stripped:
-                print(f"🔍 ConversationManager: matches context pattern '{pattern}' -> incomplete")
-                return True
+        hits = CONTEXT_DEPENDENT_MATCHER.scan(stripped)
+        if hits:
+            print(f"🔍 ConversationManager: matches context pattern {sorted(hits['context'])} -> incomplete")
+            return True
         
         print(f"🔍 ConversationManager: complete query")
         return False
@@ -320,15 +366,30 @@ class ConversationManager:
     def cleanup_old_sessions(self):
         """
         古いセッションをクリーンアップ
+        セッションは最終発言時刻の古い順に並んでいるため、期限内のセッションに当たった時点で終了する
         """
-        now = datetime.now()
-        expired_users = []
-        
-        for user_id, session in self.conversations.items():
-            if now - session["last_activity"] > self.session_timeout:
-                expired_users.append(user_id)
+        expired_before = datetime.now() - self.session_timeout
+        expired_count = 0
         
-        for user_id in expired_users:
-            del self.conversations[user_id]
+        with self._lock:
+            while self.conversations:
+                user_id, session = next(iter(self.conversations.items()))
+                if session["last_activity"] >= expired_before:
+                    break
+                del self.conversations[user_id]
+                self._total_bytes -= session["size"]
+                expired_count += 1
+            self._stats["expired"] += expired_count
         
-        return len(expired_users)
\ No newline at end of file
+        return expired_count
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """セッション数・会話の合計サイズ・破棄数を取得"""
+        with self._lock:
+            return {
+                "sessions": len(self.conversations),
+                "total_bytes": self._total_bytes,
+                "max_users": self.max_users,
+                "max_bytes": self.max_bytes,
+                **self._stats
+            }
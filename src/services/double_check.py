@@ -1,16 +1,12 @@
 # src/services/double_check.py (OpenAI版)
 import json
 import re
-from langchain_openai import ChatOpenAI
-from config import Config
+from services.llm_registry import get_llm
+from services.message_dispatcher import answer_generator
 
 class DoubleCheckService:
     def __init__(self):
-        self.model = ChatOpenAI(
-            model_name="gpt-4o-mini",
-            openai_api_key=Config.OPENAI_API_KEY,
-            temperature=0
-        )
+        self.model = get_llm("analysis")
         self.patient_data = self._load_patient_data()
 
     def _load_patient_data(self):
@@ -31,6 +27,7 @@ class DoubleCheckService:
         elif "造影剤" in text or "CT造影剤" in text: medication = "造影剤"
         return patient_id, medication
 
+    @answer_generator
     def check_medication(self, text: str) -> str:
         patient_id, medication = self._extract_info(text)
         if not patient_id or not medication:
@@ -1,10 +1,105 @@
 # src/services/email_send_service.py - メール送信専用サービス
 import re
+import contextvars
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, Any, Optional, List, Tuple
 from config import Config
+from utils.http_transport import http_transport
+from services.n8n_outbox import n8n_outbox
+from services.llm_registry import get_llm
+from utils.keyword_matcher import KeywordMatcher
+
+# メール送信の意図判定に使うキーワード
+EMAIL_KEYWORDS = ["メール", "送信", "送って", "連絡", "報告", "通知", "お知らせ", "共有", "転送", "配信"]
+# 田中さんへのメール依頼パターン（柔軟対応）
+TANAKA_EMAIL_PATTERNS = ["田中さんにメール", "田中さんに連絡", "田中さんに報告", "田中にメール", "田中に連絡"]
+# パスワード関連キーワード
+PASSWORD_KEYWORDS = ["パスワード", "ログイン", "ログインできない", "侍", "販売管理ソフト", "システム"]
+# フォローアップメール送信パターン
+FOLLOWUP_EMAIL_PATTERNS = ["もう一度メール送って", "再度メール送信", "メール再送", "もう一回送って", "再送して"]
+# LLMでの下書きが必要なシステム関連キーワード（田中さん宛）
+DRAFT_SYSTEM_KEYWORDS = ["侍", "パスワード", "ログイン", "販売管理"]
+# パスワードリセットの定型メールを使うキーワード
+PASSWORD_RESET_KEYWORDS = ["パスワード", "ログインできない", "ログイン"]
+
+# システム固有のキーワード -> メールに記載するシステム名（上から順に判定）
+SYSTEM_KEYWORDS = {
+    "侍": "販売管理ソフト「侍」",
+    "販売管理": "販売管理システム",
+    "勤怠": "勤怠管理システム",
+    "有給": "勤怠管理システム",
+    "パスワード": "システムパスワード"
+}
+
+# メール関連の意図 -> キーワード（1回の走査ですべての意図を検出する）
+EMAIL_INTENT_MATCHER = KeywordMatcher({
+    "email": EMAIL_KEYWORDS,
+    "tanaka_email": TANAKA_EMAIL_PATTERNS,
+    "password": PASSWORD_KEYWORDS,
+    "followup": FOLLOWUP_EMAIL_PATTERNS,
+    "tanaka": ["田中"],
+    "draft_system": DRAFT_SYSTEM_KEYWORDS,
+    "password_reset": PASSWORD_RESET_KEYWORDS,
+    "reset_contact": ["田中", "システムソリューション"]
+})
+
+def detect_email_intents(message: str) -> set:
+    """
+    メッセージに含まれるメール関連の意図を1回の走査で検出する
+
+    Returns:
+        EMAIL_INTENT_MATCHER のラベルのうち検出したもの
+    """
+    return EMAIL_INTENT_MATCHER.labels(message)
+
+# 定型メール（生成時刻以外は固定のため、LLMを呼ばずに埋め込むだけで作成する）
+FOLLOWUP_EMAIL_TEMPLATE = """田中様
+
+お世話になっております。
+
+先ほど依頼いたしました販売管理ソフト「侍」のパスワードリセットの件について、再度ご連絡させていただきます。
+
+【依頼内容】
+- システム名: 販売管理ソフト「侍」
+- 問題: パスワードがわからなくなった
+- 緊急度: normal
+
+お忙しい中恐れ入りますが、パスワードの再設定をお願いいたします。
+
+どうぞよろしくお願いいたします。
+
+【このメールはAIアシスタントから自動送信されています】
+生成時刻: {generated_at}"""
+
+PASSWORD_RESET_EMAIL_TEMPLATE = """田中様
+
+お世話になっております。
+
+{system_name}のパスワードリセットをお願いしたく、ご連絡させていただきました。
+
+【依頼内容】
+- システム名: {system_name}
+- 依頼者: {user_name}  
+- 問題: ログインパスワードが不明
+- 緊急度: 高{additional_context}
+
+【状況詳細】
+{situation}...
+
+パスワードの再設定をお願いいたします。
+お手数をおかけいたしますが、どうぞよろしくお願いいたします。
+
+【このメールはAIアシスタントから自動送信されています】
+生成時刻: {generated_at}"""
+
+TANAKA_RECIPIENT = {
+    "email": "katsura@hbm-web.co.jp",
+    "name": "田中さん",
+    "type": "staff"
+}
 
 class EmailSendService:
     """メール送信専用サービス - N8N連携"""
@@ -16,6 +111,9 @@ class EmailSendService:
         print(f"🔍 DEBUG: self.n8n_webhook_url = {self.n8n_webhook_url}")
         self.timeout = 30
         
+        # 自由記述メールのLLM下書きは返信後にバックグラウンドで行う
+        self._draft_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="email-draft")
+        
         # メールアドレスパターン（正規表現）
         self.email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
         
@@ -32,68 +130,33 @@ class EmailSendService:
     
     def should_send_email(self, user_message: str, ai_response: str) -> bool:
         """メール送信が必要かどうかを判定"""
-        email_keywords = [
-            "メール", "送信", "送って", "連絡", "報告", "通知",
-            "お知らせ", "共有", "転送", "配信"
-        ]
-        
-        # 田中さんへのメール依頼パターン（柔軟対応）
-        tanaka_email_patterns = [
-            "田中さんにメール",
-            "田中さんに連絡", 
-            "田中さんに報告",
-            "田中にメール",
-            "田中に連絡"
-        ]
+        intents = detect_email_intents(user_message)
+        # メール関連のキーワードが1つもなければ即座に対象外（ほとんどのメッセージはここで終わる）
+        if not intents:
+            return False
         
-        # パスワード関連キーワード
-        password_keywords = [
-            "パスワード", "ログイン", "ログインできない",
-            "侍", "販売管理ソフト", "システム"
-        ]
-        
-        # 🔥 新機能：フォローアップメール送信パターン
-        followup_email_patterns = [
-            "もう一度メール送って",
-            "再度メール送信",
-            "メール再送",
-            "もう一回送って",
-            "再送して"
-        ]
+        has_email_keyword = "email" in intents
+        has_followup_email = "followup" in intents
+        has_tanaka_email = "tanaka_email" in intents
+        mentions_tanaka = "tanaka" in intents
+        has_password_related = "password" in intents
         
         # Web検索結果でメール送信依頼がある場合は特別処理
-        if "Web検索結果" in ai_response and any(keyword in user_message for keyword in email_keywords):
+        if has_email_keyword and "Web検索結果" in ai_response:
             print(f"🔍 DEBUG: Web検索結果 + メール送信キーワード検出")
             return True
         
-        # フォローアップメール送信パターンチェック
-        has_followup_email = any(pattern in user_message for pattern in followup_email_patterns)
-        
-        # 田中さんへのメール依頼パターンチェック
-        has_tanaka_email = any(pattern in user_message for pattern in tanaka_email_patterns)
-        
-        # 通常のメール送信キーワードチェック + 田中さん言及
-        has_email_keyword = any(keyword in user_message for keyword in email_keywords)
-        mentions_tanaka = "田中" in user_message
-        
-        # パスワード関連のチェック
-        has_password_related = any(keyword in user_message for keyword in password_keywords)
-        
         # 柔軟な判定ロジック
         result = (
             has_followup_email or  # フォローアップメール送信
             has_tanaka_email or  # 田中さんへのメール依頼
-            (has_email_keyword and mentions_tanaka) or  # メール + 田中さん言及
             (has_password_related and mentions_tanaka) or  # パスワード関連 + 田中さん言及
-            has_email_keyword  # 🔥 新機能：「メール」キーワードだけでも送信判定 True
+            has_email_keyword  # 「メール」などのキーワードだけでも送信判定 True
         )
         
         print(f"🔍 DEBUG: should_send_email = {result}")
         print(f"🔍 DEBUG: user_message = '{user_message}'")
-        print(f"🔍 DEBUG: 検出キーワード = {[kw for kw in email_keywords if kw in user_message]}")
-        print(f"🔍 DEBUG: フォローアップメール = {has_followup_email}")
-        print(f"🔍 DEBUG: 田中さんメール依頼 = {has_tanaka_email}")
-        print(f"🔍 DEBUG: パスワード関連 = {has_password_related}")
+        print(f"🔍 DEBUG: 検出した意図 = {sorted(intents)}")
         
         return result
     
@@ -112,12 +175,16 @@ class EmailSendService:
             return email_request
         
         email_request["should_send"] = True
+        intents = detect_email_intents(user_message)
         
-        # 🔥 新機能：柔軟な動的メール生成
-        if "田中" in user_message and any(keyword in user_message for keyword in ["侍", "パスワード", "ログイン", "販売管理"]):
-            email_request = self._create_dynamic_email(user_message, ai_response)
-        # 🔥 新機能：フォローアップメール送信の特別処理
-        elif any(pattern in user_message for pattern in ["もう一度メール送って", "再度メール送信", "メール再送", "もう一回送って", "再送して"]):
+        # 田中さんへのパスワードリセット依頼は定型メール、それ以外のシステム関連の依頼はLLMで下書き
+        if {"tanaka", "draft_system"} <= intents:
+            if "password_reset" in intents:
+                email_request = self._create_password_reset_email(user_message, ai_response)
+            else:
+                email_request = self._create_dynamic_email(user_message, ai_response)
+        # フォローアップメール送信の特別処理
+        elif "followup" in intents:
             email_request = self._create_followup_email(user_message, ai_response)
         # パスワードリセット関連の特別処理
         elif self._is_password_reset_request(user_message):
@@ -213,40 +280,22 @@ class EmailSendService:
     
     def _is_password_reset_request(self, message: str) -> bool:
         """パスワードリセット関連のリクエストか判定"""
-        password_keywords = ["パスワード", "ログインできない", "ログイン"]
-        tanaka_keywords = ["田中", "システムソリューション"]
-        
-        has_password_issue = any(keyword in message for keyword in password_keywords)
-        mentions_tanaka = any(keyword in message for keyword in tanaka_keywords)
-        
-        return has_password_issue or mentions_tanaka
+        intents = detect_email_intents(message)
+        return "password_reset" in intents or "reset_contact" in intents
     
-    def _create_dynamic_email(self, user_message: str, ai_response: str) -> Dict[str, Any]:
-        """ユーザーリクエストに基づいて動的にメール内容を生成"""
-        from langchain_openai import ChatOpenAI
-        from config import Config
-        
-        # システム固有のキーワードを検出
-        system_keywords = {
-            "侍": "販売管理ソフト「侍」",
-            "販売管理": "販売管理システム", 
-            "勤怠": "勤怠管理システム",
-            "有給": "勤怠管理システム",
-            "パスワード": "システムパスワード"
-        }
-        
-        detected_system = "業務システム"
-        for keyword, system_name in system_keywords.items():
+    def _detect_system(self, user_message: str, default: str = "業務システム") -> str:
+        """メッセージから対象のシステム名を判定"""
+        for keyword, system_name in SYSTEM_KEYWORDS.items():
             if keyword in user_message:
-                detected_system = system_name
-                break
-        
-        # AIでメール内容を動的生成
-        llm = ChatOpenAI(
-            model="gpt-4o",
-            temperature=0.7,
-            api_key=Config.OPENAI_API_KEY
-        )
+                return system_name
+        return default
+    
+    def _create_dynamic_email(self, user_message: str, ai_response: str) -> Dict[str, Any]:
+        """
+        ユーザーリクエストに基づいて自由記述メールの送信リクエストを作成
+        本文はLLMで下書きするため、ここではプロンプトだけを用意する（_draft_content で生成）
+        """
+        detected_system = self._detect_system(user_message)
         
         prompt = f"""
 あなたは阪南ビジネスマシンの優秀な事務アシスタントです。
@@ -290,173 +339,79 @@ class EmailSendService:
 メール本文のみを出力してください：
 """
         
+        # 件名はキーワードから決まるため、本文の生成を待たずに確定できる
+        if "パスワード" in user_message or "ログイン" in user_message:
+            subject = f"【パスワードリセット依頼】{detected_system}"
+        elif "問題" in user_message or "エラー" in user_message:
+            subject = f"【システム障害報告】{detected_system}"
+        elif "質問" in user_message or "問い合わせ" in user_message:
+            subject = f"【お問い合わせ】{detected_system}について"
+        else:
+            subject = f"【ご連絡】{detected_system}について"
+        
+        return {
+            "should_send": True,
+            "recipients": [dict(TANAKA_RECIPIENT)],
+            "subject": subject,
+            "content": None,
+            "draft_prompt": prompt,
+            "urgency": "high" if any(kw in user_message for kw in ["緊急", "至急", "すぐ"]) else "normal",
+            "original_request": user_message,
+            "ai_response": ai_response
+        }
+    
+    def _draft_content(self, email_request: Dict[str, Any]) -> Dict[str, Any]:
+        """LLMでメール本文を下書き（失敗時はパスワードリセットの定型メールにフォールバック）"""
+        prompt = email_request.pop("draft_prompt", None)
+        if prompt is None:
+            return email_request
         try:
-            email_content = llm.invoke(prompt).content
-            
-            # 件名を動的生成
-            if "パスワード" in user_message or "ログイン" in user_message:
-                subject = f"【パスワードリセット依頼】{detected_system}"
-            elif "問題" in user_message or "エラー" in user_message:
-                subject = f"【システム障害報告】{detected_system}"
-            elif "質問" in user_message or "問い合わせ" in user_message:
-                subject = f"【お問い合わせ】{detected_system}について"
-            else:
-                subject = f"【ご連絡】{detected_system}について"
-            
-            return {
-                "should_send": True,
-                "recipients": [{
-                    "email": "katsura@hbm-web.co.jp",
-                    "name": "田中さん",
-                    "type": "staff"
-                }],
-                "subject": subject,
-                "content": email_content,
-                "urgency": "high" if any(kw in user_message for kw in ["緊急", "至急", "すぐ"]) else "normal",
-                "original_request": user_message
-            }
-            
+            email_request["content"] = get_llm("email_draft").invoke(prompt).content
+            return email_request
         except Exception as e:
             print(f"❌ AI動的メール生成エラー: {e}")
             # フォールバック: 基本的なメール生成
-            return self._create_password_reset_email(user_message, ai_response)
-
-    def _create_dynamic_email(self, user_message: str, ai_response: str) -> Dict[str, Any]:
-        """ユーザーリクエストに基づいて動的にメール内容を生成"""
-        from langchain_openai import ChatOpenAI
-        from config import Config
-        
-        # システム固有のキーワードを検出
-        system_keywords = {
-            "侍": "販売管理ソフト「侍」",
-            "販売管理": "販売管理システム", 
-            "勤怠": "勤怠管理システム",
-            "有給": "勤怠管理システム",
-            "パスワード": "システムパスワード"
-        }
-        
-        detected_system = "業務システム"
-        for keyword, system_name in system_keywords.items():
-            if keyword in user_message:
-                detected_system = system_name
-                break
-        
-        # AIでメール内容を動的生成
-        llm = ChatOpenAI(
-            model="gpt-4o",
-            temperature=0.7,
-            api_key=Config.OPENAI_API_KEY
-        )
-        
-        prompt = f"""
-あなたは阪南ビジネスマシンの優秀な事務アシスタントです。
-以下のリクエストに基づいて、田中さん宛のビジネスメールを作成してください。
-
-【ユーザーリクエスト】
-{user_message}
-
-【AI分析結果】  
-{ai_response[:300]}
-
-【検出されたシステム】
-{detected_system}
-
-【メール作成指針】
-- 田中さんはシステムソリューション課の担当者
-- 丁寧で的確なビジネス文書にする
-- ユーザーの具体的な要求を正確に伝える
-- 必要な情報（システム名、問題内容、緊急度）を含める
-- 自然で読みやすい文章にする
-
-【メール形式】
-田中様
-
-お世話になっております。
-
-[メイン内容]
-
-【依頼内容】
-- システム名: {detected_system}  
-- 問題: [具体的な問題]
-- 緊急度: [判定]
-
-[依頼文]
-
-どうぞよろしくお願いいたします。
-
-【このメールはAIアシスタントから自動送信されています】
-生成時刻: {datetime.now().strftime('%Y年%m月%d日 %H時%M分')}
-
-メール本文のみを出力してください：
-"""
-        
+            return self._create_password_reset_email(email_request["original_request"], email_request.get("ai_response", ""))
+    
+    def _draft_and_send(self, email_request: Dict[str, Any]):
+        """バックグラウンドで本文を下書きしてから送信する"""
         try:
-            email_content = llm.invoke(prompt).content
-            
-            # 件名を動的生成
-            if "パスワード" in user_message or "ログイン" in user_message:
-                subject = f"【パスワードリセット依頼】{detected_system}"
-            elif "問題" in user_message or "エラー" in user_message:
-                subject = f"【システム障害報告】{detected_system}"
-            elif "質問" in user_message or "問い合わせ" in user_message:
-                subject = f"【お問い合わせ】{detected_system}について"
-            else:
-                subject = f"【ご連絡】{detected_system}について"
-            
-            return {
-                "should_send": True,
-                "recipients": [{
-                    "email": "katsura@hbm-web.co.jp",
-                    "name": "田中さん",
-                    "type": "staff"
-                }],
-                "subject": subject,
-                "content": email_content,
-                "urgency": "high" if any(kw in user_message for kw in ["緊急", "至急", "すぐ"]) else "normal",
-                "original_request": user_message
-            }
-            
+            result = self.send_email_via_n8n(self._draft_content(email_request))
+            print(f"📧 下書きメールの送信処理が完了しました: {result[:50]}")
         except Exception as e:
-            print(f"❌ AI動的メール生成エラー: {e}")
-            # フォールバック: 基本的なメール生成
-            return self._create_password_reset_email(user_message, ai_response)
+            print(f"❌ 下書きメールの送信中にエラー: {e}")
+    
+    def _send(self, email_request: Dict[str, Any]) -> str:
+        """
+        メールを送信する
+        LLMの下書きが必要な場合は、送信を受け付けた旨をすぐに返し、下書きと送信は返信後に行う
+        """
+        n8n_enabled = self.n8n_webhook_url and self.n8n_webhook_url != "disabled" and "your-n8n-instance" not in self.n8n_webhook_url
+        if email_request.get("draft_prompt") and n8n_enabled and Config.EMAIL_DEFER_DRAFT:
+            # 呼び出し元のコンテキスト（LLMの実行メタデータ）を引き継ぎ、下書きも元のメッセージに集計されるようにする
+            self._draft_executor.submit(contextvars.copy_context().run, self._draft_and_send, email_request)
+            return self._format_queued_confirmation(email_request)
+        # プレビュー表示（N8N無効時）や即時送信の場合はここで下書きする
+        return self.send_email_via_n8n(self._draft_content(email_request))
 
     def _create_followup_email(self, user_message: str, ai_response: str) -> Dict[str, Any]:
         """フォローアップメール送信を処理"""
         # 前回と同じメール内容を再送
         return {
             "should_send": True,
-            "recipients": [{
-                "email": "katsura@hbm-web.co.jp",
-                "name": "田中さん",
-                "type": "staff"
-            }],
+            "recipients": [dict(TANAKA_RECIPIENT)],
             "subject": "【再送】販売管理ソフト「侍」パスワードリセット依頼",
-            "content": """田中様
-
-お世話になっております。
-
-先ほど依頼いたしました販売管理ソフト「侍」のパスワードリセットの件について、再度ご連絡させていただきます。
-
-【依頼内容】
-- システム名: 販売管理ソフト「侍」
-- 問題: パスワードがわからなくなった
-- 緊急度: normal
-
-お忙しい中恐れ入りますが、パスワードの再設定をお願いいたします。
-
-どうぞよろしくお願いいたします。
-
-【このメールはAIアシスタントから自動送信されています】
-生成時刻: """ + datetime.now().strftime('%Y年%m月%d日 %H時%M分'),
+            "content": FOLLOWUP_EMAIL_TEMPLATE.format(generated_at=datetime.now().strftime('%Y年%m月%d日 %H時%M分')),
             "urgency": "normal",
             "original_request": user_message
         }
 
     def _create_password_reset_email(self, user_message: str, ai_response: str) -> Dict[str, Any]:
-        """パスワードリセット依頼メールを作成"""
-        # システムを特定
-        system_name = "勤怠管理システム" if "勤怠" in user_message or "有給" in user_message else "業務システム"
+        """パスワードリセット依頼メールを定型文から作成"""
+        # システムを特定（勤怠・有給は勤怠管理システム）
+        system_name = "勤怠管理システム" if "勤怠" in user_message or "有給" in user_message else self._detect_system(user_message)
+        if system_name == "システムパスワード":
+            system_name = "業務システム"
         
         # ユーザー名を抽出または推測
         user_name = "LINE AIアシスタント"
@@ -470,35 +425,17 @@ class EmailSendService:
         elif "営業" in ai_response:
             additional_context = "\n営業業務関連のシステムアクセスが必要と思われます。"
         
-        # より詳細で自然なメール内容を生成
-        email_content = f"""田中様
-
-お世話になっております。
-
-{system_name}のパスワードリセットをお願いしたく、ご連絡させていただきました。
-
-【依頼内容】
-- システム名: {system_name}
-- 依頼者: {user_name}  
-- 問題: ログインパスワードが不明
-- 緊急度: 高{additional_context}
-
-【状況詳細】
-{ai_response[:200]}...
-
-パスワードの再設定をお願いいたします。
-お手数をおかけいたしますが、どうぞよろしくお願いいたします。
-
-【このメールはAIアシスタントから自動送信されています】
-生成時刻: {datetime.now().strftime('%Y年%m月%d日 %H時%M分')}"""
+        email_content = PASSWORD_RESET_EMAIL_TEMPLATE.format(
+            system_name=system_name,
+            user_name=user_name,
+            additional_context=additional_context,
+            situation=ai_response[:200],
+            generated_at=datetime.now().strftime('%Y年%m月%d日 %H時%M分')
+        )
         
         return {
             "should_send": True,
-            "recipients": [{
-                "email": "katsura@hbm-web.co.jp",
-                "name": "田中さん",
-                "type": "staff"
-            }],
+            "recipients": [dict(TANAKA_RECIPIENT)],
             "subject": f"【パスワードリセット依頼】{system_name}",
             "content": email_content,
             "urgency": "high",
@@ -580,10 +517,16 @@ class EmailSendService:
         print(f"  urgency: {payload['urgency']}")
         print(f"  email_content: {payload['email_content'][:100]}...")
         
+        # アウトボックス有効時は登録だけして即座に返す（送信・再送はバックグラウンド、同じ内容の二重送信は防ぐ）
+        if n8n_outbox is not None:
+            _, is_new = n8n_outbox.enqueue("email", self.n8n_webhook_url, payload)
+            return self._format_queued_confirmation(email_request, duplicate=not is_new)
+        
         try:
             print(f"🚀 DEBUG: N8Nにリクエスト送信中...")
             print(f"🚀 DEBUG: URL: {self.n8n_webhook_url}")
-            response = requests.post(
+            response = http_transport.post(
+                "n8n",
                 self.n8n_webhook_url,
                 json=payload,
                 timeout=self.timeout,
@@ -597,14 +540,7 @@ class EmailSendService:
                 result = response.json() if response.text else {}
                 print(f"✅ DEBUG: パース済みレスポンス: {result}")
                 message = result.get("message", "メール送信処理を開始しました")
-                
-                recipients_text = ", ".join([r["name"] for r in email_request["recipients"]])
-                
-                # 緊急度に応じた対応時間の表現
-                response_time = "比較的早めにご対応いただけると思います" if email_request["urgency"] in ["high", "urgent"] else "ご都合の良いときにご対応いただけると思います"
-                
-                return f"""承知いたしました。{recipients_text}にメールをお送りしておきました。
-{email_request["subject"]}の件でご連絡しています。{response_time}。メールが届くまで少しお時間をいただく場合がありますが、よろしくお願いします。"""
+                return self._format_send_confirmation(email_request)
                 
             else:
                 return f"⚠️ メール送信処理でエラーが発生しました。(ステータス: {response.status_code})"
@@ -616,6 +552,24 @@ class EmailSendService:
         except requests.exceptions.RequestException as e:
             return f"❌ メール送信中にエラーが発生しました: {str(e)[:100]}..."
     
+    def _format_send_confirmation(self, email_request: Dict[str, Any]) -> str:
+        """メール送信を受け付けた旨のメッセージ"""
+        recipients_text = ", ".join([r["name"] for r in email_request["recipients"]])
+        
+        # 緊急度に応じた対応時間の表現
+        response_time = "比較的早めにご対応いただけると思います" if email_request["urgency"] in ["high", "urgent"] else "ご都合の良いときにご対応いただけると思います"
+        
+        return f"""承知いたしました。{recipients_text}にメールをお送りしておきました。
+{email_request["subject"]}の件でご連絡しています。{response_time}。メールが届くまで少しお時間をいただく場合がありますが、よろしくお願いします。"""
+    
+    def _format_queued_confirmation(self, email_request: Dict[str, Any], duplicate: bool = False) -> str:
+        """メール送信を受け付けた（まだ送信していない）旨のメッセージ"""
+        recipients_text = ", ".join([r["name"] for r in email_request["recipients"]])
+        if duplicate:
+            return f"""✅ {recipients_text}への「{email_request["subject"]}」のメールは既に送信を受け付けています。重複して送らないよう、今回の依頼はまとめて処理します。"""
+        return f"""✅ {recipients_text}への「{email_request["subject"]}」のメール送信を受け付けました。バックグラウンドで送信します。
+送信できなかった場合は管理者が再送しますので、届かない場合はお知らせください。"""
+    
     def _format_email_preview(self, email_request: Dict[str, Any]) -> str:
         """メール送信プレビュー（N8N無効時）"""
         recipients_text = ", ".join([f"{r['name']} ({r['email']})" for r in email_request["recipients"]])
@@ -667,7 +621,7 @@ class EmailSendService:
                         email_request = self._create_password_reset_email(user_message, ai_response)
                         
                     # メール送信実行
-                    send_result = self.send_email_via_n8n(email_request)
+                    send_result = self._send(email_request)
                     
                     combined_response = f"""{ai_response}
 
@@ -686,8 +640,8 @@ class EmailSendService:
 高見さん？辻川さん？それとも他の方でしょうか？"""
             return False, ai_response + additional_message
         
-        # N8N経由でメール送信
-        send_result = self.send_email_via_n8n(email_request)
+        # N8N経由でメール送信（LLM下書きが必要なものは返信後に送信）
+        send_result = self._send(email_request)
         
         # 元の回答 + 送信結果を結合
         combined_response = f"""{ai_response}
@@ -0,0 +1,170 @@
+# src/services/embedding_cache.py
+"""
+テキスト内容のハッシュをキーにした埋め込みベクトルのキャッシュ
+メモリ上のLRUとSQLiteの2段構成で、同じテキストの再埋め込み（API呼び出し）を防ぐ
+オンラインの質問埋め込みとオフラインのインデックス構築の両方で使用する
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+class CachedEmbeddings(Embeddings):
+    """埋め込みモデルをラップし、結果をメモリLRU + SQLiteにキャッシュする"""
+
+    def __init__(self, embeddings: Embeddings, max_entries: int = 5000,
+                 db_path: Optional[str] = None, namespace: Optional[str] = None):
+        """
+        埋め込みキャッシュの初期化
+
+        Args:
+            embeddings: 実際に埋め込みを計算するモデル（OpenAIEmbeddingsなど）
+            max_entries: メモリに保持するベクトルの最大数
+            db_path: 永続化用SQLiteファイルのパス（未指定ならメモリのみ）
+            namespace: キーに含めるモデル識別子（未指定ならモデル名）
+        """
+        self.embeddings = embeddings
+        self.max_entries = max(1, max_entries)
+        self.db_path = db_path or None
+        self.namespace = namespace or getattr(embeddings, "model", None) or type(embeddings).__name__
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        # 統計情報
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "api_calls": 0
+        }
+
+        if self.db_path:
+            self._open_database()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """複数テキストを埋め込み（キャッシュにないものだけをまとめてAPIに送る）"""
+        keys = [self._key(text) for text in texts]
+        results: List[Optional[List[float]]] = [self._lookup(key) for key in keys]
+
+        # 同じテキストが複数含まれていても1回だけ埋め込む
+        pending: Dict[str, int] = {}
+        for index, vector in enumerate(results):
+            if vector is None and keys[index] not in pending:
+                pending[keys[index]] = index
+
+        if pending:
+            missing_texts = [texts[index] for index in pending.values()]
+            with self._lock:
+                self._stats["api_calls"] += 1
+            vectors = self.embeddings.embed_documents(missing_texts)
+            computed = dict(zip(pending, vectors))
+            self._store(computed)
+            for index, key in enumerate(keys):
+                if results[index] is None:
+                    results[index] = list(computed[key])
+
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        """質問文を埋め込み（キャッシュがあればAPIを呼ばない）"""
+        key = self._key(text)
+        vector = self._lookup(key)
+        if vector is not None:
+            return vector
+
+        with self._lock:
+            self._stats["api_calls"] += 1
+        vector = self.embeddings.embed_query(text)
+        self._store({key: vector})
+        return list(vector)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット率とキャッシュサイズを取得"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["namespace"] = self.namespace
+        stats["persistent"] = self._conn is not None
+        return stats
+
+    def _key(self, text: str) -> str:
+        """モデル名とテキスト内容からキャッシュキーを生成"""
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        """メモリ → SQLiteの順にベクトルを探す"""
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return list(vector)
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT vector FROM embeddings WHERE cache_key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    print(f"⚠️ 埋め込みキャッシュの読み込みに失敗しました: {e}")
+                    row = None
+                if row is not None:
+                    vector = array("f", row[0]).tolist()
+                    self._remember(key, vector)
+                    self._stats["disk_hits"] += 1
+                    return list(vector)
+
+            self._stats["misses"] += 1
+            return None
+
+    def _store(self, vectors: Dict[str, List[float]]):
+        """計算したベクトルをメモリとSQLiteに保存"""
+        with self._lock:
+            for key, vector in vectors.items():
+                self._remember(key, list(vector))
+            if self._conn is None:
+                return
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (cache_key, vector) VALUES (?, ?)",
+                    [(key, array("f", vector).tobytes()) for key, vector in vectors.items()]
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ 埋め込みキャッシュの書き込みに失敗しました: {e}")
+
+    def _remember(self, key: str, vector: List[float]):
+        """メモリLRUに追加（呼び出し側でロック取得済み）"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _open_database(self):
+        """SQLiteファイルを開く（失敗時はメモリのみで動作）"""
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "cache_key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            print(f"✅ 埋め込みキャッシュを開きました: {count}件 ({self.db_path})")
+        except sqlite3.Error as e:
+            print(f"⚠️ 埋め込みキャッシュのDBを開けませんでした。メモリのみで動作します: {e}")
+            self._conn = None
@@ -7,17 +7,13 @@ A病院固有の診療実績・治療成績分析サービス
 import json
 import os
 from datetime import datetime
-from langchain_openai import ChatOpenAI
+from services.llm_registry import get_llm
 from config import Config
 from collections import defaultdict
 
 class EnhancedClinicalAnalysisService:
     def __init__(self):
-        self.model = ChatOpenAI(
-            model_name="gpt-4o-mini",
-            openai_api_key=Config.OPENAI_API_KEY,
-            temperature=0
-        )
+        self.model = get_llm("analysis")
         self.clinical_outcomes = self._load_clinical_outcomes()
         self.research_data = self._load_research_data() 
         self.detailed_patients = self._load_detailed_patients()
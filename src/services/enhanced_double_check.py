@@ -7,17 +7,26 @@ A2024-XXXX形式の患者IDに対応し、実際の処方薬・検査値を考
 import json
 import os
 import re
-from langchain_openai import ChatOpenAI
-from config import Config
+from services.llm_registry import get_llm
 from datetime import datetime
+from utils.keyword_matcher import KeywordMatcher
+
+# 薬剤名 -> 表記ゆれ・商品名（上から順に優先）
+DRUG_NAME_MATCHER = KeywordMatcher({
+    "ワーファリン": ["ワーファリン", "ワルファリン"],
+    "アスピリン": ["アスピリン"],
+    "クロピドグレル": ["クロピドグレル"],
+    "アピキサバン": ["アピキサバン"],
+    "リバーロキサバン": ["リバーロキサバン"],
+    "メトホルミン": ["メトホルミン", "メトグルコ"],
+    "アムロジピン": ["アムロジピン"],
+    "リシノプリル": ["リシノプリル"],
+    "アトルバスタチン": ["アトルバスタチン"]
+})
 
 class EnhancedDoubleCheckService:
     def __init__(self):
-        self.model = ChatOpenAI(
-            model_name="gpt-4o-mini",
-            openai_api_key=Config.OPENAI_API_KEY,
-            temperature=0
-        )
+        self.model = get_llm("analysis")
         self.detailed_patients = self._load_detailed_patients()
         self.hospital_protocols = self._load_hospital_protocols()
         self.hospital_info = self._load_hospital_info()
@@ -57,28 +66,10 @@ class EnhancedDoubleCheckService:
         patient_match = re.search(r'A2024-\d{4}', text)
         patient_id = patient_match.group(0) if patient_match else None
         
-        # 薬剤名と用量の抽出
-        medication = None
+        # 薬剤名と用量の抽出（一般的な薬剤パターン）
+        medication = DRUG_NAME_MATCHER.first_label(text)
         dosage = None
         
-        # 一般的な薬剤パターン
-        drug_patterns = [
-            (r"ワーファリン|ワルファリン", "ワーファリン"),
-            (r"アスピリン", "アスピリン"),
-            (r"クロピドグレル", "クロピドグレル"),
-            (r"アピキサバン", "アピキサバン"),
-            (r"リバーロキサバン", "リバーロキサバン"),
-            (r"メトホルミン|メトグルコ", "メトホルミン"),
-            (r"アムロジピン", "アムロジピン"),
-            (r"リシノプリル", "リシノプリル"),
-            (r"アトルバスタチン", "アトルバスタチン")
-        ]
-        
-        for pattern, drug_name in drug_patterns:
-            if re.search(pattern, text):
-                medication = drug_name
-                break
-        
         # 用量抽出
         dosage_match = re.search(r'(\d+(?:\.\d+)?)\s*mg', text)
         if dosage_match:
@@ -0,0 +1,151 @@
+# src/services/event_dedup_cache.py
+"""
+LINE Webhookの再送による二重処理を防ぐ重複排除キャッシュ
+webhookEventIdとreplyTokenを記録し、TTL経過・件数上限で古いものから破棄する
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+class EventDedupCache:
+    """処理済みイベントキーの有界TTLキャッシュ（SQLiteへの永続化はオプション）"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 86400,
+                 db_path: Optional[str] = None):
+        """
+        重複排除キャッシュの初期化
+
+        Args:
+            max_entries: メモリに保持するキーの最大数
+            ttl_seconds: キーを保持する秒数
+            db_path: 永続化用SQLiteファイルのパス（未指定ならメモリのみ）
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path or None
+
+        self._entries: "OrderedDict[str, float]" = OrderedDict()  # key -> 記録時刻（古い順）
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        # 統計情報
+        self._stats = {
+            "claimed": 0,
+            "duplicates": 0,
+            "released": 0,
+            "evicted": 0
+        }
+
+        if self.db_path:
+            self._open_database()
+
+    def claim(self, keys: Iterable[Optional[str]]) -> bool:
+        """
+        キーを処理済みとして登録する
+
+        Args:
+            keys: イベントを識別するキー（webhookEventId, replyTokenなど。Noneは無視）
+
+        Returns:
+            新規イベントならTrue、いずれかのキーが登録済みならFalse（重複）
+        """
+        keys = [key for key in keys if key]
+        if not keys:
+            return True
+
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if any(key in self._entries for key in keys):
+                self._stats["duplicates"] += 1
+                return False
+
+            for key in keys:
+                self._entries[key] = now
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evicted"] += 1
+            self._stats["claimed"] += 1
+            self._persist(keys, now)
+        return True
+
+    def release(self, keys: Iterable[Optional[str]]):
+        """処理を受け付けられなかったイベントのキーを取り消し、再送を受け入れられるようにする"""
+        keys = [key for key in keys if key]
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            self._stats["released"] += 1
+            if self._conn is not None:
+                try:
+                    self._conn.executemany("DELETE FROM processed_events WHERE event_key = ?", [(key,) for key in keys])
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ 重複排除キャッシュの削除に失敗しました: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """重複検出数とキャッシュサイズを取得"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["persistent"] = self._conn is not None
+        return stats
+
+    def _expire(self, now: float):
+        """TTLを過ぎたキーを古い順に破棄（呼び出し側でロック取得済み）"""
+        cutoff = now - self.ttl_seconds
+        while self._entries:
+            key, recorded_at = next(iter(self._entries.items()))
+            if recorded_at >= cutoff:
+                break
+            self._entries.popitem(last=False)
+            self._stats["evicted"] += 1
+
+    def _open_database(self):
+        """SQLiteファイルを開き、有効期限内のキーを読み込む"""
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS processed_events ("
+                "event_key TEXT PRIMARY KEY, recorded_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_processed_events_recorded_at "
+                "ON processed_events (recorded_at)"
+            )
+            cutoff = time.time() - self.ttl_seconds
+            self._conn.execute("DELETE FROM processed_events WHERE recorded_at < ?", (cutoff,))
+            rows = self._conn.execute(
+                "SELECT event_key, recorded_at FROM processed_events ORDER BY recorded_at DESC LIMIT ?",
+                (self.max_entries,)
+            ).fetchall()
+            self._conn.commit()
+            for key, recorded_at in reversed(rows):
+                self._entries[key] = recorded_at
+            print(f"✅ 重複排除キャッシュを読み込みました: {len(rows)}件 ({self.db_path})")
+        except sqlite3.Error as e:
+            print(f"⚠️ 重複排除キャッシュのDBを開けませんでした。メモリのみで動作します: {e}")
+            self._conn = None
+
+    def _persist(self, keys: List[str], now: float):
+        """キーをSQLiteに書き込み、期限切れ行を削除（呼び出し側でロック取得済み）"""
+        if self._conn is None:
+            return
+        try:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO processed_events (event_key, recorded_at) VALUES (?, ?)",
+                [(key, now) for key in keys]
+            )
+            self._conn.execute("DELETE FROM processed_events WHERE recorded_at < ?", (now - self.ttl_seconds,))
+            self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ 重複排除キャッシュの書き込みに失敗しました: {e}")
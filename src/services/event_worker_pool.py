@@ -0,0 +1,84 @@
+# src/services/event_worker_pool.py
+"""
+LINE Webhookイベントのバックグラウンド処理用ワーカープール
+Webhookエンドポイントは署名検証とキュー投入のみ行い、即座に200を返す
+同じユーザーのイベントは受信順に、異なるユーザーのイベントは並列に処理する
+"""
+
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from services.keyed_executor import KeyedExecutor
+
+def line_event_user_key(event: Any) -> Optional[str]:
+    """イベントの送信元ユーザーIDを順序保証のキーとして返す"""
+    source = getattr(event, "source", None)
+    return getattr(source, "user_id", None)
+
+class EventWorkerPool:
+    """ユーザー単位のレーンと共有ワーカーでイベントを処理する"""
+
+    def __init__(self, event_handler: Callable[[Any], None], num_workers: int = 4,
+                 max_queue_size: int = 100, name: str = "line-event",
+                 key_func: Callable[[Any], Optional[Hashable]] = line_event_user_key):
+        """
+        ワーカープールの初期化
+
+        Args:
+            event_handler: 1イベントを処理する関数
+            num_workers: 同時に処理するイベント数の上限
+            max_queue_size: 全ユーザー合計で保持できる未処理イベント数
+            name: スレッド名の接頭辞
+            key_func: イベントから順序保証のキーを取り出す関数
+        """
+        self.num_workers = max(1, num_workers)
+        self.max_queue_size = max(1, max_queue_size)
+        self.key_func = key_func
+        self._executor = KeyedExecutor(
+            event_handler,
+            max_workers=self.num_workers,
+            max_backlog=self.max_queue_size,
+            name=name
+        )
+
+    def start(self):
+        """ワーカースレッドを起動"""
+        self._executor.start()
+        print(f"✅ イベントワーカープールを起動しました (workers={self.num_workers}, queue={self.max_queue_size})")
+
+    def submit(self, event: Any) -> bool:
+        """
+        イベントを送信元ユーザーのレーンに投入（ブロックしない）
+
+        Returns:
+            投入できたかどうか（キュー満杯・停止中はFalse）
+        """
+        accepted = self._executor.submit(self.key_func(event), event)
+        if not accepted:
+            print(f"⚠️ イベントキューが満杯、または停止中です (size={self.max_queue_size})")
+        return accepted
+
+    def shutdown(self, timeout: float = 30.0) -> bool:
+        """
+        新規受付を停止し、キュー内と処理中のイベントを処理し終えてから停止
+
+        Args:
+            timeout: ドレイン完了を待つ最大秒数
+
+        Returns:
+            時間内に全イベントを処理できたかどうか
+        """
+        print(f"🛑 イベントワーカープールを停止します (残りキュー: {self._executor.get_stats()['pending']}件)")
+        drained = self._executor.shutdown(timeout=timeout)
+        if drained:
+            print("✅ イベントワーカープールを停止しました")
+        else:
+            print("⚠️ タイムアウトのため未処理のイベントが残っています")
+        return drained
+
+    def get_stats(self) -> Dict[str, Any]:
+        """キュー深さ・ユーザー別バックログと処理統計を取得"""
+        stats = self._executor.get_stats()
+        stats["queue_depth"] = stats["pending"]
+        stats["queue_capacity"] = stats.pop("backlog_capacity")
+        stats["in_flight"] = stats["running"]
+        return stats
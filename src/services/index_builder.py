@@ -0,0 +1,209 @@
+# src/services/index_builder.py
+"""
+差分・再開可能なベクトルインデックスビルダー
+チャンクごとの内容ハッシュをマニフェストに記録し、追加・変更されたチャンクだけを並列バッチで埋め込み、
+削除されたチャンクはインデックスから取り除く。一定バッチごとにチェックポイントを保存するため、
+中断したビルドは次回の実行で続きから再開できる
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_community.document_loaders import DirectoryLoader, TextLoader
+from langchain_community.vectorstores import FAISS
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from services.vector_collections import COLLECTION_NAMES, build_version, collection_counts, tag_chunks
+
+MANIFEST_FILE = "manifest.json"
+
+# コレクション名 -> 読み込むファイル（ディレクトリ, globパターン）
+INDEX_SOURCES: Dict[str, List[Tuple[str, str]]] = {
+    "sales": [("data", "sales_meeting_data.txt")],
+    "office": [("src/data/office_docs", "**/*.md")],
+    "procedures": [("src/data/procedures_docs", "**/*.md"), ("data/procedures", "**/*.txt"), ("src/data/procedures", "**/*.txt")],
+}
+
+# インデックス名 -> (保存先ディレクトリ, 含めるコレクション)
+INDEX_TARGETS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "sales": ("faiss_index_sales", ("sales",)),
+    "office": ("faiss_index_office", ("office",)),
+    "procedures": ("faiss_index_procedures", ("procedures",)),
+    "unified": ("faiss_index_unified", COLLECTION_NAMES),
+}
+
+def chunk_id(collection: str, source: str, content: str) -> str:
+    """コレクション・元ファイル・内容からチャンクIDを生成（内容が変われば別IDになる）"""
+    return hashlib.sha256(f"{collection}\0{source}\0{content}".encode("utf-8")).hexdigest()
+
+class IncrementalIndexBuilder:
+    """マニフェストとの差分でFAISSインデックスを更新するビルダー"""
+
+    def __init__(self, embeddings: Any, chunk_size: int = 1000, chunk_overlap: int = 100,
+                 batch_size: int = 64, max_workers: int = 4, checkpoint_every: int = 5):
+        """
+        ビルダーの初期化
+
+        Args:
+            embeddings: 埋め込みモデル（CachedEmbeddings推奨）
+            chunk_size: チャンクの最大文字数
+            chunk_overlap: チャンク間の重複文字数
+            batch_size: 1回のAPI呼び出しで埋め込むチャンク数
+            max_workers: 同時に実行する埋め込みバッチ数
+            checkpoint_every: チェックポイントを保存するバッチ間隔
+        """
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def load_chunks(self, collections: Tuple[str, ...], version: str) -> Dict[str, Any]:
+        """
+        元ファイルを読み込んで分割し、チャンクID -> Document の辞書を返す
+
+        Args:
+            collections: 読み込むコレクション名
+            version: チャンクに付けるビルドバージョン
+        """
+        chunks: Dict[str, Any] = {}
+        for collection in collections:
+            documents = []
+            for directory, pattern in INDEX_SOURCES[collection]:
+                if not os.path.exists(directory):
+                    print(f"  ⚠️ {directory} が見つかりません（{collection}）")
+                    continue
+                loader = DirectoryLoader(directory, glob=pattern, loader_cls=TextLoader, loader_kwargs={'encoding': 'utf-8'})
+                documents.extend(loader.load())
+
+            for chunk in tag_chunks(self.splitter.split_documents(documents), collection, version):
+                chunks.setdefault(chunk_id(collection, chunk.metadata["source"], chunk.page_content), chunk)
+            print(f"  📄 {collection}: {len(documents)}ファイル")
+        return chunks
+
+    def build(self, index_name: str, output_dir: Optional[str] = None) -> bool:
+        """
+        インデックスを差分更新する
+
+        Args:
+            index_name: INDEX_TARGETSのインデックス名
+            output_dir: 保存先（未指定なら既定のディレクトリ）
+
+        Returns:
+            正常に完了したかどうか
+        """
+        default_dir, collections = INDEX_TARGETS[index_name]
+        output_dir = output_dir or default_dir
+        version = build_version()
+        print(f"\n--- {index_name} インデックスの差分ビルドを開始 ({output_dir}) ---")
+
+        chunks = self.load_chunks(collections, version)
+        if not chunks:
+            print(f"❌ {index_name} の元データが見つかりませんでした。")
+            return False
+
+        # マニフェストと元データのチャンクが一致すればインデックスを読み込まずに終了
+        if self._read_manifest(output_dir) == set(chunks) and os.path.exists(os.path.join(output_dir, "index.faiss")):
+            print(f"✅ {index_name} は最新です（マニフェストと一致）")
+            return True
+
+        vectorstore = self._load_existing(output_dir)
+        existing_ids = set(vectorstore.index_to_docstore_id.values()) if vectorstore else set()
+
+        removed_ids = sorted(existing_ids - set(chunks))
+        new_ids = [cid for cid in chunks if cid not in existing_ids]
+        print(f"  🔎 差分: 既存 {len(existing_ids)} / 追加・変更 {len(new_ids)} / 削除 {len(removed_ids)}")
+
+        if vectorstore and removed_ids:
+            vectorstore.delete(removed_ids)
+            self._save(vectorstore, output_dir, chunks)
+            print(f"  🗑️ 削除されたチャンク {len(removed_ids)}件をインデックスから取り除きました")
+
+        if not new_ids:
+            print(f"✅ {index_name} は最新です（埋め込み対象なし）")
+            if vectorstore and not removed_ids:
+                self._write_manifest(vectorstore, output_dir, chunks)
+            return vectorstore is not None
+
+        started_at = time.time()
+        batches = [new_ids[i:i + self.batch_size] for i in range(0, len(new_ids), self.batch_size)]
+        done_chunks = 0
+        done_batches = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="index-embed") as executor:
+            futures = {
+                executor.submit(self.embeddings.embed_documents, [chunks[cid].page_content for cid in batch]): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                vectors = future.result()
+                text_embeddings = [(chunks[cid].page_content, vector) for cid, vector in zip(batch, vectors)]
+                metadatas = [chunks[cid].metadata for cid in batch]
+                if vectorstore is None:
+                    vectorstore = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=batch)
+                else:
+                    vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=batch)
+
+                done_chunks += len(batch)
+                done_batches += 1
+                if done_batches % self.checkpoint_every == 0:
+                    self._save(vectorstore, output_dir, chunks)
+                    elapsed = time.time() - started_at
+                    print(f"  💾 チェックポイント: {done_chunks}/{len(new_ids)} チャンク ({done_chunks / elapsed:.1f} chunks/sec)")
+
+        self._save(vectorstore, output_dir, chunks)
+        elapsed = time.time() - started_at
+        throughput = done_chunks / elapsed if elapsed > 0 else float(done_chunks)
+        print(f"✅ {index_name} を保存しました: {done_chunks}チャンクを埋め込み ({elapsed:.1f}秒, {throughput:.1f} chunks/sec)")
+        if index_name == "unified":
+            print(f"  📚 コレクション別チャンク数: {collection_counts(vectorstore)}")
+        return True
+
+    def _load_existing(self, output_dir: str):
+        """既存のインデックスを読み込む（なければNone）"""
+        if not os.path.exists(os.path.join(output_dir, "index.faiss")):
+            return None
+        try:
+            return FAISS.load_local(output_dir, self.embeddings, allow_dangerous_deserialization=True)
+        except Exception as e:
+            print(f"  ⚠️ 既存インデックスを読み込めないため作り直します: {e}")
+            return None
+
+    def _read_manifest(self, output_dir: str) -> Optional[set]:
+        """マニフェストに記録されたチャンクIDの集合（なければNone）"""
+        try:
+            with open(os.path.join(output_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+                return set(json.load(f)["chunks"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _save(self, vectorstore, output_dir: str, chunks: Dict[str, Any]):
+        """インデックスとマニフェストを保存（チェックポイント兼用）"""
+        vectorstore.save_local(output_dir)
+        self._write_manifest(vectorstore, output_dir, chunks)
+
+    def _write_manifest(self, vectorstore, output_dir: str, chunks: Dict[str, Any]):
+        """インデックスに含まれるチャンクのハッシュと元ファイルをマニフェストに書き出す"""
+        present = {}
+        for cid in vectorstore.index_to_docstore_id.values():
+            doc = chunks.get(cid) or vectorstore.docstore.search(cid)
+            metadata = getattr(doc, "metadata", {}) or {}
+            present[cid] = {
+                "collection": metadata.get("collection"),
+                "source": metadata.get("source"),
+                "version": metadata.get("version")
+            }
+        manifest = {
+            "updated_at": build_version(),
+            "chunk_count": len(present),
+            "chunks": present
+        }
+        manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+        with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
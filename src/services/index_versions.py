@@ -0,0 +1,121 @@
+# src/services/index_versions.py
+"""
+バージョン付きインデックスディレクトリの管理
+<root>/<version>/faiss_index_* にインデックスを保存し、<root>/CURRENT が稼働中のバージョンを指す
+CURRENTの書き換えはアトミックに行い、直近N世代を即時ロールバック用に残す
+"""
+
+import os
+import shutil
+from typing import List, Optional
+
+from services.vector_collections import build_version
+
+CURRENT_FILE = "CURRENT"
+PUBLISHED_MARKER = ".published"
+
+class IndexVersionStore:
+    """バージョン付きインデックスディレクトリと稼働中バージョンのポインタを管理する"""
+
+    def __init__(self, root_dir: str = "index_versions", keep: int = 3):
+        """
+        Args:
+            root_dir: バージョンディレクトリを置くルート
+            keep: 保持する世代数（稼働中のバージョンは常に保持）
+        """
+        self.root_dir = root_dir
+        self.keep = max(1, keep)
+
+    def list_versions(self) -> List[str]:
+        """保存済みのバージョンを古い順に返す"""
+        if not os.path.isdir(self.root_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root_dir)
+            if os.path.isdir(os.path.join(self.root_dir, name)) and not name.startswith(".")
+        )
+
+    def current(self) -> Optional[str]:
+        """稼働中のバージョン（未設定ならNone）"""
+        try:
+            with open(os.path.join(self.root_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return version if version and os.path.isdir(self.path(version)) else None
+
+    def path(self, version: str) -> str:
+        """バージョンのディレクトリパス"""
+        return os.path.join(self.root_dir, version)
+
+    def create_version(self, base_version: Optional[str] = None) -> str:
+        """
+        新しいバージョンのディレクトリを作成する
+
+        Args:
+            base_version: 差分ビルドの起点としてコピーするバージョン（未指定なら稼働中のもの）
+
+        Returns:
+            作成したバージョン名
+        """
+        version = build_version()
+        while os.path.exists(self.path(version)):
+            version = f"{version}_1"
+        base_version = base_version or self.current()
+        if base_version:
+            shutil.copytree(
+                self.path(base_version), self.path(version),
+                ignore=shutil.ignore_patterns(PUBLISHED_MARKER)
+            )
+        else:
+            os.makedirs(self.path(version))
+        return version
+
+    def is_published(self, version: str) -> bool:
+        """一度でも公開されたバージョンか（未公開のものはビルド途中・中断の可能性がある）"""
+        return os.path.exists(os.path.join(self.path(version), PUBLISHED_MARKER))
+
+    def latest_unpublished(self) -> Optional[str]:
+        """一度も公開されていない最新のバージョン（中断したビルドの再開用）"""
+        versions = [version for version in self.list_versions() if not self.is_published(version)]
+        return versions[-1] if versions else None
+
+    def publish(self, version: str):
+        """CURRENTをアトミックに書き換えて稼働中のバージョンを切り替える"""
+        if not os.path.isdir(self.path(version)):
+            raise ValueError(f"インデックスのバージョンが見つかりません: {version}")
+        open(os.path.join(self.path(version), PUBLISHED_MARKER), "a").close()
+        pointer = os.path.join(self.root_dir, CURRENT_FILE)
+        with open(f"{pointer}.tmp", "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(f"{pointer}.tmp", pointer)
+        print(f"📌 稼働中のインデックスを {version} に切り替えました")
+
+    def previous(self, version: Optional[str] = None) -> Optional[str]:
+        """
+        指定バージョン（未指定なら稼働中）より前に公開されたバージョン
+
+        未公開のバージョンは部分的なインデックスの可能性があるため、ロールバック先にしない
+        """
+        version = version or self.current()
+        published = [
+            candidate for candidate in self.list_versions()
+            if candidate != version and self.is_published(candidate)
+        ]
+        if version:
+            published = [candidate for candidate in published if candidate < version]
+        return published[-1] if published else None
+
+    def prune(self) -> List[str]:
+        """保持世代数を超えた古いバージョンを削除（稼働中のものとビルド中の最新の未公開バージョンは削除しない）"""
+        protected = {self.current(), self.latest_unpublished()}
+        versions = self.list_versions()
+        removed = []
+        for version in versions[:max(0, len(versions) - self.keep)]:
+            if version in protected:
+                continue
+            shutil.rmtree(self.path(version), ignore_errors=True)
+            removed.append(version)
+        if removed:
+            print(f"🗑️ 古いインデックスのバージョンを削除しました: {', '.join(removed)}")
+        return removed
@@ -0,0 +1,119 @@
+# src/services/intent_classifier.py
+"""
+キーワードヒントに基づくローカル高速分類器
+QuestionRouterのLLM分類の前段で、確信度の高い質問だけをマイクロ秒単位で分類する
+"""
+
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# 分類プロンプトの「分類のヒント」と共通のキーワード表（カテゴリ, キーワード）
+CATEGORY_KEYWORD_HINTS: List[Tuple[str, List[str]]] = [
+    ("sales_query", ["売上", "実績", "達成率", "営業", "担当者", "高見", "辻川", "小濱", "官需課", "メーカー", "RISO", "XEROX", "販売"]),
+    ("detailed_sales_query", ["訪問件数", "電話件数", "商談進捗", "顧客訪問", "今日の活動", "パイプライン", "商談状況"]),
+    ("report_generation", ["レポート作成", "レポート生成", "月次レポート", "日次レポート", "分析レポート", "レポート送信"]),
+    ("workflow_integration", ["メール送信", "自動化", "ワークフロー", "通知設定", "配信", "n8n"]),
+    ("billing_analysis", ["査定", "減点", "返戻", "診療報酬", "請求"]),
+    ("bed_management", ["病床", "稼働率", "在院日数", "ベッド", "入院", "退院"]),
+    ("admin_efficiency", ["スタッフ", "効率", "エラー率", "生産性", "研修"]),
+    ("revenue_analysis", ["収益", "経営", "利益", "コスト"]),
+    ("clinical_analysis", ["治療成績", "症例数", "死亡率", "成功率", "合併症", "論文", "研究", "データ分析"]),
+    ("waiting_analysis", ["待ち時間", "患者満足度", "患者動線"]),
+    ("staff_training", ["研修", "職員", "教育", "人材育成", "研修効果", "報告書"]),
+    ("patient_info_query", ["名前は", "氏名は", "患者情報", "基本情報", "生年月日", "住所"]),
+    ("summary", ["要約", "まとめ", "総括", "簡潔に", "ポイントは", "結論は", "一言で", "短く", "概要"]),
+    ("feedback", ["ありがとう", "助かります", "いい感じ", "すごい", "よかった", "なるほど", "素晴らしい", "完璧", "感謝"]),
+    ("general_chat", ["普通に会話", "雑談", "元気", "こんにちは", "おはよう", "こんばんは", "気分", "天気", "今日"]),
+    ("shift_scheduling", ["シフト", "勤務表", "希望日", "組んで", "シフト作成", "スケジュール"]),
+]
+
+# 社内データベースにない技術的な質問（Web検索へ回すためunknownに分類）
+UNKNOWN_KEYWORD_HINTS: List[str] = [
+    "トナー", "カートリッジ", "インク", "交換方法", "変え方", "設定方法", "使い方", "操作方法", "TASKalfa", "MX-", "コピー機の", "プリンターの"
+]
+
+# カテゴリ別の重み（プロンプトの「feedback の判定は最優先」に合わせて感謝・相槌を優先）
+CATEGORY_WEIGHTS: Dict[str, float] = {
+    "feedback": 1.5,
+}
+
+# 重みなしのキーワード1つで取りうる最大スコア（4文字以上のキーワード）
+# キーワード1つだけのヒットではこれを上回らない限り確定しない（「会議室の予約スケジュール」→ shift_scheduling などの誤分類防止）
+SINGLE_KEYWORD_MAX_SCORE = 2.0
+
+class LocalClassification(NamedTuple):
+    """ローカル分類の結果"""
+    category: Optional[str]  # 最高スコアのカテゴリ（ヒットなしはNone）
+    score: float
+    margin: float  # 1位と2位のスコア差
+    confident: bool
+    matched: Dict[str, List[str]]
+
+class LocalIntentClassifier:
+    """キーワードヒントを1本の正規表現にまとめた重み付き分類器"""
+
+    def __init__(self, min_score: float = 2.0, min_margin: float = 1.5, max_length: int = 80):
+        """
+        分類器の初期化
+
+        Args:
+            min_score: 確定に必要な最高スコア
+            min_margin: 確定に必要な1位と2位のスコア差
+            max_length: これより長い質問は複合的とみなしLLMに任せる
+        """
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.max_length = max_length
+
+        # キーワード -> [(カテゴリ, 重み)]
+        self.keyword_table: Dict[str, List[Tuple[str, float]]] = {}
+        for category, keywords in CATEGORY_KEYWORD_HINTS:
+            for keyword in keywords:
+                self._add_keyword(keyword, category)
+        for keyword in UNKNOWN_KEYWORD_HINTS:
+            self._add_keyword(keyword, "unknown")
+
+        # 長いキーワードを優先するため長さ順に並べて1つのパターンにコンパイル
+        ordered = sorted(self.keyword_table, key=len, reverse=True)
+        self.pattern = re.compile("|".join(re.escape(keyword) for keyword in ordered), re.IGNORECASE)
+        self._lookup = {keyword.lower(): entries for keyword, entries in self.keyword_table.items()}
+
+    def _add_keyword(self, keyword: str, category: str):
+        """キーワードを登録（長く具体的なキーワードほど重く評価）"""
+        weight = min(len(keyword), 4) / 2 * CATEGORY_WEIGHTS.get(category, 1.0)
+        self.keyword_table.setdefault(keyword, []).append((category, weight))
+
+    def classify(self, question: str) -> LocalClassification:
+        """
+        質問をキーワードスコアで分類
+
+        Args:
+            question: ユーザーの質問
+
+        Returns:
+            分類結果（confidentがFalseの場合はLLMに任せる）
+        """
+        scores: Dict[str, float] = {}
+        matched: Dict[str, List[str]] = {}
+        for match in self.pattern.finditer(question):
+            keyword = match.group(0)
+            for category, weight in self._lookup.get(keyword.lower(), []):
+                scores[category] = scores.get(category, 0.0) + weight
+                matched.setdefault(category, []).append(keyword)
+
+        if not scores:
+            return LocalClassification(None, 0.0, 0.0, False, matched)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        category, top_score = ranked[0]
+        second_score = ranked[1][1] if len(ranked) > 1 else 0.0
+        margin = top_score - second_score
+
+        distinct_hits = len({keyword.lower() for keyword in matched[category]})
+        confident = (
+            top_score >= self.min_score
+            and margin >= self.min_margin
+            and (distinct_hits >= 2 or top_score > SINGLE_KEYWORD_MAX_SCORE)
+            and len(question.strip()) <= self.max_length
+        )
+        return LocalClassification(category, top_score, margin, confident, matched)
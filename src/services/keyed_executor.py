@@ -0,0 +1,232 @@
+# src/services/keyed_executor.py
+"""
+キー単位で順序を保証する並列実行器
+同じキー（LINEユーザーID）のタスクは投入順に1件ずつ、異なるキーのタスクは共有ワーカーで並列に処理する
+"""
+
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional
+
+class _Lane:
+    """1キー分の待ち行列と統計"""
+
+    __slots__ = ("items", "running", "scheduled", "processed", "failed", "max_backlog", "last_activity")
+
+    def __init__(self):
+        self.items: Deque[Any] = deque()
+        self.running = False
+        self.scheduled = False
+        self.processed = 0
+        self.failed = 0
+        self.max_backlog = 0
+        self.last_activity = time.time()
+
+class KeyedExecutor:
+    """キーごとのレーンと共有ワーカー数上限を持つ実行器"""
+
+    def __init__(self, task_handler: Callable[[Any], None], max_workers: int = 4,
+                 max_backlog: int = 100, name: str = "keyed"):
+        """
+        実行器の初期化
+
+        Args:
+            task_handler: 1タスクを処理する関数
+            max_workers: 同時に処理するタスク数の上限（全レーン共有）
+            max_backlog: 全レーン合計で保持できる未処理タスク数
+            name: スレッド名の接頭辞
+        """
+        self.task_handler = task_handler
+        self.max_workers = max(1, max_workers)
+        self.max_backlog = max(1, max_backlog)
+        self.name = name
+
+        self._lanes: Dict[Hashable, _Lane] = {}
+        self._ready: Deque[Hashable] = deque()  # 実行待ちのレーン（ラウンドロビン）
+        self._cond = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._accepting = False
+        self._stopping = False
+        self._pending = 0
+        self._running = 0
+
+        # 統計情報
+        self._stats = {
+            "submitted": 0,
+            "processed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "total_processing_seconds": 0.0,
+            "max_concurrency_seen": 0
+        }
+
+    def start(self):
+        """ワーカースレッドを起動"""
+        with self._cond:
+            if self._workers:
+                return
+            self._accepting = True
+            self._stopping = False
+            for i in range(self.max_workers):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"{self.name}-worker-{i + 1}",
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, key: Optional[Hashable], task: Any) -> bool:
+        """
+        タスクをキーのレーンに投入（ブロックしない）
+
+        Args:
+            key: 順序を保証する単位（Noneの場合は他と独立して処理）
+            task: task_handlerに渡すタスク
+
+        Returns:
+            投入できたかどうか（バックログ上限・停止中はFalse）
+        """
+        if key is None:
+            key = object()  # 順序制約のないタスクは専用レーンで処理
+
+        with self._cond:
+            if not self._accepting or self._pending >= self.max_backlog:
+                self._stats["rejected"] += 1
+                return False
+
+            lane = self._lanes.get(key)
+            if lane is None:
+                lane = _Lane()
+                self._lanes[key] = lane
+
+            lane.items.append(task)
+            lane.max_backlog = max(lane.max_backlog, len(lane.items))
+            lane.last_activity = time.time()
+            self._pending += 1
+            self._stats["submitted"] += 1
+
+            if not lane.running and not lane.scheduled:
+                lane.scheduled = True
+                self._ready.append(key)
+                self._cond.notify()
+        return True
+
+    def shutdown(self, timeout: float = 30.0) -> bool:
+        """
+        新規受付を停止し、未処理・処理中のタスクを処理し終えてから停止
+
+        Args:
+            timeout: ドレイン完了を待つ最大秒数
+
+        Returns:
+            時間内に全タスクを処理できたかどうか
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._accepting = False
+            while self._pending or self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            drained = not self._pending and not self._running
+            self._stopping = True
+            self._cond.notify_all()
+            workers = list(self._workers)
+
+        for worker in workers:
+            worker.join(timeout=max(0.0, deadline - time.monotonic()))
+
+        with self._cond:
+            self._workers = [worker for worker in workers if worker.is_alive()]
+        return drained
+
+    def get_stats(self, top_lanes: int = 10) -> Dict[str, Any]:
+        """
+        全体統計とレーン別バックログを取得
+
+        Args:
+            top_lanes: バックログの多い順に返すレーン数
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            lanes = [
+                {
+                    "key": str(key),
+                    "backlog": len(lane.items),
+                    "running": lane.running,
+                    "processed": lane.processed,
+                    "failed": lane.failed,
+                    "max_backlog": lane.max_backlog,
+                    "idle_seconds": round(time.time() - lane.last_activity, 1)
+                }
+                for key, lane in self._lanes.items()
+                if isinstance(key, str)
+            ]
+            stats["pending"] = self._pending
+            stats["running"] = self._running
+            stats["active_lanes"] = len(self._lanes)
+            stats["workers"] = sum(1 for worker in self._workers if worker.is_alive())
+            stats["accepting"] = self._accepting
+
+        finished = stats["processed"] + stats["failed"]
+        stats["backlog_capacity"] = self.max_backlog
+        stats["max_workers"] = self.max_workers
+        stats["avg_processing_seconds"] = round(stats["total_processing_seconds"] / finished, 3) if finished else 0.0
+        stats["total_processing_seconds"] = round(stats["total_processing_seconds"], 3)
+        lanes.sort(key=lambda lane: (lane["backlog"], lane["running"]), reverse=True)
+        stats["lanes"] = lanes[:top_lanes]
+        return stats
+
+    def _worker_loop(self):
+        """実行待ちレーンから1タスクずつ取り出して処理する"""
+        while True:
+            with self._cond:
+                while not self._ready and not self._stopping:
+                    self._cond.wait()
+                if not self._ready:
+                    return
+                key = self._ready.popleft()
+                lane = self._lanes[key]
+                lane.scheduled = False
+                lane.running = True
+                task = lane.items.popleft()
+                self._pending -= 1
+                self._running += 1
+                self._stats["max_concurrency_seen"] = max(self._stats["max_concurrency_seen"], self._running)
+
+            succeeded, elapsed = self._run_task(task)
+
+            with self._cond:
+                lane.running = False
+                lane.last_activity = time.time()
+                self._running -= 1
+                self._stats["total_processing_seconds"] += elapsed
+                if succeeded:
+                    lane.processed += 1
+                    self._stats["processed"] += 1
+                else:
+                    lane.failed += 1
+                    self._stats["failed"] += 1
+
+                if lane.items:
+                    # 同じレーンの次のタスクは他レーンの後ろに並べる（公平性の確保）
+                    lane.scheduled = True
+                    self._ready.append(key)
+                else:
+                    del self._lanes[key]
+                self._cond.notify_all()
+
+    def _run_task(self, task: Any):
+        """1タスクを実行し、(成功したか, 処理秒数)を返す"""
+        started = time.monotonic()
+        try:
+            self.task_handler(task)
+            return True, time.monotonic() - started
+        except Exception as e:
+            print(f"❌ タスク処理中にエラーが発生しました: {e}")
+            traceback.print_exc()
+            return False, time.monotonic() - started
@@ -0,0 +1,112 @@
+# src/services/lexical_index.py
+"""
+文字n-gramのBM25転置インデックス（FAISSの各ストアと並べて保持する語彙検索）
+高見・辻川・TASKalfa・K664・A2024-0156 のような固有名詞や型番は埋め込み検索で取りこぼしやすいため、
+語彙一致の結果とベクトル検索の結果を Reciprocal Rank Fusion で統合する
+"""
+
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+# 質問から取り出すキーワード（漢字・カタカナ・英数字の連続。ひらがなは助詞などが多いため除外）
+KEY_TERM_PATTERN = re.compile(r"[一-鿿゠-ヿー]{2,}|[A-Za-z0-9][A-Za-z0-9\-]+")
+
+def normalize(text: str) -> str:
+    """NFKC正規化・小文字化し、空白を除去"""
+    return "".join(unicodedata.normalize("NFKC", text).lower().split())
+
+def char_ngrams(text: str, n: int = 2) -> List[str]:
+    """正規化済みテキストの文字n-gram（n文字未満のテキストはそのまま1語）"""
+    if len(text) < n:
+        return [text] if text else []
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+def document_key(doc: Any) -> Tuple[str, str]:
+    """結果リスト間で同じチャンクを識別するキー"""
+    return ((getattr(doc, "metadata", None) or {}).get("source", ""), doc.page_content)
+
+def reciprocal_rank_fusion(result_lists: Sequence[Sequence[Any]], k: int = 60) -> List[Any]:
+    """
+    複数の順位付きリストをReciprocal Rank Fusionで統合
+
+    Args:
+        result_lists: Documentの順位付きリスト
+        k: 順位の減衰定数（大きいほど下位の寄与が残る）
+
+    Returns:
+        統合スコアの高い順のDocument
+    """
+    scores: Dict[Tuple[str, str], float] = {}
+    docs: Dict[Tuple[str, str], Any] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, 1):
+            key = document_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=lambda key: scores[key], reverse=True)]
+
+class LexicalIndex:
+    """文字n-gramのBM25転置インデックス"""
+
+    def __init__(self, docs: Iterable[Any], n: int = 2, k1: float = 1.2, b: float = 0.75):
+        """
+        Args:
+            docs: インデックスに入れるDocument
+            n: n-gramの文字数
+            k1: BM25の語頻度飽和パラメータ
+            b: BM25の文書長正規化パラメータ
+        """
+        self.n = n
+        self.k1 = k1
+        self.b = b
+        self.docs: List[Any] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}  # n-gram -> [(文書番号, 出現回数)]
+
+        for doc in docs:
+            text = normalize(doc.page_content)
+            grams = Counter(char_ngrams(text, n))
+            position = len(self.docs)
+            self.docs.append(doc)
+            self.lengths.append(sum(grams.values()))
+            for gram, tf in grams.items():
+                self.postings.setdefault(gram, []).append((position, tf))
+
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        total = len(self.docs)
+        self.idf = {
+            gram: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for gram, postings in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[Any, float]]:
+        """
+        BM25スコアの高い順に検索
+
+        Returns:
+            (Document, BM25スコア) のリスト
+        """
+        scores: Dict[int, float] = {}
+        for gram in set(char_ngrams(normalize(query), self.n)):
+            idf = self.idf.get(gram)
+            if idf is None:
+                continue
+            for position, tf in self.postings[gram]:
+                length_norm = 1 - self.b + self.b * self.lengths[position] / (self.avg_length or 1.0)
+                scores[position] = scores.get(position, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.docs[position], score) for position, score in ranked]
+
+    def contains_all_key_terms(self, query: str, doc: Any) -> bool:
+        """質問のキーワード（固有名詞・型番など）がすべてチャンクにそのまま含まれるか"""
+        terms = [normalize(term) for term in KEY_TERM_PATTERN.findall(unicodedata.normalize("NFKC", query))]
+        if not terms:
+            return False
+        text = normalize(doc.page_content)
+        return all(term in text for term in terms)
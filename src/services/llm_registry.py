@@ -0,0 +1,134 @@
+# src/services/llm_registry.py
+"""
+役割別のLLMクライアントの共有レジストリ
+役割（分類・雑談・RAG回答・整形・メール下書きなど）ごとにモデルと温度を設定で切り替え、
+同じ設定のChatOpenAIはプロセス内で1つだけ生成して使い回す（HTTP接続の再利用）
+応答はプロンプト完全一致のキャッシュを経由する（雑談・回答文・メール下書きなど創造的な応答の役割はキャッシュしない）
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.config import var_child_runnable_config
+from langchain_openai import ChatOpenAI
+from config import Config
+from services.llm_response_cache import LLMResponseCache
+
+# 役割 -> (モデル名, 温度, 応答キャッシュを使うか)
+# 小さいモデルに切り替えたのは router / chat / formatter のみ。その他は各サービスが従来使っていたモデルが既定値
+LLM_ROLES: Dict[str, Tuple[str, float, bool]] = {
+    "router": (Config.LLM_MODEL_ROUTER, Config.LLM_TEMPERATURE_ROUTER, True),  # 質問分類
+    "chat": (Config.LLM_MODEL_CHAT, Config.LLM_TEMPERATURE_CHAT, False),  # 雑談（general_chat）
+    "rag_answer": (Config.LLM_MODEL_RAG_ANSWER, Config.LLM_TEMPERATURE_RAG_ANSWER, False),  # 社内DBからの回答・エージェント
+    "formatter": (Config.LLM_MODEL_FORMATTER, Config.LLM_TEMPERATURE_FORMATTER, True),  # Web検索結果などの整形
+    "email_draft": (Config.LLM_MODEL_EMAIL_DRAFT, Config.LLM_TEMPERATURE_EMAIL_DRAFT, False),  # メール本文の作成
+    "analysis": (Config.LLM_MODEL_ANALYSIS, Config.LLM_TEMPERATURE_ANALYSIS, True),  # 病床・臨床・事務効率・研修・シフト・ダブルチェック
+    "billing": (Config.LLM_MODEL_BILLING, Config.LLM_TEMPERATURE_BILLING, False),  # 診療報酬分析
+    "report": (Config.LLM_MODEL_REPORT, Config.LLM_TEMPERATURE_REPORT, False),  # 月次レポート
+}
+
+class _InvocationListeners(BaseCallbackHandler):
+    """LLMの呼び出し開始を実行メタデータとともに登録済みのリスナーに通知するコールバック"""
+
+    def __init__(self):
+        self.listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    def on_chat_model_start(self, serialized, messages, *, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        for listener in self.listeners:
+            listener(metadata or {})
+
+    def on_llm_start(self, serialized, prompts, *, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        for listener in self.listeners:
+            listener(metadata or {})
+
+class LLMRegistry:
+    """役割ごとのChatOpenAIを生成・共有する"""
+
+    def __init__(self, roles: Dict[str, Tuple[str, float, bool]], api_key: Optional[str] = None,
+                 response_cache: Optional[LLMResponseCache] = None):
+        """
+        Args:
+            roles: 役割 -> (モデル名, 温度, 応答キャッシュを使うか)
+            api_key: OpenAI APIキー
+            response_cache: 応答キャッシュ（未指定ならキャッシュしない）
+        """
+        self.roles = dict(roles)
+        self.api_key = api_key
+        self.response_cache = response_cache
+        self._clients: Dict[Tuple[str, float, bool], ChatOpenAI] = {}
+        self._lock = threading.Lock()
+        self._requests: Dict[str, int] = {}
+        self._invocation_listeners = _InvocationListeners()
+
+    def get(self, role: str, temperature: Optional[float] = None, cache: Optional[bool] = None) -> ChatOpenAI:
+        """
+        役割に対応するクライアントを取得
+
+        Args:
+            role: 役割名（LLM_ROLESのキー）
+            temperature: 役割の既定値と異なる温度を使う場合に指定
+            cache: 応答キャッシュを使うか（未指定なら役割の既定値）
+
+        Returns:
+            同じモデル・温度で共有されるChatOpenAI
+        """
+        if role not in self.roles:
+            raise ValueError(f"未登録のLLMの役割です: {role}")
+        model, default_temperature, default_cache = self.roles[role]
+        use_cache = (default_cache if cache is None else cache) and self.response_cache is not None
+        key = (model, default_temperature if temperature is None else temperature, use_cache)
+
+        with self._lock:
+            self._requests[role] = self._requests.get(role, 0) + 1
+            client = self._clients.get(key)
+            if client is None:
+                client = ChatOpenAI(
+                    model=key[0], temperature=key[1], api_key=self.api_key,
+                    cache=self.response_cache if use_cache else False,
+                    callbacks=[self._invocation_listeners]
+                )
+                self._clients[key] = client
+                print(f"🤖 LLMクライアントを作成しました: {key[0]} (temperature={key[1]}, cache={use_cache})")
+        return client
+
+    def add_invocation_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """LLMが呼び出されるたびに実行メタデータを受け取って実行する関数を登録"""
+        self._invocation_listeners.listeners.append(listener)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """役割ごとの設定と共有クライアント数を取得"""
+        with self._lock:
+            return {
+                "roles": {
+                    role: {"model": model, "temperature": temperature, "cache": cache}
+                    for role, (model, temperature, cache) in self.roles.items()
+                },
+                "clients": [f"{model}@{temperature}{'' if cached else ' (no cache)'}" for model, temperature, cached in self._clients],
+                "requests_by_role": dict(self._requests)
+            }
+
+# プロセス全体で共有する応答キャッシュとレジストリ
+llm_response_cache = LLMResponseCache(
+    db_path=Config.LLM_CACHE_DB_PATH,
+    max_bytes=Config.LLM_CACHE_MAX_BYTES
+) if Config.LLM_CACHE_ENABLED else None
+llm_registry = LLMRegistry(LLM_ROLES, api_key=Config.OPENAI_API_KEY, response_cache=llm_response_cache)
+
+@contextmanager
+def llm_run_metadata(**metadata: Any) -> Iterator[None]:
+    """
+    ブロック内のLLM呼び出しの実行メタデータに値を追加する（コールバックの metadata で受け取れる）
+    contextvarsで保持するため、contextvars.copy_context() で引き継いだ別スレッドでの呼び出しにも付与される
+    """
+    parent = var_child_runnable_config.get() or {}
+    token = var_child_runnable_config.set({**parent, "metadata": {**parent.get("metadata", {}), **metadata}})
+    try:
+        yield
+    finally:
+        var_child_runnable_config.reset(token)
+
+def get_llm(role: str, temperature: Optional[float] = None, cache: Optional[bool] = None) -> ChatOpenAI:
+    """共有レジストリから役割に対応するクライアントを取得"""
+    return llm_registry.get(role, temperature, cache)
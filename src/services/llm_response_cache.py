@@ -0,0 +1,178 @@
+# src/services/llm_response_cache.py
+"""
+プロンプト完全一致のLLM応答キャッシュ（LangChainのBaseCache実装）
+(モデル設定, プロンプト) のハッシュをキーにSQLiteへ保存し、合計サイズが上限を超えたら
+最後に使われた時刻が古いものから削除する
+静的なJSONデータから同じプロンプトを組み立てる分析系の処理で、同じ質問へのAPI呼び出しを防ぐ
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+class LLMResponseCache(BaseCache):
+    """LLM応答をSQLiteにキャッシュし、サイズ上限でLRU削除する"""
+
+    def __init__(self, db_path: str = "data/llm_cache.sqlite3", max_bytes: int = 50 * 1024 * 1024):
+        """
+        Args:
+            db_path: SQLiteファイルのパス（":memory:"ならメモリ上のみ）
+            max_bytes: キャッシュする応答の合計サイズの上限（バイト）
+        """
+        self.db_path = db_path
+        self.max_bytes = max(1, max_bytes)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._opened = False
+        self._total_bytes = 0
+
+        # 統計情報
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "bytes_saved": 0,
+            "evictions": 0
+        }
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        """キャッシュ済みの応答を取得（なければNone）"""
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            self._ensure_open()
+            row = None
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT value FROM llm_responses WHERE cache_key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        self._conn.execute(
+                            "UPDATE llm_responses SET last_access = ? WHERE cache_key = ?", (time.time(), key)
+                        )
+                        self._conn.commit()
+                except sqlite3.Error as e:
+                    print(f"⚠️ LLM応答キャッシュの読み込みに失敗しました: {e}")
+                    row = None
+
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            try:
+                generations = [loads(value) for value in json.loads(row[0])]
+            except Exception as e:
+                print(f"⚠️ LLM応答キャッシュの復元に失敗しました: {e}")
+                self._stats["misses"] += 1
+                return None
+            # 送信しなかったプロンプトと受信しなかった応答のバイト数
+            self._stats["hits"] += 1
+            self._stats["bytes_saved"] += len(prompt.encode("utf-8")) + len(row[0].encode("utf-8"))
+            return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        """応答を保存し、上限を超えた分を古い順に削除"""
+        value = json.dumps([dumps(generation) for generation in return_val], ensure_ascii=False)
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        key = self._key(prompt, llm_string)
+        now = time.time()
+
+        with self._lock:
+            self._ensure_open()
+            if self._conn is None:
+                return
+            try:
+                previous = self._conn.execute(
+                    "SELECT size FROM llm_responses WHERE cache_key = ?", (key,)
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (cache_key, size, created_at, last_access, value) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, size, now, now, value)
+                )
+                self._total_bytes += size - (previous[0] if previous else 0)
+                self._evict()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ LLM応答キャッシュの書き込みに失敗しました: {e}")
+
+    def clear(self, **kwargs: Any) -> None:
+        """キャッシュをすべて削除"""
+        with self._lock:
+            self._ensure_open()
+            if self._conn is None:
+                return
+            self._conn.execute("DELETE FROM llm_responses")
+            self._conn.commit()
+            self._total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット率・節約バイト数・キャッシュサイズを取得"""
+        with self._lock:
+            self._ensure_open()
+            stats = dict(self._stats)
+            stats["total_bytes"] = self._total_bytes
+            entries = 0
+            if self._conn is not None:
+                entries = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["entries"] = entries
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        """モデル設定（モデル名・温度など）とプロンプトからキャッシュキーを生成"""
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _evict(self):
+        """合計サイズが上限以下になるまで最後に使われた時刻が古いものを削除（ロック取得済み）"""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT cache_key, size FROM llm_responses ORDER BY last_access LIMIT 50"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for key, size in rows:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM llm_responses WHERE cache_key = ?", (key,))
+                self._total_bytes -= size
+                self._stats["evictions"] += 1
+
+    def _ensure_open(self):
+        """初回使用時にSQLiteファイルを開く（インポートしただけではファイルを作らない。ロック取得済み）"""
+        if not self._opened:
+            self._opened = True
+            self._open_database()
+
+    def _open_database(self):
+        """SQLiteファイルを開く（失敗時はキャッシュなしで動作）"""
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                "cache_key TEXT PRIMARY KEY, size INTEGER NOT NULL, created_at REAL NOT NULL, "
+                "last_access REAL NOT NULL, value TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_last_access ON llm_responses (last_access)")
+            self._conn.commit()
+            row = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses").fetchone()
+            self._total_bytes = row[1]
+            print(f"✅ LLM応答キャッシュを開きました: {row[0]}件 / {row[1]}バイト ({self.db_path})")
+        except sqlite3.Error as e:
+            print(f"⚠️ LLM応答キャッシュのDBを開けませんでした。キャッシュなしで動作します: {e}")
+            self._conn = None
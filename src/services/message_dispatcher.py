@@ -0,0 +1,212 @@
+# src/services/message_dispatcher.py
+"""
+カテゴリ別ハンドラーの登録表と、1メッセージにつき1回だけ応答生成を行うディスパッチャー
+応答生成（@answer_generator を付けた処理）の実行回数とLLMの呼び出し回数をメッセージごとに数え、二重生成を検出する
+
+処理中のメッセージはcontextvarsで保持し、LLMの呼び出しは実行メタデータのメッセージキーで集計する
+（contextvars.copy_context() で引き継いだ別スレッドの処理も同じメッセージに数えられる）
+"""
+
+import functools
+import threading
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from utils.ttl_cache import TTLCache
+
+# LLMの実行メタデータに載せるメッセージのキー名（llm_run_metadata(message_key=...) で付与する）
+MESSAGE_KEY_METADATA = "message_key"
+
+# 処理中のメッセージの集計 {"message_key", "generators", "llm_calls"}
+_current_message: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_message", default=None)
+# 実行中の応答生成（応答生成の中から呼ばれた応答生成は別の生成として数えない）
+_current_generator: ContextVar[Optional[str]] = ContextVar("current_generator", default=None)
+
+def answer_generator(func: Callable) -> Callable:
+    """応答を生成する処理（RAG回答・エージェント・分析など）の実行を処理中のメッセージに記録するデコレーター"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        current = _current_message.get()
+        if current is None or _current_generator.get() is not None:
+            return func(*args, **kwargs)
+        token = _current_generator.set(func.__qualname__)
+        current["generators"].append(func.__qualname__)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_generator.reset(token)
+    return wrapper
+
+class MessageDispatcher:
+    """カテゴリ→ハンドラーの登録表に基づいて応答生成を1回だけ実行する"""
+
+    def __init__(self, report_store: Optional[Callable[[str, str, str], Any]] = None,
+                 recent_message_limit: int = 5000):
+        """
+        ディスパッチャーの初期化
+
+        Args:
+            report_store: 構造化レポート保存関数 (user_id, response_text, report_type)
+            recent_message_limit: 二重実行検出のために記憶するメッセージID数
+        """
+        self.report_store = report_store
+        self.routes: Dict[str, Dict[str, Any]] = {}
+        self.default_route: Optional[Dict[str, Any]] = None
+        self._dispatched_messages = TTLCache(max_entries=recent_message_limit, ttl_seconds=3600)
+        # メッセージキー -> 集計（処理後に別スレッドで行われたLLM呼び出しもこのメッセージに数える）
+        self._tracked_messages = TTLCache(max_entries=recent_message_limit, ttl_seconds=3600)
+        self._lock = threading.Lock()
+
+        # 1メッセージ1生成を検証するための統計情報
+        self._stats = {
+            "messages": 0,
+            "generator_runs": 0,
+            "llm_calls": 0,
+            "messages_with_multiple_generators": 0,
+            "max_llm_calls_per_message": 0,
+            "unattributed_llm_calls": 0,
+            "duplicate_dispatch_blocked": 0,
+            "handler_errors": 0,
+            "by_route": {}
+        }
+
+    def register(self, name: str, handler: Callable[[Dict[str, Any]], str],
+                 uses_context: bool = False, report_type: Optional[str] = None,
+                 prepend_confirmation: bool = False, default: bool = False,
+                 on_error: Optional[Callable[[Dict[str, Any], Exception], str]] = None):
+        """
+        ハンドラーを登録
+
+        Args:
+            name: カテゴリ名（またはルート名）
+            handler: メッセージコンテキストを受け取り応答文を返す関数
+            uses_context: 会話履歴をハンドラーに渡すかどうか
+            report_type: 応答を構造化レポートとして保存する場合の種別
+            prepend_confirmation: 文脈推測の確認メッセージを応答の先頭に付けるかどうか（正常な応答のみ）
+            default: 未登録カテゴリの処理に使うかどうか
+            on_error: ハンドラーが例外を送出した場合の案内文を返す関数（未指定なら例外をそのまま送出）
+        """
+        route = {
+            "name": name,
+            "handler": handler,
+            "uses_context": uses_context,
+            "report_type": report_type,
+            "prepend_confirmation": prepend_confirmation,
+            "on_error": on_error
+        }
+        self.routes[name] = route
+        if default:
+            self.default_route = route
+
+    @contextmanager
+    def track_message(self, message_id: Optional[str] = None) -> Iterator[str]:
+        """
+        1メッセージ分の処理範囲。範囲内の応答生成とLLM呼び出しをこのメッセージに集計する
+
+        Args:
+            message_id: LINEのメッセージID（未指定なら新しいキーを発行）
+
+        Yields:
+            LLMの実行メタデータに載せるメッセージのキー
+        """
+        current = {"message_key": message_id or uuid.uuid4().hex, "generators": [], "llm_calls": 0}
+        self._tracked_messages.set(current["message_key"], current)
+        token = _current_message.set(current)
+        try:
+            yield current["message_key"]
+        finally:
+            _current_message.reset(token)
+            self._record_message(current)
+
+    def record_llm_call(self, metadata: Optional[Dict[str, Any]] = None):
+        """LLMの呼び出しを実行メタデータのメッセージキーで集計（LLMレジストリのコールバックから呼ばれる）"""
+        message_key = (metadata or {}).get(MESSAGE_KEY_METADATA)
+        current = self._tracked_messages.get(message_key) if message_key else None
+        with self._lock:
+            if current is None:
+                self._stats["unattributed_llm_calls"] += 1
+                return
+            current["llm_calls"] += 1
+            self._stats["llm_calls"] += 1
+            self._stats["max_llm_calls_per_message"] = max(self._stats["max_llm_calls_per_message"], current["llm_calls"])
+
+    def resolve(self, name: str) -> Dict[str, Any]:
+        """ルート名から登録内容を取得（未登録ならデフォルト）"""
+        route = self.routes.get(name) or self.default_route
+        if route is None:
+            raise KeyError(f"ハンドラーが登録されていません: {name}")
+        return route
+
+    def dispatch(self, name: str, message: Dict[str, Any]) -> str:
+        """
+        メッセージを1つのハンドラーで処理する
+
+        Args:
+            name: カテゴリ名（またはルート名）
+            message: user_id, message_id, user_message, query, conversation_context,
+                     contextual_confirmation を含むメッセージコンテキスト
+
+        Returns:
+            応答文（同じメッセージIDが既に処理済みの場合は空文字）
+        """
+        message_id = message.get("message_id")
+        if message_id:
+            if self._dispatched_messages.get(message_id):
+                with self._lock:
+                    self._stats["duplicate_dispatch_blocked"] += 1
+                print(f"⚠️ メッセージ {message_id} は処理済みのため応答生成をスキップします")
+                return ""
+            self._dispatched_messages.set(message_id, True)
+
+        route = self.resolve(name)
+        handler_message = dict(message)
+        if not route["uses_context"]:
+            handler_message["conversation_context"] = ""
+
+        with self._lock:
+            by_route = self._stats["by_route"]
+            by_route[route["name"]] = by_route.get(route["name"], 0) + 1
+
+        print(f"🧭 ハンドラー実行: {route['name']} (カテゴリ: {message.get('category')})")
+        try:
+            response_text = route["handler"](handler_message) or ""
+        except Exception as e:
+            with self._lock:
+                self._stats["handler_errors"] += 1
+            if route["on_error"] is None:
+                raise
+            print(f"❌ ハンドラー {route['name']} でエラーが発生しました: {e}")
+            # エラー時の案内文には確認メッセージを付けず、レポートとしても保存しない
+            return route["on_error"](handler_message, e)
+
+        confirmation = message.get("contextual_confirmation")
+        if route["prepend_confirmation"] and confirmation:
+            response_text = f"{confirmation}\n\n{response_text}"
+
+        if route["report_type"] and self.report_store:
+            self.report_store(message.get("user_id"), response_text, route["report_type"])
+
+        return response_text
+
+    def _record_message(self, current: Dict[str, Any]):
+        """1メッセージ分の応答生成の実行回数を集計（LLM呼び出しは呼び出しのたびに集計済み）"""
+        generators = list(current["generators"])
+        with self._lock:
+            self._stats["messages"] += 1
+            self._stats["generator_runs"] += len(generators)
+            if len(generators) > 1:
+                self._stats["messages_with_multiple_generators"] += 1
+        if len(generators) > 1:
+            print(f"⚠️ メッセージ {current['message_key']} で応答生成が{len(generators)}回実行されました: {', '.join(generators)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ハンドラー別の実行回数と1メッセージあたりの応答生成回数・LLM呼び出し回数を取得"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["by_route"] = dict(self._stats["by_route"])
+        stats["generators_per_message"] = round(stats["generator_runs"] / stats["messages"], 3) if stats["messages"] else 0.0
+        stats["llm_calls_per_message"] = round(stats["llm_calls"] / stats["messages"], 3) if stats["messages"] else 0.0
+        stats["registered_routes"] = sorted(self.routes)
+        return stats
@@ -1,6 +1,8 @@
 # src/services/n8n_connector.py
 import requests
 from config import Config
+from utils.http_transport import http_transport
+from services.n8n_outbox import n8n_outbox
 from datetime import datetime
 
 class N8NConnector:
@@ -19,8 +21,14 @@ class N8NConnector:
             "timestamp": datetime.now().isoformat()
         }
 
+        # アウトボックス有効時は登録だけして即座に返す（送信・再送はバックグラウンド）
+        if n8n_outbox is not None:
+            n8n_outbox.enqueue("task", self.webhook_url, payload)
+            return "✅ n8nへのタスク実行を受け付けました。バックグラウンドで送信します。"
+
         try:
-            response = requests.post(
+            response = http_transport.post(
+                "n8n",
                 self.webhook_url,
                 json=payload,
                 timeout=10  # 10秒でタイムアウト
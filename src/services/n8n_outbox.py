@@ -0,0 +1,364 @@
+# src/services/n8n_outbox.py
+"""
+n8n Webhook送信用のSQLiteアウトボックス
+リクエスト処理中はペイロードを保存するだけで即座に返し、バックグラウンドのディスパッチャーが
+指数バックオフで再送する。重複キーで同じ送信の二重登録を防ぎ、上限回数失敗したものはデッドレターに移す
+"""
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from config import Config
+from utils.http_transport import http_transport
+
+# 再送しても成功しない応答（リクエスト内容の誤り）。408/429は一時的なものとして再送する
+PERMANENT_FAILURE_STATUS = range(400, 500)
+RETRYABLE_CLIENT_STATUS = (408, 429)
+
+class N8NOutbox:
+    """n8n Webhookへの送信をSQLiteに保存し、バックグラウンドで配送する"""
+
+    def __init__(self, db_path: str = "data/n8n_outbox.sqlite3", max_attempts: int = 8,
+                 base_delay: float = 5, max_delay: float = 900, dedup_seconds: float = 600,
+                 retention_seconds: float = 604800):
+        """
+        Args:
+            db_path: SQLiteファイルのパス
+            max_attempts: デッドレターに移すまでの最大送信回数
+            base_delay: 1回目の再送までの秒数（以降は倍々に延ばす）
+            max_delay: 再送間隔の上限（秒）
+            dedup_seconds: 同じ重複キーの登録を無視する秒数
+            retention_seconds: 配送済みの記録を保持する秒数
+        """
+        self.db_path = db_path
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.dedup_seconds = dedup_seconds
+        self.retention_seconds = retention_seconds
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn: Optional[sqlite3.Connection] = None
+
+        # 統計情報
+        self._stats = {
+            "enqueued": 0,
+            "duplicates": 0,
+            "delivered": 0,
+            "failed_attempts": 0,
+            "dead_lettered": 0,
+            "replayed": 0
+        }
+
+    def enqueue(self, kind: str, url: str, payload: Dict[str, Any],
+                dedup_key: Optional[str] = None) -> Tuple[int, bool]:
+        """
+        送信をアウトボックスに登録する（配送はバックグラウンドで行う）
+
+        Args:
+            kind: 送信の種類（email, report_email, taskなど。確認・集計用）
+            url: 送信先のWebhook URL
+            payload: 送信するJSONペイロード
+            dedup_key: 重複判定のキー（未指定なら種類・URL・ペイロードから生成）
+
+        Returns:
+            (アウトボックスのID, 新規登録ならTrue / 重複ならFalse)
+        """
+        body = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        dedup_key = dedup_key or hashlib.sha256(f"{kind}\0{url}\0{body}".encode("utf-8")).hexdigest()
+        now = time.time()
+
+        with self._lock:
+            conn = self._db()
+            row = conn.execute(
+                "SELECT id FROM outbox WHERE dedup_key = ? AND created_at >= ? ORDER BY id DESC LIMIT 1",
+                (dedup_key, now - self.dedup_seconds)
+            ).fetchone()
+            if row is not None:
+                self._stats["duplicates"] += 1
+                print(f"📮 n8n送信は登録済みのためスキップしました (id={row[0]}, kind={kind})")
+                return row[0], False
+
+            cursor = conn.execute(
+                "INSERT INTO outbox (dedup_key, kind, url, payload, status, attempts, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, 'pending', 0, ?, ?)",
+                (dedup_key, kind, url, body, now, now)
+            )
+            conn.commit()
+            self._stats["enqueued"] += 1
+            entry_id = cursor.lastrowid
+
+        print(f"📮 n8n送信をアウトボックスに登録しました (id={entry_id}, kind={kind})")
+        self.start()
+        self._wakeup.set()
+        return entry_id, True
+
+    def start(self):
+        """ディスパッチャーを起動（起動済みなら何もしない）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._db()  # 起動時にDBを開き、前回の未送信分を配送対象にする
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="n8n-outbox", daemon=True)
+            self._thread.start()
+        print("✅ n8nアウトボックスのディスパッチャーを起動しました")
+
+    def stop(self, timeout: float = 10):
+        """ディスパッチャーを停止（未送信の登録はDBに残り、次回起動時に送信される）"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def retry_now(self, entry_id: int) -> bool:
+        """再送待ちの登録をすぐに送信し直す"""
+        with self._lock:
+            conn = self._db()
+            cursor = conn.execute(
+                "UPDATE outbox SET next_attempt_at = ? WHERE id = ? AND status = 'pending'", (time.time(), entry_id)
+            )
+            conn.commit()
+        if cursor.rowcount:
+            self._wakeup.set()
+        return cursor.rowcount > 0
+
+    def replay_dead_letter(self, dead_letter_id: int) -> Optional[int]:
+        """
+        デッドレターをアウトボックスに戻して再送する
+
+        Returns:
+            新しいアウトボックスのID（見つからなければNone）
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            row = conn.execute(
+                "SELECT dedup_key, kind, url, payload FROM dead_letters WHERE id = ?", (dead_letter_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            cursor = conn.execute(
+                "INSERT INTO outbox (dedup_key, kind, url, payload, status, attempts, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, 'pending', 0, ?, ?)",
+                (*row, now, now)
+            )
+            conn.execute("DELETE FROM dead_letters WHERE id = ?", (dead_letter_id,))
+            conn.commit()
+            self._stats["replayed"] += 1
+            entry_id = cursor.lastrowid
+
+        print(f"🔁 デッドレターを再送します (dead_letter_id={dead_letter_id} → id={entry_id})")
+        self.start()
+        self._wakeup.set()
+        return entry_id
+
+    def list_entries(self, status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """アウトボックスの登録を新しい順に取得（statusは pending / delivered）"""
+        query = "SELECT id, kind, status, attempts, next_attempt_at, created_at, delivered_at, last_error, payload FROM outbox"
+        params: Tuple[Any, ...] = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        query += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            rows = self._db().execute(query, params + (limit,)).fetchall()
+        keys = ("id", "kind", "status", "attempts", "next_attempt_at", "created_at", "delivered_at", "last_error", "payload")
+        return [self._row_to_dict(keys, row) for row in rows]
+
+    def list_dead_letters(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """デッドレターを新しい順に取得"""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT id, outbox_id, kind, attempts, created_at, failed_at, last_error, payload "
+                "FROM dead_letters ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        keys = ("id", "outbox_id", "kind", "attempts", "created_at", "failed_at", "last_error", "payload")
+        return [self._row_to_dict(keys, row) for row in rows]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """登録・配送・失敗の件数と滞留件数を取得"""
+        with self._lock:
+            conn = self._db()
+            stats = dict(self._stats)
+            stats["pending"] = conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+            stats["dead_letters"] = conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+            oldest = conn.execute("SELECT MIN(created_at) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        stats["oldest_pending_seconds"] = round(time.time() - oldest, 1) if oldest else 0.0
+        stats["running"] = self._thread is not None and self._thread.is_alive()
+        return stats
+
+    def _run(self):
+        """送信時刻を迎えた登録を順に配送するループ"""
+        while not self._stop.is_set():
+            try:
+                due = self._due_entries()
+                for entry_id, url, payload, attempts in due:
+                    if self._stop.is_set():
+                        break
+                    self._deliver(entry_id, url, payload, attempts)
+                if due:
+                    continue
+                self._cleanup()
+                wait = self._seconds_until_next()
+            except sqlite3.Error as e:
+                print(f"⚠️ n8nアウトボックスの処理中にDBエラー: {e}")
+                wait = self.base_delay
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def _deliver(self, entry_id: int, url: str, payload: str, attempts: int):
+        """1件を送信し、結果に応じて配送済み・再送待ち・デッドレターに振り分ける"""
+        error = None
+        permanent = False
+        try:
+            response = http_transport.post(
+                "n8n", url, data=payload.encode("utf-8"),
+                headers={"Content-Type": "application/json"}
+            )
+            if 200 <= response.status_code < 300:
+                self._mark_delivered(entry_id)
+                return
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+            permanent = response.status_code in PERMANENT_FAILURE_STATUS and response.status_code not in RETRYABLE_CLIENT_STATUS
+        except requests.exceptions.RequestException as e:
+            error = f"{type(e).__name__}: {str(e)[:200]}"
+
+        attempts += 1
+        with self._lock:
+            self._stats["failed_attempts"] += 1
+        if permanent or attempts >= self.max_attempts:
+            self._move_to_dead_letters(entry_id, attempts, error)
+            return
+
+        # 指数バックオフ（同時に失敗した送信が一斉に再送されないよう揺らぎを入れる）
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1))) * random.uniform(0.8, 1.2)
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, error, entry_id)
+            )
+            conn.commit()
+        print(f"⚠️ n8n送信に失敗しました (id={entry_id}, {attempts}回目)。{delay:.0f}秒後に再送します: {error}")
+
+    def _mark_delivered(self, entry_id: int):
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                "UPDATE outbox SET status = 'delivered', delivered_at = ?, attempts = attempts + 1, last_error = NULL "
+                "WHERE id = ?", (time.time(), entry_id)
+            )
+            conn.commit()
+            self._stats["delivered"] += 1
+        print(f"📨 n8n送信が完了しました (id={entry_id})")
+
+    def _move_to_dead_letters(self, entry_id: int, attempts: int, error: str):
+        """送信をあきらめた登録をデッドレターに移す"""
+        with self._lock:
+            conn = self._db()
+            row = conn.execute(
+                "SELECT dedup_key, kind, url, payload, created_at FROM outbox WHERE id = ?", (entry_id,)
+            ).fetchone()
+            if row is None:
+                return
+            conn.execute(
+                "INSERT INTO dead_letters (outbox_id, dedup_key, kind, url, payload, created_at, attempts, failed_at, last_error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry_id, *row, attempts, time.time(), error)
+            )
+            conn.execute("DELETE FROM outbox WHERE id = ?", (entry_id,))
+            conn.commit()
+            self._stats["dead_lettered"] += 1
+        print(f"❌ n8n送信をデッドレターに移しました (id={entry_id}, {attempts}回失敗): {error}")
+
+    def _due_entries(self) -> List[Tuple[int, str, str, int]]:
+        with self._lock:
+            return self._db().execute(
+                "SELECT id, url, payload, attempts FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT 20", (time.time(),)
+            ).fetchall()
+
+    def _seconds_until_next(self) -> float:
+        """次の再送時刻までの秒数（待ちがなければ長めに待機し、登録時に起こされる）"""
+        with self._lock:
+            next_at = self._db().execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+            ).fetchone()[0]
+        if next_at is None:
+            return 60.0
+        return max(0.0, min(60.0, next_at - time.time()))
+
+    def _cleanup(self):
+        """保持期間を過ぎた配送済みの記録を削除"""
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                "DELETE FROM outbox WHERE status = 'delivered' AND delivered_at < ?",
+                (time.time() - self.retention_seconds,)
+            )
+            conn.commit()
+
+    def _db(self) -> sqlite3.Connection:
+        """SQLite接続（初回使用時に開くため、インポートしただけではファイルを作らない。_lockを保持して呼ぶ）"""
+        if self._conn is None:
+            self._open_database()
+        return self._conn
+
+    @staticmethod
+    def _row_to_dict(keys: Tuple[str, ...], row: Tuple[Any, ...]) -> Dict[str, Any]:
+        entry = dict(zip(keys, row))
+        try:
+            entry["payload"] = json.loads(entry["payload"])
+        except (TypeError, ValueError):
+            pass
+        return entry
+
+    def _open_database(self):
+        """SQLiteファイルを開く（失敗時はメモリ上のDBで動作し、再起動で未送信分は失われる）"""
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        except sqlite3.Error as e:
+            print(f"⚠️ n8nアウトボックスのDBを開けませんでした。メモリ上で動作します: {e}")
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, dedup_key TEXT NOT NULL, kind TEXT NOT NULL, "
+            "url TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL, "
+            "next_attempt_at REAL NOT NULL, created_at REAL NOT NULL, delivered_at REAL, last_error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_dedup ON outbox (dedup_key, created_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, outbox_id INTEGER, dedup_key TEXT NOT NULL, kind TEXT NOT NULL, "
+            "url TEXT NOT NULL, payload TEXT NOT NULL, attempts INTEGER NOT NULL, created_at REAL NOT NULL, "
+            "failed_at REAL NOT NULL, last_error TEXT)"
+        )
+        self._conn.commit()
+        pending = self._conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        print(f"✅ n8nアウトボックスを開きました: 未送信 {pending}件 ({self.db_path})")
+
+# プロセス全体で共有するアウトボックス（無効時はNoneで、各サービスは従来どおり同期送信する）
+n8n_outbox = N8NOutbox(
+    db_path=Config.N8N_OUTBOX_DB_PATH,
+    max_attempts=Config.N8N_OUTBOX_MAX_ATTEMPTS,
+    base_delay=Config.N8N_OUTBOX_BASE_DELAY,
+    max_delay=Config.N8N_OUTBOX_MAX_DELAY,
+    dedup_seconds=Config.N8N_OUTBOX_DEDUP_SECONDS
+) if Config.N8N_OUTBOX_ENABLED else None
@@ -1,10 +1,13 @@
 # src/services/n8n_workflow_service.py - N8Nワークフロー連携サービス
 
+import hashlib
 import requests
 import json
 from datetime import datetime
 from typing import Dict, Any, Optional
 from config import Config
+from utils.http_transport import http_transport
+from services.n8n_outbox import n8n_outbox
 
 class N8NWorkflowService:
     """N8Nワークフロー連携サービス"""
@@ -35,8 +38,15 @@ class N8NWorkflowService:
             }
         }
         
+        # アウトボックス有効時は登録だけして即座に返す（同じレポートの二重配信は重複キーで防ぐ）
+        if n8n_outbox is not None:
+            report_key = hashlib.sha256(json.dumps(payload["data"], ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+            n8n_outbox.enqueue("report_email", self.webhook_url, payload, dedup_key=f"report_email:{report_key}")
+            return "✅ レポートメールの配信を受け付けました。バックグラウンドで送信します。"
+        
         try:
-            response = requests.post(
+            response = http_transport.post(
+                "n8n",
                 self.webhook_url,
                 json=payload,
                 timeout=self.timeout,
@@ -75,8 +85,13 @@ class N8NWorkflowService:
             "data": data
         }
         
+        if n8n_outbox is not None:
+            n8n_outbox.enqueue(f"workflow:{workflow_type}", self.webhook_url, payload)
+            return "✅ ワークフローの実行を受け付けました。バックグラウンドで送信します。"
+        
         try:
-            response = requests.post(
+            response = http_transport.post(
+                "n8n",
                 self.webhook_url,
                 json=payload,
                 timeout=self.timeout,
@@ -153,7 +168,8 @@ class N8NWorkflowService:
         }
         
         try:
-            response = requests.post(
+            response = http_transport.post(
+                "n8n",
                 self.webhook_url,
                 json=test_payload,
                 timeout=10,  # 短いタイムアウト
@@ -1,27 +1,141 @@
 # src/services/rag_service.py (OpenAI版 - みなみちゃんキャラクター対応)
 import os
+import contextvars
 import json
+import hashlib
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import TextLoader, DirectoryLoader
 from config import Config
+from services.embedding_cache import CachedEmbeddings
+from services.semantic_answer_cache import SemanticAnswerCache
+from services.vector_collections import COLLECTION_NAMES, CollectionView, collection_counts
+from services.index_versions import IndexVersionStore
+from services.context_builder import ContextBuilder
+from services.adaptive_retriever import select_adaptive
+from services.lexical_index import LexicalIndex, document_key, reciprocal_rank_fusion
+from services.intent_classifier import UNKNOWN_KEYWORD_HINTS
+from services.llm_registry import get_llm
+from services.message_dispatcher import answer_generator
+
+# ローカル回答が「参考文書に情報がない」旨の回答かどうかを判定する表現
+LOCAL_REFUSAL_PHRASES = ["含まれていません", "記載されていません", "記載がありません", "見当たりません", "見つかりませんでした", "情報がありません"]
+
+# DB回答が使えない（エラー・該当なし・外部情報への誘導）と判定する表現。該当すればWeb検索にフォールバックする
+DB_ANSWER_FAILURE_PHRASES = [
+    "申し訳ありません",
+    "データベースが初期化されていません",
+    "関連するデータベースが",
+    "見つかりませんでした",
+    "回答を生成できませんでした",
+    "含まれていません",
+    "参考文書には",
+    "取扱説明書やメーカーの公式サポートページ",
+    "公式情報を参考にしてください"
+]
+
+# 売上の回答が「該当データなし」と判定する表現（該当すれば定型の案内を返す）
+SALES_NOT_FOUND_PHRASES = ["見つかりませんでした", "含まれていません", "参考文書には"]
+
+SALES_NOT_FOUND_MESSAGE = """申し訳ございません。お探しの売上データが見つかりませんでした。
+
+営業データベースの確認が必要です。以下をご確認ください：
+- 担当者名が正しいか（高見、辻川、小林、佐藤、田中）
+- 期間の指定が正しいか
+
+ご不明な点がございましたら、営業管理部までお問い合わせください。"""
+
+# 意味的回答キャッシュを使うカテゴリ（販売会議資料は担当者名や月だけが違う質問を区別できないため対象外）
+ANSWER_CACHE_CATEGORIES = ("office", "procedures")
+
+# インデックス名 -> (保存先ディレクトリ, 表示名)
+VECTORSTORE_INDEXES = {
+    "sales": ("faiss_index_sales", "販売会議資料"),
+    "office": ("faiss_index_office", "事務規定"),
+    "procedures": ("faiss_index_procedures", "手続きガイド"),
+    "unified": ("faiss_index_unified", "統合")
+}
 
 class RAGService:
     def __init__(self):
-        self.model = ChatOpenAI(
-            model_name="gpt-4o",
-            openai_api_key=Config.OPENAI_API_KEY,
-            temperature=0.7
-        )
-        self.embeddings = OpenAIEmbeddings(
-            model="text-embedding-3-small",
-            openai_api_key=Config.OPENAI_API_KEY
+        self.model = get_llm("rag_answer")
+        # Web検索結果の整形は軽いモデルで行う
+        self.formatter_model = get_llm("formatter")
+        # 質問の埋め込みはキャッシュ経由（同じ質問・インデックス構築済みのテキストはAPIを呼ばない）
+        self.embeddings = CachedEmbeddings(
+            OpenAIEmbeddings(
+                model="text-embedding-3-small",
+                openai_api_key=Config.OPENAI_API_KEY
+            ),
+            max_entries=Config.EMBEDDING_CACHE_MAX_ENTRIES,
+            db_path=Config.EMBEDDING_CACHE_DB_PATH
         )
-        self.office_vectorstore = None
-        self.procedures_vectorstore = None
-        self.sales_vectorstore = None
+        # 読み込み済みのベクトルストア（遅延読み込みモードでは初回検索時に読み込む）
+        self._vectorstores = {}
+        self._lazy_indexes = set()
+        self._unified_mode = False  # 統合インデックスをコレクション単位で参照するかどうか
+        self._vectorstore_lock = threading.Lock()
+        self.vectorstore_load_seconds = {}
+        
+        # バージョン付きインデックス（CURRENTが指すバージョンを読み込み、無停止で切り替える）
+        self.index_store = IndexVersionStore(Config.VECTORSTORE_VERSIONS_DIR, keep=Config.VECTORSTORE_KEEP_VERSIONS)
+        self.index_base_dir = "."
+        self.active_index_version = None
+        self._reload_lock = threading.Lock()
+        self._failed_index_version = None  # 読み込みに失敗したバージョン（監視で再試行し続けない）
+        
+        # DB→Web判定用の距離閾値（FAISSのL2距離: 小さいほど類似。インデックスごとに校正）
+        self.retrieval_distance_thresholds = {
+            "office": Config.RAG_MAX_DISTANCE_OFFICE,
+            "procedures": Config.RAG_MAX_DISTANCE_PROCEDURES,
+            "sales": Config.RAG_MAX_DISTANCE_SALES
+        }
+        
+        # 検索モード（fixed: 固定k件 / adaptive: スコア分布に応じて件数を調整）
+        self.retrieval_mode = Config.RAG_RETRIEVAL_MODE
+        
+        # 文字n-gram/BM25の語彙インデックス（インデックス名 -> (元のベクトルストア, 語彙インデックス, FAISS番号の対応表)）
+        self._lexical_indexes = {}
+        self._lexical_lock = threading.Lock()
+        
+        # DB回答・Web検索フォールバックの件数（Web検索率の確認用）
+        self._retrieval_stats_lock = threading.Lock()
+        self.retrieval_stats = {
+            "db_answers": 0,
+            "web_fallbacks": 0,
+            "lexical_rescues": 0,
+            "speculative_started": 0,
+            "speculative_used": 0,
+            "speculative_discarded": 0,
+            "speculative_saved_seconds": 0.0
+        }
+        
+        # Web検索の先行実行（カテゴリ -> off / borderline / always）
+        self.speculative_policy = self._parse_speculative_policy(Config.RAG_SPECULATIVE_POLICY)
+        self._speculation_executor = None
+        
+        # カテゴリ別のトークン予算でコンテキストを組み立てる（重複チャンクの除去・スコア順）
+        self.context_builder = ContextBuilder({
+            "office": Config.RAG_CONTEXT_BUDGET_OFFICE,
+            "procedures": Config.RAG_CONTEXT_BUDGET_PROCEDURES,
+            "sales": Config.RAG_CONTEXT_BUDGET_SALES,
+            "detailed_sales": Config.RAG_CONTEXT_BUDGET_DETAILED_SALES,
+            "history": Config.RAG_CONTEXT_BUDGET_HISTORY
+        }, default_budget=Config.RAG_CONTEXT_BUDGET_OFFICE)
+        
+        # 言い換え質問用の意味的回答キャッシュ（インデックス再構築時に破棄）
+        self.answer_cache = SemanticAnswerCache(
+            similarity_threshold=Config.ANSWER_CACHE_SIMILARITY,
+            ttl_seconds=Config.ANSWER_CACHE_TTL_SECONDS,
+            max_entries_per_category=Config.ANSWER_CACHE_MAX_ENTRIES
+        ) if Config.ANSWER_CACHE_ENABLED else None
+        self.index_versions = {}
         
         # Web検索サービスの初期化（遅延読み込み）
         self.web_search_service = None
@@ -31,42 +145,301 @@ class RAGService:
         self.enhanced_metrics = self._load_enhanced_metrics()
         self.interaction_history = self._load_interaction_history()
     
-    # setup_vectorstoresは以前の「読み込み専用」のままでOKです
+    @property
+    def sales_vectorstore(self):
+        return self._get_vectorstore("sales")
+    
+    @sales_vectorstore.setter
+    def sales_vectorstore(self, vectorstore):
+        self._vectorstores["sales"] = vectorstore
+    
+    @property
+    def office_vectorstore(self):
+        return self._get_vectorstore("office")
+    
+    @office_vectorstore.setter
+    def office_vectorstore(self, vectorstore):
+        self._vectorstores["office"] = vectorstore
+    
+    @property
+    def procedures_vectorstore(self):
+        return self._get_vectorstore("procedures")
+    
+    @procedures_vectorstore.setter
+    def procedures_vectorstore(self, vectorstore):
+        self._vectorstores["procedures"] = vectorstore
+    
     def setup_vectorstores(self):
-        """保存されたベクトルデータベースを読み込む"""
+        """
+        保存されたベクトルデータベースを読み込む
+        
+        VECTORSTORE_LAZY_LOAD=true の場合は読み込みを各カテゴリの初回検索まで遅らせ、
+        VECTORSTORE_WARMUP で指定したインデックスのみバックグラウンドで先読みする
+        """
         print("保存されたベクトルデータベースを読み込みます...")
         try:
-            if os.path.exists("faiss_index_sales"):
-                self.sales_vectorstore = FAISS.load_local(
-                    "faiss_index_sales", 
-                    self.embeddings, 
-                    allow_dangerous_deserialization=True
-                )
-                print("✅ 販売会議資料データベースを読み込みました。")
+            self.active_index_version = self.index_store.current()
+            self.index_base_dir = self.index_store.path(self.active_index_version) if self.active_index_version else "."
+            if self.active_index_version:
+                print(f"📌 インデックスのバージョン: {self.active_index_version}")
+            
+            self._unified_mode = self._use_unified_index(self.index_base_dir)
+            if Config.RAG_UNIFIED_INDEX and not self._unified_mode:
+                print("警告: 統合インデックス 'faiss_index_unified' が見つからないため、個別のインデックスを使用します。")
+            active_indexes = ["unified"] if self._unified_mode else list(COLLECTION_NAMES)
+            
+            if Config.VECTORSTORE_LAZY_LOAD:
+                self._lazy_indexes = set(active_indexes)
+                print(f"⏳ 遅延読み込みモード: 初回検索時に読み込みます (mmap={Config.VECTORSTORE_MMAP})")
+                warmup = self._warmup_targets()
+                if warmup:
+                    threading.Thread(
+                        target=self.warm_up_vectorstores, args=(warmup,),
+                        name="vectorstore-warmup", daemon=True
+                    ).start()
             else:
-                print("警告: 保存された販売会議資料DB 'faiss_index_sales' が見つかりません。")
-                
-            if os.path.exists("faiss_index_office"):
-                self.office_vectorstore = FAISS.load_local(
-                    "faiss_index_office", 
-                    self.embeddings, 
-                    allow_dangerous_deserialization=True
-                )
-                print("✅ 事務規定データベースを読み込みました。")
+                for name in active_indexes:
+                    self._vectorstores[name] = self._load_vectorstore(name)
+            
+            if self._unified_mode and self._vectorstores.get("unified") is not None:
+                print(f"📚 統合インデックスのコレクション: {collection_counts(self._vectorstores['unified'])}")
+            
+            self._refresh_index_versions()
+        except Exception as e:
+            print(f"データベースの読み込み中にエラーが発生しました: {e}")
+    
+    def reload_vectorstores(self, version: str = None) -> bool:
+        """
+        インデックスの新しいバージョンを読み込み、参照をアトミックに切り替える
+        
+        読み込みが終わるまでは旧バージョンで検索を続け、処理中の検索は取得済みの旧インデックスで完了する
+        
+        Args:
+            version: 切り替え先のバージョン（未指定ならCURRENTが指すバージョン）
+        
+        Returns:
+            切り替えに成功したかどうか（別の切り替えが進行中の場合もFalse）
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            print("⚠️ インデックスの切り替えが既に進行中です")
+            return False
+        try:
+            version = version or self.index_store.current()
+            if not version:
+                print("⚠️ 切り替え先のインデックスのバージョンがありません")
+                return False
+            
+            started_at = time.time()
+            base_dir = self.index_store.path(version)
+            unified_mode = self._use_unified_index(base_dir)
+            active_indexes = ["unified"] if unified_mode else list(COLLECTION_NAMES)
+            vectorstores = {name: self._load_vectorstore(name, base_dir) for name in active_indexes}
+            if all(vectorstore is None for vectorstore in vectorstores.values()):
+                print(f"❌ インデックス {version} を読み込めなかったため切り替えを中止しました")
+                self._failed_index_version = version
+                return False
+            
+            # 読み込みに成功したバージョンだけをCURRENTに書き込む（失敗時は稼働中のバージョンを指したまま）
+            previous_version = self.active_index_version
+            with self._vectorstore_lock:
+                self._vectorstores = vectorstores
+                self._lazy_indexes = set()
+                self._unified_mode = unified_mode
+                self.index_base_dir = base_dir
+                self.active_index_version = version
+                if self.index_store.current() != version:
+                    self.index_store.publish(version)
+                self._refresh_index_versions()
+            self._failed_index_version = None
+            print(f"🔁 インデックスを切り替えました: {previous_version} -> {version} ({time.time() - started_at:.2f}秒)")
+            
+            self.index_store.prune()
+            return True
+        except Exception as e:
+            print(f"インデックスの切り替え中にエラーが発生しました: {e}")
+            self._failed_index_version = version
+            return False
+        finally:
+            self._reload_lock.release()
+    
+    def reload_vectorstores_async(self, version: str = None):
+        """バックグラウンドでインデックスを読み込んで切り替える"""
+        threading.Thread(
+            target=self.reload_vectorstores, args=(version,),
+            name="vectorstore-reload", daemon=True
+        ).start()
+    
+    def rollback_vectorstores(self) -> bool:
+        """1つ前のバージョンのインデックスに戻す"""
+        previous_version = self.index_store.previous(self.active_index_version)
+        if not previous_version:
+            print("⚠️ ロールバック先のインデックスのバージョンがありません")
+            return False
+        print(f"⏪ インデックスを {previous_version} にロールバックします")
+        return self.reload_vectorstores(previous_version)
+    
+    def start_index_watcher(self, interval_seconds: float):
+        """CURRENTファイルを監視し、別のバージョンを指したら自動で切り替える（ファイルトリガー）"""
+        def watch():
+            while True:
+                time.sleep(interval_seconds)
+                current = self.index_store.current()
+                if current and current != self.active_index_version and current != self._failed_index_version:
+                    print(f"👀 CURRENTの更新を検出しました: {current}")
+                    self.reload_vectorstores()
+        
+        threading.Thread(target=watch, name="vectorstore-watcher", daemon=True).start()
+        print(f"✅ インデックスのバージョン監視を開始しました (間隔: {interval_seconds}秒)")
+    
+    def get_index_versions(self):
+        """保存済みのバージョンと稼働中のバージョンを取得"""
+        return {
+            "active": self.active_index_version,
+            "current_pointer": self.index_store.current(),
+            "versions": self.index_store.list_versions(),
+            "keep": self.index_store.keep
+        }
+    
+    def warm_up_vectorstores(self, names=None):
+        """指定したインデックスを先読みする（未指定なら全インデックス）"""
+        names = names or list(COLLECTION_NAMES)
+        for name in names:
+            self._get_vectorstore(name)
+        print(f"🔥 ベクトルデータベースのウォームアップが完了しました: {', '.join(names)}")
+    
+    def get_vectorstore_status(self):
+        """インデックスごとの読み込み状況と読み込み時間を取得"""
+        indexes = {
+            name: {
+                "loaded": self._vectorstores.get(name) is not None,
+                "pending": name in self._lazy_indexes,
+                "load_seconds": self.vectorstore_load_seconds.get(name),
+                "version": self.index_versions.get(name)
+            }
+            for name in VECTORSTORE_INDEXES
+        }
+        return {"active_version": self.active_index_version, "indexes": indexes}
+    
+    def _warmup_targets(self):
+        """VECTORSTORE_WARMUPの設定値を先読み対象のインデックス名に変換"""
+        setting = Config.VECTORSTORE_WARMUP.strip().lower()
+        if not setting:
+            return []
+        if setting == "all":
+            return list(COLLECTION_NAMES)
+        return [name.strip() for name in setting.split(",") if name.strip() in COLLECTION_NAMES]
+    
+    def _use_unified_index(self, base_dir: str) -> bool:
+        """統合インデックスを使うかどうか（設定が有効で、統合インデックスが存在する場合のみ）"""
+        return Config.RAG_UNIFIED_INDEX and os.path.exists(os.path.join(base_dir, VECTORSTORE_INDEXES["unified"][0]))
+    
+    def search_collections(self, question: str, collections=None, k: int = 3):
+        """
+        複数コレクションを1回の検索で横断する
+        
+        Args:
+            question: 検索する質問
+            collections: 対象コレクション名のリスト（未指定なら全コレクション）
+            k: 取得件数
+        
+        Returns:
+            距離の近い順のドキュメント
+        """
+        collections = list(collections or COLLECTION_NAMES)
+        if self._unified_mode:
+            unified = self._get_vectorstore("unified")
+            if unified is None:
+                return []
+            return CollectionView(unified, collections, Config.RAG_UNIFIED_FETCH_K).similarity_search(question, k=k)
+        
+        # 個別インデックスの場合は各インデックスの結果を距離順に統合
+        results = []
+        for name in collections:
+            vectorstore = self._get_vectorstore(name)
+            if vectorstore is not None:
+                results.extend(vectorstore.similarity_search_with_score(question, k=k))
+        results.sort(key=lambda item: item[1])
+        return [doc for doc, _ in results[:k]]
+    
+    def _get_vectorstore(self, name: str):
+        """ベクトルストアを取得（遅延読み込みモードでは初回アクセス時に読み込む）"""
+        if self._unified_mode and name in COLLECTION_NAMES:
+            unified = self._get_vectorstore("unified")
+            return CollectionView(unified, [name], Config.RAG_UNIFIED_FETCH_K) if unified is not None else None
+        
+        vectorstore = self._vectorstores.get(name)
+        if vectorstore is not None or name not in self._lazy_indexes:
+            return vectorstore
+        
+        with self._vectorstore_lock:
+            if name in self._lazy_indexes:
+                self._vectorstores[name] = self._load_vectorstore(name)
+                self._lazy_indexes.discard(name)
+        return self._vectorstores.get(name)
+    
+    def _load_vectorstore(self, name: str, base_dir: str = None):
+        """インデックスを1つ読み込む（見つからない・失敗時はNone）"""
+        index_path, label = VECTORSTORE_INDEXES[name]
+        index_path = os.path.join(base_dir or self.index_base_dir, index_path)
+        if not os.path.exists(index_path):
+            print(f"警告: 保存された{label}DB '{index_path}' が見つかりません。")
+            return None
+        
+        try:
+            started_at = time.time()
+            if Config.VECTORSTORE_MMAP:
+                vectorstore = self._load_mmap_vectorstore(index_path)
             else:
-                print("警告: 保存された事務規定DB 'faiss_index_office' が見つかりません。")
-
-            if os.path.exists("faiss_index_procedures"):
-                self.procedures_vectorstore = FAISS.load_local(
-                    "faiss_index_procedures", 
+                vectorstore = FAISS.load_local(
+                    index_path, 
                     self.embeddings, 
                     allow_dangerous_deserialization=True
                 )
-                print("✅ 手続きガイドデータベースを読み込みました。")
-            else:
-                print("警告: 保存された手続きガイドDB 'faiss_index_procedures' が見つかりません。")
+            elapsed = time.time() - started_at
+            self.vectorstore_load_seconds[name] = round(elapsed, 3)
+            print(f"✅ {label}データベースを読み込みました。({elapsed:.2f}秒, mmap={Config.VECTORSTORE_MMAP})")
+            return vectorstore
         except Exception as e:
-            print(f"データベースの読み込み中にエラーが発生しました: {e}")
+            print(f"{label}データベースの読み込み中にエラーが発生しました: {e}")
+            return None
+    
+    def _load_mmap_vectorstore(self, index_path: str):
+        """
+        FAISSインデックスをメモリマップで読み込む
+        複数のワーカープロセスが同じページキャッシュを共有するため、プロセスごとの常駐メモリが増えない
+        """
+        import faiss
+        
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            index = faiss.read_index(os.path.join(index_path, "index.faiss"), flags)
+        except RuntimeError as e:
+            # メモリマップに対応していないインデックス形式・faissバージョンでは通常読み込み
+            print(f"⚠️ メモリマップ読み込みに失敗したため通常読み込みします: {e}")
+            return FAISS.load_local(index_path, self.embeddings, allow_dangerous_deserialization=True)
+        
+        with open(os.path.join(index_path, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(self.embeddings, index, docstore, index_to_docstore_id)
+    
+    def _index_version(self, index_path: str):
+        """インデックスファイルの更新時刻とサイズからバージョン文字列を算出"""
+        index_file = os.path.join(index_path, "index.faiss")
+        if not os.path.exists(index_file):
+            return None
+        stat = os.stat(index_file)
+        return hashlib.sha256(f"{stat.st_mtime_ns}:{stat.st_size}".encode()).hexdigest()[:12]
+    
+    def _refresh_index_versions(self):
+        """インデックスのバージョンを記録し、再構築されていれば回答キャッシュを破棄"""
+        versions = {
+            name: self._index_version(os.path.join(self.index_base_dir, path))
+            for name, (path, _) in VECTORSTORE_INDEXES.items()
+        }
+        if self.index_versions and versions != self.index_versions and self.answer_cache:
+            print(f"🔄 インデックスの再構築を検出しました: {self.index_versions} -> {versions}")
+            self.answer_cache.flush()
+        self.index_versions = versions
     
     def _load_detailed_sales_data(self):
         """詳細営業データの読み込み"""
@@ -110,22 +483,43 @@ class RAGService:
             print(f"顧客接触履歴データの読み込みエラー: {e}")
             return {}
 
-    def _generate_response(self, question: str, vectorstore, prompt_template: str) -> str:
+    def _index_version_for(self, category: str):
+        """カテゴリの回答根拠となるインデックスのバージョン（統合インデックス使用時はその版）"""
+        return self.index_versions.get("unified" if self._unified_mode else category)
+    
+    def _generate_response(self, question: str, vectorstore, prompt_template: str, docs=None,
+                           cache_category: str = None) -> str:
         if not vectorstore:
             return "申し訳ありません、関連するデータベースが初期化されていません。"
         
-        docs = vectorstore.similarity_search(question, k=3)
-        context = "\n\n".join([doc.page_content for doc in docs])
+        # 言い換えの質問がキャッシュにあればLLMを呼ばない（質問埋め込みは埋め込みキャッシュから再利用）
+        question_vector = None
+        if cache_category in ANSWER_CACHE_CATEGORIES and self.answer_cache:
+            question_vector = self.embeddings.embed_query(question)
+            cached_answer = self.answer_cache.lookup(cache_category, self._index_version_for(cache_category), question_vector)
+            if cached_answer is not None:
+                return cached_answer
+        
+        if docs is None:
+            docs = self.retrieve(vectorstore, question, k=3, index_name=cache_category)
+        context = self.context_builder.build(docs, cache_category or "default")
         prompt = prompt_template.format(context=context, question=question)
         
         try:
+            started_at = time.time()
             response = self.model.invoke(prompt)
+            # 「参考文書に情報がない」旨の回答はキャッシュしない
+            if question_vector is not None and not self._is_local_refusal(response.content):
+                self.answer_cache.store(
+                    cache_category, self._index_version_for(cache_category), question_vector,
+                    question, response.content, time.time() - started_at
+                )
             return response.content
         except Exception as e:
             print(f"回答生成中にエラーが発生しました: {e}")
             return "申し訳ありません、回答を生成できませんでした。"
 
-    def query_office(self, question: str) -> str:
+    def query_office(self, question: str, docs=None) -> str:
         """事務規定に関する質問に回答"""
         prompt_template = """
         あなたは事務作業専用秘書エージェントです。以下の参考文書を基に、質問に対する**最も重要な事実と数値を抽出し、箇条書きで簡潔に**記述してください。
@@ -137,9 +531,9 @@ class RAGService:
         {question}
         # 回答:
         """
-        return self._generate_response(question, self.office_vectorstore, prompt_template)
+        return self._generate_response(question, self.office_vectorstore, prompt_template, docs, cache_category="office")
 
-    def query_procedures(self, question: str) -> str:
+    def query_procedures(self, question: str, docs=None) -> str:
         """手続きガイドに関する質問に回答"""
         if not self.procedures_vectorstore:
             return self._generate_enhanced_procedures_response(question)
@@ -154,9 +548,9 @@ class RAGService:
         {question}
         # 回答:
         """
-        return self._generate_response(question, self.procedures_vectorstore, prompt_template)
+        return self._generate_response(question, self.procedures_vectorstore, prompt_template, docs, cache_category="procedures")
     
-    def query_sales(self, question: str) -> str:
+    def query_sales(self, question: str, docs=None) -> str:
         """販売会議資料に関する質問に回答（みなみちゃんキャラクター統一）"""
         prompt_template = """
         あなたは阪南ビジネスマシンの営業現場を知り尽くした先輩「みなみちゃん」です。
@@ -181,8 +575,9 @@ class RAGService:
         
         このような調子で、自然で親しみやすく応答してください。
         """
-        return self._generate_response(question, self.sales_vectorstore, prompt_template)
+        return self._generate_response(question, self.sales_vectorstore, prompt_template, docs, cache_category="sales")
 
+    @answer_generator
     def query_sales_with_history(self, question: str, conversation_history: str = "") -> str:
         """会話履歴を考慮した販売会議資料分析（みなみちゃんキャラクター）"""
         # 詳細営業データから関連情報を取得
@@ -230,13 +625,13 @@ class RAGService:
         if not self.sales_vectorstore:
             return "申し訳ありません、販売会議資料データベースが初期化されていません。"
         
-        docs = self.sales_vectorstore.similarity_search(question, k=3)
-        context = "\n\n".join([doc.page_content for doc in docs])
+        docs = self.retrieve(self.sales_vectorstore, question, k=3, index_name="sales")
+        context = self.context_builder.build(docs, "sales")
         prompt = prompt_template.format(
             context=context, 
             question=question, 
-            history=conversation_history,
-            detailed_context=detailed_context
+            history=self.context_builder.fit(conversation_history, "history", keep_tail=True),
+            detailed_context=self.context_builder.fit(detailed_context, "detailed_sales")
         )
         
         try:
@@ -245,6 +640,7 @@ class RAGService:
         except Exception as e:
             return f"回答生成中にエラーが発生しました: {e}"
     
+    @answer_generator
     def query_office_with_history(self, question: str, conversation_history: str = "") -> str:
         """会話履歴を考慮した事務規定回答"""
         prompt_template = """
@@ -272,9 +668,13 @@ class RAGService:
         if not self.office_vectorstore:
             return "申し訳ありません、事務規定データベースが初期化されていません。"
         
-        docs = self.office_vectorstore.similarity_search(question, k=3)
-        context = "\\n\\n".join([doc.page_content for doc in docs])
-        prompt = prompt_template.format(context=context, question=question, history=conversation_history)
+        docs = self.retrieve(self.office_vectorstore, question, k=3, index_name="office")
+        context = self.context_builder.build(docs, "office")
+        prompt = prompt_template.format(
+            context=context,
+            question=question,
+            history=self.context_builder.fit(conversation_history, "history", keep_tail=True)
+        )
         
         try:
             response = self.model.invoke(prompt)
@@ -311,6 +711,7 @@ class RAGService:
         except Exception as e:
             return f"事務手続きガイドシステムでエラーが発生しました: {e}"
     
+    @answer_generator
     def summarize_previous_response(self, conversation_history: str, current_question: str) -> str:
         """前回の回答を要約する機能"""
         prompt = f"""
@@ -394,6 +795,7 @@ class RAGService:
         except Exception as e:
             return f"回答生成中にエラーが発生しました: {e}"
     
+    @answer_generator
     def query_medical_with_history(self, question: str, conversation_history: str = "") -> str:
         """会話履歴を考慮した医療回答"""
         if not self.medical_vectorstore:
@@ -569,66 +971,328 @@ class RAGService:
                 self.web_search_service = None
         return self.web_search_service
     
+    def retrieve(self, vectorstore, question: str, k: int = 3, mode: str = None, index_name: str = None):
+        """
+        検索モードに応じてチャンクを取得する
+        
+        Args:
+            vectorstore: 検索対象のベクトルストア
+            question: 質問
+            k: fixedモードの取得件数
+            mode: fixed / adaptive（未指定ならRAG_RETRIEVAL_MODE）
+            index_name: 語彙検索と統合する場合のインデックス名（sales, office, procedures）
+        
+        Returns:
+            (Document, L2距離) のリスト（関連度の高い順）
+        """
+        return self._retrieve(vectorstore, question, k, mode, index_name)[0]
+    
+    def _retrieve(self, vectorstore, question: str, k: int = 3, mode: str = None, index_name: str = None):
+        """ベクトル検索（+語彙検索の統合）を行い、(結果, 語彙の完全一致があったか) を返す"""
+        results = self._vector_retrieve(vectorstore, question, k, mode)
+        if not (Config.RAG_HYBRID_ENABLED and index_name):
+            return results, False
+        return self._fuse_lexical(index_name, vectorstore, question, results, k)
+    
+    def _vector_retrieve(self, vectorstore, question: str, k: int, mode: str = None):
+        """ベクトル検索（fixed / adaptive）"""
+        mode = mode or self.retrieval_mode
+        if mode != "adaptive":
+            return vectorstore.similarity_search_with_score(question, k=k)
+        
+        candidates = vectorstore.similarity_search_with_score(question, k=max(k, Config.RAG_ADAPTIVE_CANDIDATES))
+        selected = select_adaptive(
+            candidates,
+            max_k=Config.RAG_ADAPTIVE_MAX_K,
+            dominance_gap=Config.RAG_ADAPTIVE_DOMINANCE_GAP,
+            flat_window=Config.RAG_ADAPTIVE_FLAT_WINDOW,
+            max_distance=Config.RAG_ADAPTIVE_MAX_DISTANCE
+        )
+        print(f"🎯 適応型検索: 候補{len(candidates)}件から{len(selected)}件を採用")
+        return selected
+    
+    def _fuse_lexical(self, index_name: str, vectorstore, question: str, results, k: int):
+        """
+        語彙検索の結果をReciprocal Rank Fusionでベクトル検索の結果に統合する
+        
+        Returns:
+            (統合後の (Document, L2距離) のリスト, 上位チャンクに質問のキーワードがすべて含まれるか)
+        """
+        base, lexical, faiss_ids = self._get_lexical_index(index_name, vectorstore)
+        lexical_results = lexical.search(question, k=max(k, Config.RAG_HYBRID_LEXICAL_K))
+        if not lexical_results:
+            return results, False
+        
+        top_lexical = lexical_results[0][0]
+        exact_match = lexical.contains_all_key_terms(question, top_lexical)
+        distances = {document_key(doc): score for doc, score in results}
+        limit = len(results) + (0 if document_key(top_lexical) in distances else 1)
+        
+        fused = reciprocal_rank_fusion(
+            [[doc for doc, _ in results], [doc for doc, _ in lexical_results]],
+            k=Config.RAG_HYBRID_RRF_K
+        )[:limit]
+        
+        fused_results = []
+        for doc in fused:
+            key = document_key(doc)
+            distance = distances.get(key)
+            if distance is None:
+                distance = self._vector_distance(base, faiss_ids.get(key), question)
+            if distance is None:
+                distance = max(distances.values(), default=0.0)
+            fused_results.append((doc, distance))
+        
+        promoted = sum(1 for doc in fused if document_key(doc) not in distances)
+        print(f"🔤 ハイブリッド検索 [{index_name}]: 語彙検索から{promoted}件追加, キーワード完全一致={exact_match}")
+        return fused_results, exact_match
+    
+    def _get_lexical_index(self, index_name: str, vectorstore):
+        """ベクトルストアと同じチャンクで語彙インデックスを構築（ベクトルストアが差し替わったら作り直す）"""
+        base = vectorstore.vectorstore if isinstance(vectorstore, CollectionView) else vectorstore
+        entry = self._lexical_indexes.get(index_name)
+        if entry is not None and entry[0] is base:
+            return entry
+        
+        with self._lexical_lock:
+            entry = self._lexical_indexes.get(index_name)
+            if entry is not None and entry[0] is base:
+                return entry
+            
+            started_at = time.time()
+            docs = []
+            faiss_ids = {}
+            for faiss_id, docstore_id in base.index_to_docstore_id.items():
+                doc = base.docstore.search(docstore_id)
+                if isinstance(doc, str):
+                    continue
+                if isinstance(vectorstore, CollectionView) and doc.metadata.get("collection") not in vectorstore.collections:
+                    continue
+                docs.append(doc)
+                faiss_ids[document_key(doc)] = faiss_id
+            
+            entry = (base, LexicalIndex(docs), faiss_ids)
+            self._lexical_indexes[index_name] = entry
+            print(f"🔤 語彙インデックスを構築しました [{index_name}]: {len(docs)}チャンク ({time.time() - started_at:.2f}秒)")
+            return entry
+    
+    def _vector_distance(self, vectorstore, faiss_id, question: str):
+        """語彙検索のみでヒットしたチャンクと質問のL2距離を計算（埋め込みはキャッシュから再利用）"""
+        if faiss_id is None:
+            return None
+        try:
+            import numpy as np
+            
+            stored = np.asarray(vectorstore.index.reconstruct(int(faiss_id)), dtype=np.float32)
+            query = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+            return float(((stored - query) ** 2).sum())
+        except Exception as e:
+            print(f"⚠️ 語彙検索チャンクの距離を計算できませんでした: {e}")
+            return None
+    
+    def get_retrieval_stats(self):
+        """DB回答・Web検索フォールバックの件数とWeb検索率を取得"""
+        with self._retrieval_stats_lock:
+            stats = dict(self.retrieval_stats)
+        total = stats["db_answers"] + stats["web_fallbacks"]
+        stats["web_fallback_rate"] = round(stats["web_fallbacks"] / total, 3) if total else 0.0
+        stats["retrieval_mode"] = self.retrieval_mode
+        stats["hybrid_enabled"] = Config.RAG_HYBRID_ENABLED
+        stats["lexical_indexes"] = {name: len(entry[1]) for name, entry in self._lexical_indexes.items()}
+        stats["speculative_saved_seconds"] = round(stats["speculative_saved_seconds"], 3)
+        stats["speculative_enabled"] = Config.RAG_SPECULATIVE_WEB_ENABLED
+        stats["speculative_policy"] = dict(self.speculative_policy)
+        return stats
+    
+    def _increment_retrieval_stat(self, key: str, amount=1):
+        with self._retrieval_stats_lock:
+            self.retrieval_stats[key] += amount
+    
+    @staticmethod
+    def _parse_speculative_policy(value: str):
+        """「office:borderline,procedures:always」形式の設定をカテゴリ -> 方針の辞書にする"""
+        policy = {}
+        for item in value.split(","):
+            category, _, mode = item.partition(":")
+            mode = mode.strip().lower()
+            if category.strip() and mode in ("off", "borderline", "always"):
+                policy[category.strip()] = mode
+        return policy
+    
+    def _get_speculative_policy(self, index_name: str) -> str:
+        """インデックスのWeb検索先行方針（無効時は常にoff）"""
+        if not Config.RAG_SPECULATIVE_WEB_ENABLED:
+            return "off"
+        return self.speculative_policy.get(index_name, "off")
+    
+    def _is_borderline(self, index_name: str, best_distance) -> bool:
+        """最良距離が閾値の前後（RAG_SPECULATIVE_MARGIN以内）にあるか"""
+        threshold = self.retrieval_distance_thresholds.get(index_name)
+        if threshold is None or best_distance is None:
+            return False
+        return best_distance >= threshold - Config.RAG_SPECULATIVE_MARGIN
+    
+    @staticmethod
+    def _is_local_refusal(answer: str) -> bool:
+        """ローカル回答が「参考文書に情報がない」旨の回答か"""
+        return any(phrase in answer for phrase in LOCAL_REFUSAL_PHRASES)
+    
+    @classmethod
+    def _is_unusable_db_answer(cls, answer: str) -> bool:
+        """DB回答がエラー・該当なし・短すぎる回答のいずれかか（Web検索にフォールバックする）"""
+        return (
+            cls._is_local_refusal(answer)
+            or any(phrase in answer for phrase in DB_ANSWER_FAILURE_PHRASES)
+            or len(answer.strip()) < 50
+        )
+    
+    def _start_web_speculation(self, question: str):
+        """
+        Web検索をバックグラウンドで先行実行する
+        
+        Returns:
+            (Future, 開始時刻)。Web検索が利用できない場合はNone
+        """
+        web_search_service = self._get_web_search_service()
+        if not web_search_service or not web_search_service.is_available():
+            return None
+        if self._speculation_executor is None:
+            self._speculation_executor = ThreadPoolExecutor(
+                max_workers=max(1, Config.RAG_SPECULATIVE_WORKERS), thread_name_prefix="web-speculation"
+            )
+        
+        def run():
+            return web_search_service.search_and_answer(question), time.perf_counter()
+        
+        started_at = time.perf_counter()
+        # 呼び出し元のコンテキスト（LLMの実行メタデータ）を引き継ぎ、処理中のメッセージに集計されるようにする
+        future = self._speculation_executor.submit(contextvars.copy_context().run, run)
+        self._increment_retrieval_stat("speculative_started")
+        print(f"🏁 Web検索を先行実行します: {question[:30]}")
+        return future, started_at
+    
+    def _discard_web_speculation(self, speculation):
+        """不要になった先行Web検索を取り消す（実行中なら結果を捨てる）"""
+        if speculation is None:
+            return
+        future, _ = speculation
+        future.cancel()
+        self._increment_retrieval_stat("speculative_discarded")
+    
+    def _collect_web_speculation(self, speculation, decided_at: float):
+        """
+        先行Web検索の結果を受け取り、逐次実行と比べて短縮できた時間を記録する
+        
+        Args:
+            speculation: _start_web_speculation の戻り値
+            decided_at: Web検索が必要と判明した時刻（逐次実行ならここから検索を開始していた）
+        
+        Returns:
+            Web検索の結果（失敗時はNone）
+        """
+        future, started_at = speculation
+        try:
+            web_result, finished_at = future.result()
+        except Exception as e:
+            print(f"先行Web検索中にエラー: {e}")
+            return None
+        saved = max(0.0, min(finished_at, decided_at) - started_at)
+        self._increment_retrieval_stat("speculative_used")
+        self._increment_retrieval_stat("speculative_saved_seconds", saved)
+        print(f"⏱️ 先行Web検索を使用しました（短縮 {saved:.2f}秒）")
+        return web_result
+    
+    def _retrieve_with_scores(self, question: str, index_name: str, vectorstore, k: int = 3):
+        """
+        スコア付き検索を行い、LLM呼び出し前に検索結果の強さを判定する
+        
+        Returns:
+            (上位の (Document, L2距離) のリスト, 最良距離, 閾値以内かどうか)
+        """
+        threshold = self.retrieval_distance_thresholds.get(index_name)
+        if not vectorstore:
+            print(f"📏 検索スコア判定 [{index_name}]: データベース未初期化")
+            return [], None, False
+        
+        results, exact_match = self._retrieve(vectorstore, question, k=k, index_name=index_name)
+        if not results:
+            print(f"📏 検索スコア判定 [{index_name}]: 検索結果なし")
+            return [], None, False
+        
+        best_distance = float(min(score for _, score in results))
+        vector_strong = threshold is None or best_distance <= threshold
+        # 固有名詞・型番がそのまま含まれるチャンクがあれば、距離が遠くても社内DBで回答する
+        is_strong = vector_strong or exact_match
+        if exact_match and not vector_strong:
+            self._increment_retrieval_stat("lexical_rescues")
+        print(f"📏 検索スコア判定 [{index_name}]: best_distance={best_distance:.3f}, threshold={threshold}, exact_match={exact_match}, strong={is_strong}")
+        return results, best_distance, is_strong
+    
+    @answer_generator
     def query_with_fallback_search(self, question: str, category: str = "admin") -> str:
-        """DB検索 → 見つからない場合はWeb検索の統合メソッド"""
+        """DB検索 → 見つからない場合はWeb検索の統合メソッド（LLM呼び出し前に検索スコアで判定）"""
         
         # 🚨 営業関連はWeb検索を無効化（誤検索防止）
         if category == "sales_query":
-            db_result = self.query_sales(question)
-            if any(indicator in db_result for indicator in ["見つかりませんでした", "含まれていません", "参考文書には"]):
-                return """申し訳ございません。お探しの売上データが見つかりませんでした。
-
-営業データベースの確認が必要です。以下をご確認ください：
-- 担当者名が正しいか（高見、辻川、小林、佐藤、田中）
-- 期間の指定が正しいか
-
-ご不明な点がございましたら、営業管理部までお問い合わせください。"""
-            return db_result
-        
-        # 1. まずDB検索を実行
-        db_result = None
-        confidence_threshold = 0.3  # 信頼度の閾値
-        
+            docs, _, is_strong = self._retrieve_with_scores(question, "sales", self.sales_vectorstore)
+            if not is_strong:
+                return SALES_NOT_FOUND_MESSAGE
+            answer = self.query_sales(question, docs=docs)
+            if self._is_local_refusal(answer) or any(phrase in answer for phrase in SALES_NOT_FOUND_PHRASES):
+                return SALES_NOT_FOUND_MESSAGE
+            return answer
+        
+        # 1. まずDB検索（検索のみ）を実行し、距離が閾値以内ならその文脈で一度だけ回答を生成
+        #    先行実行が有効なカテゴリでは、Web向きの質問ならDB検索と並行してWeb検索を開始しておく
+        speculation = None
         try:
-            if category == "admin" or category == "office":
-                db_result = self.query_office(question)
-            elif category == "procedures":
-                db_result = self.query_procedures(question)
+            if category == "procedures":
+                index_name, vectorstore, query_func = "procedures", self.procedures_vectorstore, self.query_procedures
             else:
-                db_result = self.query_office(question)  # デフォルト
-            
-            # DB結果の品質をチェック
-            quality_indicators = [
-                "申し訳ありません",
-                "データベースが初期化されていません",
-                "関連するデータベースが",
-                "見つかりませんでした",
-                "回答を生成できませんでした",
-                "含まれていません",
-                "情報は含まれていません",
-                "参考文書には",
-                "取扱説明書やメーカーの公式サポートページ",
-                "公式情報を参考にしてください"
-            ]
+                # admin / office / その他はすべて事務規定DB
+                index_name, vectorstore, query_func = "office", self.office_vectorstore, self.query_office
             
-            is_low_quality = any(indicator in db_result for indicator in quality_indicators)
-            is_too_short = len(db_result.strip()) < 50
+            policy = self._get_speculative_policy(index_name)
+            web_bound = any(hint.lower() in question.lower() for hint in UNKNOWN_KEYWORD_HINTS)
+            if policy == "always" or (policy == "borderline" and web_bound):
+                speculation = self._start_web_speculation(question)
             
-            # DB結果が良質であれば返す
-            if not is_low_quality and not is_too_short:
-                print(f"✅ DB検索成功 - カテゴリ: {category}")
-                return db_result
+            docs, best_distance, is_strong = self._retrieve_with_scores(question, index_name, vectorstore)
+            if is_strong:
+                borderline = policy != "off" and self._is_borderline(index_name, best_distance)
+                if not borderline:
+                    self._discard_web_speculation(speculation)
+                    speculation = None
+                elif speculation is None:
+                    # 境界付近のスコアはローカル回答の生成と並行してWeb検索を走らせる
+                    speculation = self._start_web_speculation(question)
+                
+                answer = query_func(question, docs=docs)
+                if not self._is_unusable_db_answer(answer):
+                    print(f"✅ DB検索成功 - カテゴリ: {category}")
+                    self._discard_web_speculation(speculation)
+                    self._increment_retrieval_stat("db_answers")
+                    return answer
+                if speculation is not None:
+                    print(f"📋 ローカル回答に該当情報がないため、先行実行したWeb検索の結果を使用します")
+                else:
+                    print(f"📋 ローカル回答に該当情報がないため、Web検索を実行します")
                 
         except Exception as e:
             print(f"DB検索中にエラー: {e}")
         
-        # 2. DB検索が失敗した場合はWeb検索を実行
+        # 2. 検索結果が弱い場合はLLMを呼ばずにWeb検索を実行（先行実行済みならその結果を使う）
         print(f"📋 DB検索結果が不十分です。Web検索を実行します...")
+        self._increment_retrieval_stat("web_fallbacks")
         
         web_search_service = self._get_web_search_service()
         if web_search_service:
             try:
-                web_result = web_search_service.search_and_answer(question)
+                web_result = None
+                if speculation is not None:
+                    web_result = self._collect_web_speculation(speculation, time.perf_counter())
+                if web_result is None:
+                    web_result = web_search_service.search_and_answer(question)
                 if web_result and "検索結果が見つかりませんでした" not in web_result:
                     print(f"🔍 Web検索成功")
                     # Web検索結果を整形
@@ -658,6 +1322,7 @@ class RAGService:
 
 お気軽にお試しください！"""
     
+    @answer_generator
     def query_detailed_sales(self, question: str, conversation_history: str = "") -> str:
         """詳細営業データ専用クエリ（みなみちゃんキャラクター）"""
         detailed_context = self._get_detailed_sales_context(question)
@@ -665,8 +1330,8 @@ class RAGService:
         # 基本売上データも取得
         basic_sales_context = ""
         if self.sales_vectorstore:
-            docs = self.sales_vectorstore.similarity_search(question, k=2)
-            basic_sales_context = "\n\n".join([doc.page_content for doc in docs])
+            docs = self.retrieve(self.sales_vectorstore, question, k=2, index_name="sales")
+            basic_sales_context = self.context_builder.build(docs, "sales")
         
         prompt_template = """
         あなたは阪南ビジネスマシンの営業現場を知り尽くした先輩「みなみちゃん」です。
@@ -710,9 +1375,9 @@ class RAGService:
         """
         
         prompt = prompt_template.format(
-            history=conversation_history,
+            history=self.context_builder.fit(conversation_history, "history", keep_tail=True),
             basic_context=basic_sales_context,
-            detailed_context=detailed_context,
+            detailed_context=self.context_builder.fit(detailed_context, "detailed_sales"),
             question=question
         )
         
@@ -776,7 +1441,7 @@ class RAGService:
         """
         
         try:
-            response = self.model.invoke(format_prompt)
+            response = self.formatter_model.invoke(format_prompt)
             return response.content
         except Exception as e:
             print(f"製品情報整形中にエラー: {e}")
@@ -809,7 +1474,7 @@ class RAGService:
         """
         
         try:
-            response = self.model.invoke(format_prompt)
+            response = self.formatter_model.invoke(format_prompt)
             return response.content
         except Exception as e:
             print(f"一般情報整形中にエラー: {e}")
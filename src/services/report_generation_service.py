@@ -4,18 +4,14 @@ import os
 import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
-from langchain_openai import ChatOpenAI
-from config import Config
+from services.llm_registry import get_llm
+from services.message_dispatcher import answer_generator
 
 class ReportGenerationService:
     """営業レポート生成サービス"""
     
     def __init__(self):
-        self.model = ChatOpenAI(
-            model_name="gpt-4o",
-            openai_api_key=Config.OPENAI_API_KEY,
-            temperature=0.3  # レポート生成では一貫性を重視
-        )
+        self.model = get_llm("report")  # レポート生成では一貫性を重視
         
         # データの読み込み
         self.detailed_sales_data = self._load_detailed_sales_data()
@@ -71,6 +67,7 @@ class ReportGenerationService:
             print(f"基本営業データの読み込みエラー: {e}")
             return ""
     
+    @answer_generator
     def generate_daily_report(self, target_date: str = None) -> str:
         """日次レポート生成"""
         if not target_date:
@@ -123,6 +120,7 @@ class ReportGenerationService:
         except Exception as e:
             return f"日次レポート生成中にエラーが発生しました: {e}"
     
+    @answer_generator
     def generate_monthly_analysis(self, target_month: str = None) -> str:
         """月次分析レポート生成"""
         if not target_month:
@@ -338,6 +336,7 @@ Webサイト: https://hbm-web.co.jp/
         
         return "\n".join(context_parts)
     
+    @answer_generator
     def generate_custom_report(self, request: str, context_data: Dict[str, Any] = None) -> str:
         """カスタムレポート生成"""
         prompt = f"""
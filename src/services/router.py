@@ -1,21 +1,171 @@
 # src/services/router.py (OpenAI版)
-from langchain_openai import ChatOpenAI
+import contextvars
+import hashlib
+import random
+import threading
+from services.llm_registry import get_llm
 from config import Config
+from services.intent_classifier import CATEGORY_KEYWORD_HINTS, UNKNOWN_KEYWORD_HINTS, LocalIntentClassifier
+from utils.ttl_cache import TTLCache, normalize_text
+from utils.keyword_matcher import KeywordMatcher
+
+# 分類プロンプトの「分類のヒント」（ローカル分類器と同じキーワード表から生成）
+KEYWORD_HINTS_TEXT = "\n        ".join(
+    [f"- {''.join(f'「{keyword}」' for keyword in keywords)}→ {category}" for category, keywords in CATEGORY_KEYWORD_HINTS]
+    + [f"- **{''.join(f'「{keyword}」' for keyword in UNKNOWN_KEYWORD_HINTS)}など、社内データベースにない技術的な質問 → unknown**"]
+)
+
+# 分類プロンプトで定義しているカテゴリ（これ以外のLLM応答は unknown として扱う）
+ROUTER_CATEGORIES = frozenset([
+    "admin", "sales_query", "detailed_sales_query", "report_generation", "workflow_integration",
+    "double_check", "patient_info_query", "task", "billing_analysis", "bed_management",
+    "admin_efficiency", "revenue_analysis", "clinical_analysis", "waiting_analysis", "staff_training",
+    "summary", "feedback", "general_chat", "shift_scheduling", "unknown"
+])
+
+# 薬剤チェック関連の質問を判定するキーワード
+MEDICATION_CHECK_MATCHER = KeywordMatcher({
+    "medication_check": [
+        "チェック", "確認", "処方", "投薬", "薬", "相互作用", "副作用",
+        "ワーファリン", "ワルファリン", "ロセフィン", "セフトリアキソン",
+        "メトグルコ", "メトホルミン", "大丈夫", "安全"
+    ]
+})
 
 class QuestionRouter:
     def __init__(self):
-        self.model = ChatOpenAI(
-            model_name="gpt-4o",
-            openai_api_key=Config.OPENAI_API_KEY,
-            temperature=0.3
+        self.model = get_llm("router")
+        
+        # ローカル高速分類器（確信度が高い場合のみLLM呼び出しを省略）
+        self.local_classifier = LocalIntentClassifier(
+            min_score=Config.ROUTER_LOCAL_MIN_SCORE,
+            min_margin=Config.ROUTER_LOCAL_MIN_MARGIN,
+            max_length=Config.ROUTER_LOCAL_MAX_LENGTH
         )
+        self.local_enabled = Config.ROUTER_LOCAL_ENABLED
+        self.shadow_rate = Config.ROUTER_LOCAL_SHADOW_RATE
+        
+        # LLM分類結果のキャッシュ（プロンプトやカテゴリ定義が変わるとバージョンが変わり無効化される）
+        self.classification_cache = TTLCache(
+            max_entries=Config.ROUTER_CACHE_MAX_ENTRIES,
+            ttl_seconds=Config.ROUTER_CACHE_TTL_SECONDS
+        )
+        self.prompt_version = self._compute_prompt_version()
+        
+        # 閾値調整用の統計情報
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "total": 0,
+            "local_hits": 0,
+            "llm_calls": 0,
+            "shadow_compared": 0,
+            "shadow_agreed": 0,
+            "fallback_compared": 0,
+            "fallback_agreed": 0
+        }
 
     def classify_question(self, question: str) -> str:
         # 最優先：患者IDが含まれ、かつ薬剤チェック関連の場合のみdouble_checkに分類
         if self._contains_patient_id(question) and self._is_medication_check(question):
             return "double_check"
         
-        prompt = f"""
+        self._increment("total")
+        local_result = self.local_classifier.classify(question) if self.local_enabled else None
+        
+        if local_result and local_result.confident:
+            self._increment("local_hits")
+            print(f"⚡ ローカル分類: {local_result.category} (score={local_result.score:.1f}, margin={local_result.margin:.1f})")
+            
+            # 一部をLLMでも分類し、一致率を計測（応答はブロックしない）
+            if self.shadow_rate > 0 and random.random() < self.shadow_rate:
+                threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(self._shadow_compare, question, local_result.category),
+                    daemon=True
+                ).start()
+            return local_result.category
+        
+        cache_key = (self.prompt_version, normalize_text(question))
+        category = self.classification_cache.get(cache_key)
+        if category:
+            print(f"⚡ 分類キャッシュヒット: {category}")
+        else:
+            category = self._classify_with_llm(question)
+        
+        # 確信度不足だったローカル候補とLLM結果の一致も記録（閾値を下げられるかの判断材料）
+        if local_result and local_result.category:
+            self._record_agreement("fallback", local_result.category, category)
+        return category
+    
+    def get_stats(self) -> dict:
+        """ローカル分類のヒット率とLLMとの一致率を取得"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["local_hit_rate"] = round(stats["local_hits"] / stats["total"], 3) if stats["total"] else 0.0
+        stats["shadow_agreement_rate"] = round(stats["shadow_agreed"] / stats["shadow_compared"], 3) if stats["shadow_compared"] else None
+        stats["fallback_agreement_rate"] = round(stats["fallback_agreed"] / stats["fallback_compared"], 3) if stats["fallback_compared"] else None
+        stats["cache"] = self.classification_cache.get_stats()
+        stats["prompt_version"] = self.prompt_version
+        stats["thresholds"] = {
+            "min_score": self.local_classifier.min_score,
+            "min_margin": self.local_classifier.min_margin,
+            "max_length": self.local_classifier.max_length,
+            "shadow_rate": self.shadow_rate
+        }
+        return stats
+    
+    def invalidate_cache(self):
+        """分類キャッシュを破棄し、プロンプトバージョンを再計算"""
+        self.prompt_version = self._compute_prompt_version()
+        self.classification_cache.clear()
+    
+    def _compute_prompt_version(self) -> str:
+        """分類プロンプト（カテゴリ定義・ヒント）とモデル設定からバージョンを算出"""
+        source = "\n".join([
+            Config.ROUTER_PROMPT_VERSION,
+            self.model.model_name,
+            self._build_prompt("{question}")
+        ])
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+    
+    def _increment(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+    
+    def _record_agreement(self, kind: str, local_category: str, llm_category: str):
+        """ローカル分類とLLM分類の一致を記録"""
+        with self._stats_lock:
+            self._stats[f"{kind}_compared"] += 1
+            if local_category == llm_category:
+                self._stats[f"{kind}_agreed"] += 1
+        if local_category != llm_category:
+            print(f"📊 分類不一致 ({kind}): local={local_category}, llm={llm_category}")
+    
+    def _shadow_compare(self, question: str, local_category: str):
+        """バックグラウンドでLLM分類を行い、ローカル分類との一致を記録"""
+        llm_category = self._classify_with_llm(question)
+        self._record_agreement("shadow", local_category, llm_category)
+    
+    def _classify_with_llm(self, question: str) -> str:
+        """LLMによる分類（定義済みカテゴリの結果のみキャッシュに保存）"""
+        self._increment("llm_calls")
+        prompt = self._build_prompt(question)
+        try:
+            response = self.model.invoke(prompt)
+            category = response.content.strip().replace("`", "").strip("'\" .").lower()
+            if category not in ROUTER_CATEGORIES:
+                # 説明文付きの応答や未定義のカテゴリはキャッシュせず、次回もLLMに分類させる
+                print(f"⚠️ 未定義のカテゴリが返されました: {category[:50]!r} → unknown")
+                return "unknown"
+            self.classification_cache.set((self.prompt_version, normalize_text(question)), category)
+            return category
+        except Exception as e:
+            print(f"Error in question classification: {e}")
+            return "unknown"
+    
+    def _build_prompt(self, question: str) -> str:
+        """分類プロンプトを生成"""
+        return f"""
         あなたは阪南ビジネスマシンの優秀なアシスタントです。職員からの以下の質問を、最も適切なカテゴリに一つだけ分類してください。
 
         # カテゴリ定義
@@ -48,23 +198,7 @@ class QuestionRouter:
         "{question}"
 
         # 分類のヒント
-        - 「売上」「実績」「達成率」「営業」「担当者」「高見」「辻川」「小濱」「官需課」「メーカー」「RISO」「XEROX」「販売」→ sales_query
-        - 「訪問件数」「電話件数」「商談進捗」「顧客訪問」「今日の活動」「パイプライン」「商談状況」→ detailed_sales_query
-        - 「レポート作成」「レポート生成」「月次レポート」「日次レポート」「分析レポート」「レポート送信」→ report_generation
-        - 「メール送信」「自動化」「ワークフロー」「通知設定」「配信」「n8n」→ workflow_integration
-        - 「査定」「減点」「返戻」「診療報酬」「請求」→ billing_analysis
-        - 「病床」「稼働率」「在院日数」「ベッド」「入院」「退院」→ bed_management  
-        - 「スタッフ」「効率」「エラー率」「生産性」「研修」→ admin_efficiency
-        - 「収益」「経営」「利益」「コスト」→ revenue_analysis
-        - 「治療成績」「症例数」「死亡率」「成功率」「合併症」「論文」「研究」「データ分析」→ clinical_analysis
-        - 「待ち時間」「患者満足度」「患者動線」→ waiting_analysis
-        - 「研修」「職員」「教育」「人材育成」「研修効果」「報告書」→ staff_training
-        - 「名前は」「氏名は」「患者情報」「基本情報」「生年月日」「住所」→ patient_info_query
-        - 「要約」「まとめ」「総括」「簡潔に」「ポイントは」「結論は」「一言で」「短く」「概要」→ summary
-        - 「ありがとう」「助かります」「いい感じ」「すごい」「よかった」「なるほど」「素晴らしい」「完璧」「感謝」→ feedback
-        - 「普通に会話」「雑談」「元気」「こんにちは」「おはよう」「こんばんは」「気分」「天気」「今日」→ general_chat
-        - 「シフト」「勤務表」「希望日」「組んで」「シフト作成」「スケジュール」→ shift_scheduling
-        - **「トナー」「カートリッジ」「インク」「交換方法」「変え方」「設定方法」「使い方」「操作方法」「TASKalfa」「MX-」「コピー機の」「プリンターの」など、社内データベースにない技術的な質問 → unknown**
+        {KEYWORD_HINTS_TEXT}
         
         # 重要な分類指針:
         - 論文・研究・データ分析に関する質問は clinical_analysis に分類する
@@ -77,12 +211,6 @@ class QuestionRouter:
         # 出力形式
         分類結果のカテゴリ名のみを、小文字の英単語で回答してください。
         """
-        try:
-            response = self.model.invoke(prompt)
-            return response.content.strip().replace("`", "").lower()
-        except Exception as e:
-            print(f"Error in question classification: {e}")
-            return "unknown"
     
     def _contains_patient_id(self, question: str) -> bool:
         """患者IDの存在を確認"""
@@ -93,9 +221,4 @@ class QuestionRouter:
     
     def _is_medication_check(self, question: str) -> bool:
         """薬剤チェック関連の質問かどうかを確認"""
-        medication_keywords = [
-            "チェック", "確認", "処方", "投薬", "薬", "相互作用", "副作用", 
-            "ワーファリン", "ワルファリン", "ロセフィン", "セフトリアキソン", 
-            "メトグルコ", "メトホルミン", "大丈夫", "安全"
-        ]
-        return any(keyword in question for keyword in medication_keywords)
\ No newline at end of file
+        return MEDICATION_CHECK_MATCHER.contains(question)
\ No newline at end of file
@@ -0,0 +1,165 @@
+# src/services/semantic_answer_cache.py
+"""
+カテゴリ別の意味的回答キャッシュ
+言い換えの質問（「有給の取り方」「有給申請の方法は？」など）に対して、
+質問埋め込みのコサイン類似度が閾値以上なら保存済みの回答を返し、GPT-4oの呼び出しを省く
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+class _CategoryEntries:
+    """1カテゴリ分のエントリ（正規化済みベクトル行列と回答）"""
+
+    __slots__ = ("index_version", "vectors", "answers", "questions", "expires_at", "latencies")
+
+    def __init__(self, index_version: Optional[str]):
+        self.index_version = index_version
+        self.vectors: Optional[np.ndarray] = None
+        self.answers: List[str] = []
+        self.questions: List[str] = []
+        self.expires_at: List[float] = []
+        self.latencies: List[float] = []
+
+    def remove(self, positions: List[int]):
+        """指定位置のエントリを削除"""
+        if not positions:
+            return
+        drop = set(positions)
+        keep = [i for i in range(len(self.answers)) if i not in drop]
+        self.vectors = self.vectors[keep] if keep else None
+        self.answers = [self.answers[i] for i in keep]
+        self.questions = [self.questions[i] for i in keep]
+        self.expires_at = [self.expires_at[i] for i in keep]
+        self.latencies = [self.latencies[i] for i in keep]
+
+class SemanticAnswerCache:
+    """カテゴリ・インデックスバージョン単位で回答を保持する意味的キャッシュ（スレッドセーフ）"""
+
+    def __init__(self, similarity_threshold: float = 0.95, ttl_seconds: float = 3600,
+                 max_entries_per_category: int = 500):
+        """
+        意味的回答キャッシュの初期化
+
+        Args:
+            similarity_threshold: キャッシュを使うコサイン類似度の下限
+            ttl_seconds: 回答の有効秒数
+            max_entries_per_category: カテゴリごとの最大件数（超過時は古いものから破棄）
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_category = max(1, max_entries_per_category)
+
+        self._categories: Dict[str, _CategoryEntries] = {}
+        self._lock = threading.Lock()
+
+        # 統計情報
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "stores": 0,
+            "expirations": 0,
+            "flushes": 0,
+            "latency_saved_seconds": 0.0
+        }
+
+    def lookup(self, category: str, index_version: Optional[str], vector: List[float]) -> Optional[str]:
+        """
+        類似した質問の回答を探す
+
+        Args:
+            category: 回答カテゴリ（office, procedures, salesなど）
+            index_version: 回答の根拠となったインデックスのバージョン
+            vector: 質問の埋め込みベクトル
+
+        Returns:
+            キャッシュされた回答（なければNone）
+        """
+        query = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            self._stats["lookups"] += 1
+            entries = self._categories.get(category)
+            if entries is None or entries.vectors is None or entries.index_version != index_version:
+                return None
+
+            expired = [i for i, expires_at in enumerate(entries.expires_at) if expires_at <= now]
+            if expired:
+                entries.remove(expired)
+                self._stats["expirations"] += len(expired)
+                if entries.vectors is None:
+                    return None
+
+            similarities = entries.vectors @ query
+            best = int(np.argmax(similarities))
+            if float(similarities[best]) < self.similarity_threshold:
+                return None
+
+            self._stats["hits"] += 1
+            self._stats["latency_saved_seconds"] += entries.latencies[best]
+            print(f"💾 回答キャッシュヒット [{category}]: 類似度={float(similarities[best]):.3f} 元の質問='{entries.questions[best]}'")
+            return entries.answers[best]
+
+    def store(self, category: str, index_version: Optional[str], vector: List[float],
+              question: str, answer: str, latency_seconds: float):
+        """
+        生成した回答を保存
+
+        Args:
+            category: 回答カテゴリ
+            index_version: 回答の根拠となったインデックスのバージョン
+            vector: 質問の埋め込みベクトル
+            question: 元の質問（ログ用）
+            answer: 生成した回答
+            latency_seconds: 回答生成にかかった秒数（ヒット時の短縮時間として集計）
+        """
+        row = self._normalize(vector)[np.newaxis, :]
+        with self._lock:
+            entries = self._categories.get(category)
+            if entries is None or entries.index_version != index_version:
+                entries = _CategoryEntries(index_version)
+                self._categories[category] = entries
+
+            entries.vectors = row if entries.vectors is None else np.vstack([entries.vectors, row])
+            entries.answers.append(answer)
+            entries.questions.append(question)
+            entries.expires_at.append(time.time() + self.ttl_seconds)
+            entries.latencies.append(latency_seconds)
+            overflow = len(entries.answers) - self.max_entries_per_category
+            if overflow > 0:
+                entries.remove(list(range(overflow)))
+            self._stats["stores"] += 1
+
+    def flush(self, category: Optional[str] = None):
+        """キャッシュを破棄（category未指定なら全カテゴリ）"""
+        with self._lock:
+            if category is None:
+                self._categories.clear()
+            else:
+                self._categories.pop(category, None)
+            self._stats["flushes"] += 1
+        print(f"🧹 回答キャッシュを破棄しました: {category or '全カテゴリ'}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット率・短縮できた生成時間・カテゴリ別件数を取得"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = {
+                category: {"size": len(entries.answers), "index_version": entries.index_version}
+                for category, entries in self._categories.items()
+            }
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        stats["latency_saved_seconds"] = round(stats["latency_saved_seconds"], 3)
+        stats["similarity_threshold"] = self.similarity_threshold
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        """コサイン類似度を内積で計算できるよう長さ1に正規化"""
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        return array / norm if norm else array
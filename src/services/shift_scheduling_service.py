@@ -3,20 +3,17 @@
 import json
 import re
 from datetime import datetime
-from langchain_openai import ChatOpenAI
-from config import Config
+from services.llm_registry import get_llm
+from services.message_dispatcher import answer_generator
 from services.n8n_connector import N8NConnector # n8n_connectorをインポート
 from typing import List, Dict, Any
 
 class ShiftSchedulingService:
     def __init__(self, n8n_connector: N8NConnector):
-        self.model = ChatOpenAI(
-            model_name="gpt-4o-mini",
-            openai_api_key=Config.OPENAI_API_KEY,
-            temperature=0.3 # 創造性を持たせるため少し高め
-        )
+        self.model = get_llm("analysis", temperature=0.3)  # 創造性を持たせるため少し高め
         self.n8n_connector = n8n_connector
 
+    @answer_generator
     def generate_provisional_schedule(self, user_input: str) -> str:
         """
         ユーザーの入力からシフト希望を抽出し、仮シフトを生成してn8nに連携する。
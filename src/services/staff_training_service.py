@@ -7,17 +7,13 @@ A病院の職員研修履歴・効果分析を提供
 import json
 import os
 from datetime import datetime
-from langchain_openai import ChatOpenAI
-from config import Config
+from services.llm_registry import get_llm
+from services.message_dispatcher import answer_generator
 from collections import defaultdict
 
 class StaffTrainingService:
     def __init__(self):
-        self.model = ChatOpenAI(
-            model_name="gpt-4o-mini",
-            openai_api_key=Config.OPENAI_API_KEY,
-            temperature=0
-        )
+        self.model = get_llm("analysis")
         self.training_data = self._load_training_data()
         
     def _load_training_data(self):
@@ -46,6 +42,7 @@ class StaffTrainingService:
         
         return response + disclaimer
     
+    @answer_generator
     def analyze_staff_training(self, query: str) -> str:
         """職員研修分析（メインエントリーポイント）"""
         
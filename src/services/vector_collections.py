@@ -0,0 +1,66 @@
+# src/services/vector_collections.py
+"""
+統合ベクトルインデックス（faiss_index_unified）のコレクション管理
+各チャンクに collection / source / version のメタデータを付け、
+コレクションで絞り込んだ検索と全コレクション横断の検索を1つのインデックスで行う
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+# 統合インデックスに含めるコレクション名
+COLLECTION_NAMES = ("sales", "office", "procedures")
+
+def build_version() -> str:
+    """インデックス構築バージョン（構築日時）を生成"""
+    return datetime.now().strftime("%Y%m%d%H%M%S")
+
+def tag_chunks(chunks: Iterable[Any], collection: str, version: str) -> List[Any]:
+    """
+    チャンクにコレクション・元ファイル・バージョンのメタデータを付ける
+
+    Args:
+        chunks: テキスト分割済みのDocument
+        collection: コレクション名（sales, office, procedures）
+        version: インデックス構築バージョン
+    """
+    tagged = []
+    for chunk in chunks:
+        chunk.metadata["collection"] = collection
+        chunk.metadata["source"] = chunk.metadata.get("source", "unknown")
+        chunk.metadata["version"] = version
+        tagged.append(chunk)
+    return tagged
+
+class CollectionView:
+    """統合インデックスを1コレクション分のベクトルストアとして扱うビュー"""
+
+    def __init__(self, vectorstore: Any, collections: Iterable[str], fetch_k: int = 40):
+        """
+        Args:
+            vectorstore: 統合インデックス（FAISS）
+            collections: 絞り込むコレクション名
+            fetch_k: 絞り込み前に取得する候補数
+        """
+        self.vectorstore = vectorstore
+        self.collections = list(collections)
+        self.fetch_k = fetch_k
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Any]:
+        """コレクション内で類似検索"""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Any]:
+        """コレクション内でスコア付き類似検索（L2距離、小さいほど類似）"""
+        kwargs.setdefault("filter", {"collection": self.collections})
+        kwargs.setdefault("fetch_k", max(self.fetch_k, k))
+        return self.vectorstore.similarity_search_with_score(query, k=k, **kwargs)
+
+def collection_counts(vectorstore: Any) -> Dict[str, int]:
+    """統合インデックス内のコレクション別チャンク数を集計"""
+    counts: Dict[str, int] = {}
+    docstore: Optional[Dict[str, Any]] = getattr(getattr(vectorstore, "docstore", None), "_dict", None)
+    for doc in (docstore or {}).values():
+        collection = doc.metadata.get("collection", "unknown")
+        counts[collection] = counts.get(collection, 0) + 1
+    return counts
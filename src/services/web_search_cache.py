@@ -0,0 +1,221 @@
+# src/services/web_search_cache.py
+"""
+Serper検索結果のキャッシュ
+正規化した検索クエリをキーに生のレスポンス（organicなど）をメモリLRU + SQLiteに保存する
+クエリの種類（製品マニュアル・ニュースなど）ごとにTTLを変え、期限切れ直後は古い結果を返しつつ裏で再取得する
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# クエリの種類 -> 判定パターン（上から順に判定し、最初に一致した種類のTTLを使う）
+QUERY_CLASS_PATTERNS = [
+    ("news", re.compile(r"ニュース|速報|最新|今日|昨日|今週|株価|価格|値段|発表|キャンペーン")),
+    ("manual", re.compile(r"トナー|カートリッジ|交換|マニュアル|取扱説明書|設定方法|使い方|操作方法|taskalfa|mx-|[a-z]{2,}-?\d{3,}")),
+]
+
+def normalize_query(query: str) -> str:
+    """NFKC正規化・小文字化し、連続する空白を1つにまとめる"""
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+def classify_query(normalized_query: str) -> str:
+    """正規化済みクエリの種類（news / manual / default）"""
+    for query_class, pattern in QUERY_CLASS_PATTERNS:
+        if pattern.search(normalized_query):
+            return query_class
+    return "default"
+
+class WebSearchCache:
+    """検索結果をメモリLRU + SQLiteにキャッシュし、期限切れ直後はstale-while-revalidateで返す"""
+
+    def __init__(self, ttls: Dict[str, float], stale_seconds: float = 86400,
+                 max_entries: int = 1000, db_path: Optional[str] = None, namespace: str = ""):
+        """
+        Args:
+            ttls: クエリの種類 -> TTL（秒）。defaultは必須
+            stale_seconds: TTL切れ後も古い結果を返してよい猶予（秒）
+            max_entries: メモリに保持する最大件数
+            db_path: 永続化用SQLiteファイルのパス（未指定ならメモリのみ）
+            namespace: キーに含める検索条件（地域・言語・件数など）
+        """
+        self.ttls = dict(ttls)
+        self.stale_seconds = max(0.0, stale_seconds)
+        self.max_entries = max(1, max_entries)
+        self.db_path = db_path or None
+        self.namespace = namespace
+
+        # キー -> (取得時刻, クエリの種類, 生のレスポンス)
+        self._memory: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._revalidating = set()
+
+        # 統計情報
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "api_calls": 0,
+            "revalidations": 0
+        }
+
+        if self.db_path:
+            self._open_database()
+
+    def get_or_fetch(self, query: str, fetch: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        キャッシュから検索結果を取得し、なければ fetch(query) で取得して保存する
+
+        Args:
+            query: 検索クエリ
+            fetch: Serperを呼び出して生のレスポンスを返す関数
+
+        Returns:
+            Serperの生のレスポンス
+        """
+        normalized = normalize_query(query)
+        query_class = classify_query(normalized)
+        key = self._key(normalized)
+        entry = self._lookup(key)
+
+        if entry is not None:
+            fetched_at, _, results = entry
+            age = time.time() - fetched_at
+            ttl = self.ttls.get(query_class, self.ttls["default"])
+            if age <= ttl:
+                return results
+            if age <= ttl + self.stale_seconds:
+                # 期限切れ直後は古い結果をすぐ返し、裏で最新の結果に入れ替える
+                with self._lock:
+                    self._stats["stale_hits"] += 1
+                self._revalidate(key, query, query_class, fetch)
+                return results
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return self._fetch_and_store(key, query, query_class, fetch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット率とキャッシュサイズを取得"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        stats["ttls"] = dict(self.ttls)
+        stats["stale_seconds"] = self.stale_seconds
+        stats["persistent"] = self._conn is not None
+        return stats
+
+    def _key(self, normalized_query: str) -> str:
+        """検索条件と正規化済みクエリからキャッシュキーを生成"""
+        return hashlib.sha256(f"{self.namespace}\0{normalized_query}".encode("utf-8")).hexdigest()
+
+    def _fetch_and_store(self, key: str, query: str, query_class: str,
+                         fetch: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """Serperを呼び出し、結果があればキャッシュに保存"""
+        with self._lock:
+            self._stats["api_calls"] += 1
+        results = fetch(query)
+        # 結果なし・エラー応答はキャッシュしない（次回は再検索する）
+        if isinstance(results, dict) and results.get("organic"):
+            self._store(key, query, query_class, results)
+        return results
+
+    def _revalidate(self, key: str, query: str, query_class: str, fetch: Callable[[str], Dict[str, Any]]):
+        """バックグラウンドで結果を再取得（同じキーの再取得は1つだけ）"""
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+            self._stats["revalidations"] += 1
+
+        def run():
+            try:
+                self._fetch_and_store(key, query, query_class, fetch)
+            except Exception as e:
+                print(f"⚠️ Web検索キャッシュの再取得に失敗しました: {e}")
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _lookup(self, key: str) -> Optional[Tuple[float, str, Dict[str, Any]]]:
+        """メモリ → SQLiteの順に検索結果を探す（期限は呼び出し側で判定）"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry
+
+            if self._conn is None:
+                return None
+            try:
+                row = self._conn.execute(
+                    "SELECT fetched_at, query_class, results FROM web_search WHERE cache_key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"⚠️ Web検索キャッシュの読み込みに失敗しました: {e}")
+                row = None
+            if row is None:
+                return None
+            entry = (row[0], row[1], json.loads(row[2]))
+            self._remember(key, entry)
+            self._stats["disk_hits"] += 1
+            return entry
+
+    def _store(self, key: str, query: str, query_class: str, results: Dict[str, Any]):
+        """検索結果をメモリとSQLiteに保存"""
+        entry = (time.time(), query_class, results)
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO web_search (cache_key, query, query_class, fetched_at, results) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, query, query_class, entry[0], json.dumps(results, ensure_ascii=False))
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Web検索キャッシュの書き込みに失敗しました: {e}")
+
+    def _remember(self, key: str, entry: Tuple[float, str, Dict[str, Any]]):
+        """メモリLRUに追加（呼び出し側でロック取得済み）"""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _open_database(self):
+        """SQLiteファイルを開き、猶予期間を過ぎた結果を削除する（失敗時はメモリのみで動作）"""
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS web_search ("
+                "cache_key TEXT PRIMARY KEY, query TEXT NOT NULL, query_class TEXT NOT NULL, "
+                "fetched_at REAL NOT NULL, results TEXT NOT NULL)"
+            )
+            oldest = time.time() - max(self.ttls.values()) - self.stale_seconds
+            self._conn.execute("DELETE FROM web_search WHERE fetched_at < ?", (oldest,))
+            self._conn.commit()
+            count = self._conn.execute("SELECT COUNT(*) FROM web_search").fetchone()[0]
+            print(f"✅ Web検索キャッシュを開きました: {count}件 ({self.db_path})")
+        except sqlite3.Error as e:
+            print(f"⚠️ Web検索キャッシュのDBを開けませんでした。メモリのみで動作します: {e}")
+            self._conn = None
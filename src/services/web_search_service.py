@@ -1,9 +1,11 @@
 # src/services/web_search_service.py
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import os
 from langchain_community.utilities.google_serper import GoogleSerperAPIWrapper
 from langchain_core.tools import Tool
 from config import Config
+from services.web_search_cache import WebSearchCache
+from utils.http_transport import http_transport
 
 class WebSearchService:
     """Web検索機能を提供するサービス"""
@@ -13,6 +15,7 @@ class WebSearchService:
         self.serper_api_key = Config.SERPER_API_KEY
         self.search_wrapper = None
         self.search_tool = None
+        self.cache = None
         
         # APIキーが設定されている場合のみ初期化
         if self.serper_api_key:
@@ -33,6 +36,20 @@ class WebSearchService:
                 hl="ja"   # 言語設定（日本語）
             )
             
+            # 同じ検索条件・正規化済みクエリの結果はキャッシュから返す（API利用枠の節約）
+            if Config.WEB_SEARCH_CACHE_ENABLED:
+                self.cache = WebSearchCache(
+                    ttls={
+                        "manual": Config.WEB_SEARCH_CACHE_TTL_MANUAL,
+                        "news": Config.WEB_SEARCH_CACHE_TTL_NEWS,
+                        "default": Config.WEB_SEARCH_CACHE_TTL_DEFAULT
+                    },
+                    stale_seconds=Config.WEB_SEARCH_CACHE_STALE_SECONDS,
+                    max_entries=Config.WEB_SEARCH_CACHE_MAX_ENTRIES,
+                    db_path=Config.WEB_SEARCH_CACHE_DB_PATH,
+                    namespace=f"{self.search_wrapper.type}:{self.search_wrapper.gl}:{self.search_wrapper.hl}:{self.search_wrapper.k}"
+                )
+            
             # LangChainツールとして定義
             self.search_tool = Tool(
                 name="web_search",
@@ -40,7 +57,7 @@ class WebSearchService:
                 This is useful when you need to find recent information, guidelines, or research papers 
                 that are not in the existing knowledge base. 
                 Input should be a search query in Japanese or English.""",
-                func=self.search_wrapper.run
+                func=self.search
             )
             
             print("Web search tool initialized successfully")
@@ -49,6 +66,7 @@ class WebSearchService:
             print(f"Error initializing web search tool: {e}")
             self.search_wrapper = None
             self.search_tool = None
+            self.cache = None
     
     def is_available(self) -> bool:
         """Web検索機能が利用可能かどうかを確認"""
@@ -60,13 +78,38 @@ class WebSearchService:
             return "Web検索機能は現在利用できません。APIキーの設定を確認してください。"
         
         try:
-            # 検索実行
-            results = self.search_wrapper.run(query)
-            return results
+            # 検索実行（キャッシュ経由で取得し、GoogleSerperAPIWrapper.run と同じ形式の文字列にする）
+            results = self.fetch_results(query)
+            return self.search_wrapper._parse_results(results)
             
         except Exception as e:
             return f"検索中にエラーが発生しました: {str(e)}"
     
+    def fetch_results(self, query: str) -> Dict[str, Any]:
+        """Serperの生のレスポンスを取得（キャッシュ有効時はキャッシュ経由）"""
+        if self.cache is not None:
+            return self.cache.get_or_fetch(query, self._request_serper)
+        return self._request_serper(query)
+    
+    def _request_serper(self, query: str) -> Dict[str, Any]:
+        """Serper APIを共有の接続プール経由で呼び出す（GoogleSerperAPIWrapper.results と同じ形式のレスポンス）"""
+        wrapper = self.search_wrapper
+        params = {"q": query, "gl": wrapper.gl, "hl": wrapper.hl, "num": wrapper.k}
+        if wrapper.tbs:
+            params["tbs"] = wrapper.tbs
+        response = http_transport.post(
+            "serper",
+            f"https://google.serper.dev/{wrapper.type}",
+            headers={"X-API-KEY": self.serper_api_key, "Content-Type": "application/json"},
+            params=params
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    def get_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """検索結果キャッシュの統計（無効時はNone）"""
+        return self.cache.get_stats() if self.cache is not None else None
+    
     def search_medical_guidelines(self, topic: str) -> str:
         """医療ガイドライン専用の検索"""
         search_query = f"{topic} 医療ガイドライン 日本 最新"
@@ -109,7 +152,7 @@ class WebSearchService:
         
         try:
             # 詳細な検索結果を取得（ソース情報含む）
-            raw_results = self.search_wrapper.results(question)
+            raw_results = self.fetch_results(question)
             
             if not raw_results or not isinstance(raw_results, dict) or not raw_results.get('organic'):
                 return "申し訳ありません、Web検索でも該当する情報が見つかりませんでした。"
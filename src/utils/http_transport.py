@@ -0,0 +1,171 @@
+# src/utils/http_transport.py
+"""
+外部連携（n8n・Serper・LINE）で共有するHTTPトランスポート
+宛先ごとにKeep-Aliveの接続プールを持つrequests.Sessionを使い回し、呼び出しのたびのTCP/TLSハンドシェイクを省く
+宛先ごとのタイムアウト・リトライ設定と、リクエスト数・エラー数・レイテンシの統計を持つ
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from linebot.http_client import RequestsHttpClient, RequestsHttpResponse
+from config import Config
+
+# リトライ対象のステータスコード（冪等な宛先のみ）
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+class HttpTransport:
+    """宛先ごとの接続プール付きSessionと統計を管理する"""
+
+    def __init__(self, pool_maxsize: int = 10):
+        """
+        Args:
+            pool_maxsize: 1ホストあたりに保持するKeep-Alive接続の最大数
+        """
+        self.pool_maxsize = max(1, pool_maxsize)
+        self._destinations: Dict[str, Dict[str, Any]] = {}
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, name: str, timeout: float = 30, retries: int = 2,
+                 backoff_factor: float = 0.3, idempotent: bool = False):
+        """
+        宛先を登録する
+
+        Args:
+            name: 宛先名（n8n, serper, lineなど）
+            timeout: 呼び出し側で指定がない場合のタイムアウト（秒）
+            retries: 接続エラー時のリトライ回数
+            backoff_factor: リトライ間隔の係数（指数バックオフ）
+            idempotent: Trueなら429/5xxの応答と読み取りエラーもリトライする（POSTを含む）
+        """
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries if idempotent else 0,
+            status=retries if idempotent else 0,
+            status_forcelist=RETRY_STATUS_CODES if idempotent else (),
+            allowed_methods=None if idempotent else Retry.DEFAULT_ALLOWED_METHODS,
+            backoff_factor=backoff_factor,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        with self._lock:
+            previous = self._sessions.get(name)
+            self._destinations[name] = {"timeout": timeout, "retries": retries, "idempotent": idempotent}
+            self._sessions[name] = session
+            self._stats.setdefault(name, {"requests": 0, "errors": 0, "total_latency": 0.0, "status_codes": {}})
+        if previous is not None:
+            previous.close()
+
+    def request(self, name: str, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        登録済みの宛先にリクエストを送る（例外は requests.exceptions のまま呼び出し側に返す）
+
+        Args:
+            name: 宛先名
+            method: HTTPメソッド
+            url: 送信先URL
+            **kwargs: requests.Session.request の引数（timeout未指定なら宛先の既定値）
+        """
+        with self._lock:
+            if name not in self._sessions:
+                raise ValueError(f"未登録のHTTP宛先です: {name}")
+            session = self._sessions[name]
+            kwargs.setdefault("timeout", self._destinations[name]["timeout"])
+
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            self._record(name, time.perf_counter() - started, None)
+            raise
+        self._record(name, time.perf_counter() - started, response.status_code)
+        return response
+
+    def get(self, name: str, url: str, **kwargs) -> requests.Response:
+        return self.request(name, "GET", url, **kwargs)
+
+    def post(self, name: str, url: str, **kwargs) -> requests.Response:
+        return self.request(name, "POST", url, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """宛先ごとのリクエスト数・エラー数・平均レイテンシを取得"""
+        with self._lock:
+            stats = {}
+            for name, values in self._stats.items():
+                requests_count = values["requests"]
+                stats[name] = {
+                    "requests": requests_count,
+                    "errors": values["errors"],
+                    "avg_latency_ms": round(values["total_latency"] / requests_count * 1000, 1) if requests_count else 0.0,
+                    "status_codes": dict(values["status_codes"]),
+                    **self._destinations.get(name, {})
+                }
+        return {"pool_maxsize": self.pool_maxsize, "destinations": stats}
+
+    def close(self):
+        """すべての接続プールを閉じる"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for session in sessions:
+            session.close()
+
+    def _record(self, name: str, latency: float, status_code: Optional[int]):
+        """統計を更新（status_codeがNoneなら通信エラー）"""
+        with self._lock:
+            values = self._stats[name]
+            values["requests"] += 1
+            values["total_latency"] += latency
+            if status_code is None or status_code >= 400:
+                values["errors"] += 1
+            if status_code is not None:
+                values["status_codes"][status_code] = values["status_codes"].get(status_code, 0) + 1
+
+class PooledLineHttpClient(RequestsHttpClient):
+    """LINE Messaging APIの呼び出しを共有トランスポートの接続プール経由にするHTTPクライアント"""
+
+    destination = "line"
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        response = http_transport.get(
+            self.destination, url, headers=headers, params=params, stream=stream,
+            timeout=self.timeout if timeout is None else timeout
+        )
+        return RequestsHttpResponse(response)
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        response = http_transport.post(
+            self.destination, url, headers=headers, data=data,
+            timeout=self.timeout if timeout is None else timeout
+        )
+        return RequestsHttpResponse(response)
+
+    def delete(self, url, headers=None, data=None, timeout=None):
+        response = http_transport.request(
+            self.destination, "DELETE", url, headers=headers, data=data,
+            timeout=self.timeout if timeout is None else timeout
+        )
+        return RequestsHttpResponse(response)
+
+    def put(self, url, headers=None, data=None, timeout=None):
+        response = http_transport.request(
+            self.destination, "PUT", url, headers=headers, data=data,
+            timeout=self.timeout if timeout is None else timeout
+        )
+        return RequestsHttpResponse(response)
+
+# プロセス全体で共有するトランスポート（LINEの返信・n8nのWebhookは非冪等のため接続エラー時のみリトライ）
+http_transport = HttpTransport(pool_maxsize=Config.HTTP_POOL_MAXSIZE)
+http_transport.register("n8n", timeout=Config.HTTP_TIMEOUT_N8N, retries=Config.HTTP_RETRIES)
+http_transport.register("serper", timeout=Config.HTTP_TIMEOUT_SERPER, retries=Config.HTTP_RETRIES, idempotent=True)
+http_transport.register("line", timeout=Config.HTTP_TIMEOUT_LINE, retries=Config.HTTP_RETRIES)
@@ -0,0 +1,106 @@
+# src/utils/keyword_matcher.py
+"""
+複数キーワードの一括マッチャー（Aho-Corasick法）
+ラベル -> キーワード一覧 の宣言的な表から起動時に1回だけオートマトンを構築し、メッセージを1文字ずつ
+1回走査するだけで一致したすべてのキーワードとラベルを返す
+（`any(k in text for k in [...])` のようにキーワードの数だけメッセージを走査し直さない）
+
+失敗遷移は構築時に状態遷移表へ展開しておき、走査中は1文字につき辞書を1回引くだけにする
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+class KeywordMatcher:
+    """ラベル付きキーワード表から構築する1パスのマッチャー"""
+
+    def __init__(self, table: Dict[str, Iterable[str]], ignore_case: bool = False):
+        """
+        Args:
+            table: ラベル -> キーワード一覧（ラベルの順序が first_label の優先順位になる）
+            ignore_case: Trueなら英字の大文字・小文字を区別しない
+        """
+        self.ignore_case = ignore_case
+        self.label_order: List[str] = list(table)
+
+        # キーワードのトライ木（状態 -> 文字 -> 次の状態）と、各状態で一致が確定する (キーワード, ラベル)
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[Set[Tuple[str, str]]] = [set()]
+        for label, keywords in table.items():
+            for keyword in keywords:
+                keyword = self._normalize(keyword)
+                if not keyword:
+                    continue
+                state = 0
+                for char in keyword:
+                    if char not in goto[state]:
+                        goto.append({})
+                        outputs.append(set())
+                        goto[state][char] = len(goto) - 1
+                    state = goto[state][char]
+                outputs[state].add((keyword, label))
+        if len(goto) == 1:
+            raise ValueError("キーワードが1つも指定されていません")
+
+        # 幅優先で失敗遷移を求め、失敗先の遷移と出力を各状態にまとめる（ルートへの遷移は省略）
+        self._transitions: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] |= outputs[fail[state]]
+            self._transitions[state] = {**self._transitions[fail[state]], **goto[state]}
+            for char, next_state in goto[state].items():
+                fail[next_state] = self._transitions[fail[state]].get(char, 0)
+                queue.append(next_state)
+        self._outputs: List[Tuple[Tuple[str, str], ...]] = [tuple(output) for output in outputs]
+
+    def scan(self, text: str) -> Dict[str, Set[str]]:
+        """
+        テキストを1回走査し、一致したキーワードをラベルごとに返す
+
+        Returns:
+            ラベル -> 一致したキーワードの集合（一致しなかったラベルは含まない）
+        """
+        hits: Dict[str, Set[str]] = {}
+        transitions, outputs = self._transitions, self._outputs
+        state = 0
+        for char in self._normalize(text):
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                for keyword, label in outputs[state]:
+                    hits.setdefault(label, set()).add(keyword)
+        return hits
+
+    def labels(self, text: str) -> Set[str]:
+        """一致したラベルの集合"""
+        return set(self.scan(text))
+
+    def first_label(self, text: str, order: Optional[Sequence[str]] = None,
+                    default: Optional[str] = None) -> Optional[str]:
+        """
+        一致したラベルのうち優先順位が最も高いものを返す（if/elifの連鎖の置き換え）
+
+        Args:
+            text: 対象テキスト
+            order: 優先順位（未指定なら表のラベル順）
+            default: どのラベルにも一致しなかった場合の値
+        """
+        hits = self.scan(text)
+        for label in order or self.label_order:
+            if label in hits:
+                return label
+        return default
+
+    def contains(self, text: str) -> bool:
+        """いずれかのキーワードを含むか（最初の一致で終了する）"""
+        transitions, outputs = self._transitions, self._outputs
+        state = 0
+        for char in self._normalize(text):
+            state = transitions[state].get(char, 0)
+            if outputs[state]:
+                return True
+        return False
+
+    def _normalize(self, text: str) -> str:
+        return text.lower() if self.ignore_case else text
@@ -0,0 +1,86 @@
+# src/utils/ttl_cache.py
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+def normalize_text(text: str) -> str:
+    """キャッシュキー用に質問文を正規化（NFKC・全角半角統一・小文字化・空白と句読点の除去）"""
+    normalized = unicodedata.normalize("NFKC", text).lower()
+    return "".join(
+        c for c in normalized
+        if not c.isspace() and unicodedata.category(c)[0] not in ("P", "Z")
+    )
+
+class TTLCache:
+    """件数上限付きのLRU + TTLキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600):
+        """
+        Args:
+            max_entries: 保持する最大件数（超過時は最も使われていないものから破棄）
+            ttl_seconds: エントリの有効秒数
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """有効なエントリを返す（なければNone）"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        """エントリを保存（ttl_seconds未指定時は既定のTTL）"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def delete(self, key: Hashable):
+        """エントリを削除"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """全エントリを削除"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """ヒット・ミス数とサイズを取得"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+イベントワーカープールの順序保証テスト
+同じユーザーのイベントは受信順に1件ずつ、異なるユーザーのイベントは並列に処理されることを確認する
+"""
+
+import sys
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from services.event_worker_pool import EventWorkerPool
+
+def make_event(user_id, sequence: int):
+    """LINEのMessageEventと同じく source.user_id を持つイベント"""
+    return SimpleNamespace(source=SimpleNamespace(user_id=user_id), sequence=sequence)
+
+class Recorder:
+    """処理順と同時実行数を記録するイベントハンドラー"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.processed = {}     # ユーザーID -> 処理した連番の列
+        self.in_flight = {}     # ユーザーID -> 処理中の件数
+        self.overlaps = []      # 同じユーザーのイベントが同時に処理された記録
+        self.running = 0
+        self.max_running = 0
+
+    def __call__(self, event):
+        user_id = event.source.user_id
+        with self.lock:
+            self.in_flight[user_id] = self.in_flight.get(user_id, 0) + 1
+            if self.in_flight[user_id] > 1:
+                self.overlaps.append((user_id, event.sequence))
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+        # 処理時間をばらつかせ、後から来たイベントが先に終わる状況を作る
+        time.sleep(random.uniform(0, self.delay))
+
+        with self.lock:
+            self.processed.setdefault(user_id, []).append(event.sequence)
+            self.in_flight[user_id] -= 1
+            self.running -= 1
+
+def test_same_user_events_keep_order():
+    recorder = Recorder()
+    pool = EventWorkerPool(recorder, num_workers=4, max_queue_size=1000)
+    pool.start()
+
+    users = [f"U{i:03d}" for i in range(8)]
+    events_per_user = 20
+    for sequence in range(events_per_user):
+        for user_id in users:
+            assert pool.submit(make_event(user_id, sequence))
+
+    assert pool.shutdown(timeout=30), "時間内に処理が終わりません"
+    print(f"📊 最大同時処理数: {recorder.max_running}")
+    assert not recorder.overlaps, f"同じユーザーのイベントが並行処理されています: {recorder.overlaps[:5]}"
+    for user_id in users:
+        assert recorder.processed[user_id] == list(range(events_per_user)), f"{user_id} の処理順が入れ替わっています"
+    assert recorder.max_running > 1, "異なるユーザーのイベントが並列に処理されていません"
+    assert recorder.max_running <= 4, "ワーカー数の上限を超えて処理しています"
+
+def test_single_user_burst_does_not_block_others():
+    recorder = Recorder(delay=0.05)
+    pool = EventWorkerPool(recorder, num_workers=2, max_queue_size=100)
+    pool.start()
+
+    for sequence in range(20):
+        pool.submit(make_event("U-busy", sequence))
+    started = time.monotonic()
+    pool.submit(make_event("U-quiet", 0))
+    # 混雑しているユーザーのレーンが空くのを待たずに処理される
+    while "U-quiet" not in recorder.processed and time.monotonic() - started < 5:
+        time.sleep(0.01)
+    waited = time.monotonic() - started
+    print(f"⏱️ 別ユーザーの待ち時間: {waited:.2f}秒")
+    assert "U-quiet" in recorder.processed and waited < 0.5, "1人の連投で他のユーザーが待たされています"
+    assert pool.shutdown(timeout=30)
+    assert recorder.processed["U-busy"] == list(range(20))
+
+def test_backlog_limit_and_shutdown():
+    release = threading.Event()
+    pool = EventWorkerPool(lambda event: release.wait(5), num_workers=1, max_queue_size=3)
+    pool.start()
+
+    accepted = [pool.submit(make_event("U001", 0))]
+    while pool.get_stats()["in_flight"] == 0:
+        time.sleep(0.01)
+    accepted += [pool.submit(make_event("U001", sequence)) for sequence in range(1, 5)]
+    stats = pool.get_stats()
+    print(f"📊 {stats}")
+    # 1件は処理中、3件が待ち行列、残りは満杯で拒否される
+    assert accepted.count(True) == 4 and stats["rejected"] == 1
+    assert stats["queue_depth"] == 3 and stats["in_flight"] == 1
+    assert stats["lanes"][0]["key"] == "U001" and stats["lanes"][0]["backlog"] == 3
+
+    release.set()
+    assert pool.shutdown(timeout=10), "停止時に受付済みのイベントを処理し終えていません"
+    assert pool.get_stats()["processed"] == 4
+    assert not pool.submit(make_event("U001", 99)), "停止後もイベントを受け付けています"
+
+if __name__ == "__main__":
+    print("🧪 イベント順序保証テスト開始")
+    print("=" * 50)
+    test_same_user_events_keep_order()
+    test_single_user_burst_does_not_block_others()
+    test_backlog_limit_and_shutdown()
+    print("✅ イベント順序保証テスト完了")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+n8nアウトボックスのテスト
+ローカルのHTTPサーバーをWebhookの代わりに立て、重複登録の抑止・5xxの指数バックオフ・
+4xxのデッドレター行き・デッドレターの再送を確認する
+"""
+
+import sys
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+
+from services.n8n_outbox import N8NOutbox
+
+class FakeWebhook:
+    """パスごとに返すステータスコードを順に指定できるWebhookサーバー"""
+
+    def __init__(self):
+        self.responses = {}  # パス -> 返すステータスコードの列（使い切ったら最後の値を返し続ける）
+        self.requests = []   # (パス, 受信時刻)
+        webhook = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                webhook.requests.append((self.path, time.monotonic()))
+                codes = webhook.responses.get(self.path, [200])
+                status = codes.pop(0) if len(codes) > 1 else codes[0]
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}{path}"
+
+    def times(self, path: str):
+        return [received for request_path, received in self.requests if request_path == path]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def wait_until(predicate, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+def create_outbox(directory: str, **kwargs) -> N8NOutbox:
+    options = {"max_attempts": 4, "base_delay": 0.2, "max_delay": 2, "dedup_seconds": 600}
+    options.update(kwargs)
+    return N8NOutbox(db_path=os.path.join(directory, "outbox.sqlite3"), **options)
+
+def test_duplicate_enqueue_is_skipped():
+    webhook = FakeWebhook()
+    with tempfile.TemporaryDirectory() as directory:
+        outbox = create_outbox(directory)
+        try:
+            payload = {"to": "tanaka@example.com", "subject": "侍のパスワード"}
+            first_id, first_new = outbox.enqueue("email", webhook.url("/email"), payload)
+            second_id, second_new = outbox.enqueue("email", webhook.url("/email"), payload)
+            assert first_new and not second_new, "同じ送信が二重に登録されています"
+            assert first_id == second_id, "重複時は最初の登録IDを返す必要があります"
+
+            # 内容が違えば別の送信として登録される
+            other_id, other_new = outbox.enqueue("email", webhook.url("/email"), {**payload, "subject": "別件"})
+            assert other_new and other_id != first_id
+
+            assert wait_until(lambda: outbox.get_stats()["delivered"] == 2), "配送が完了しません"
+            stats = outbox.get_stats()
+            print(f"📊 {stats}")
+            assert stats["enqueued"] == 2 and stats["duplicates"] == 1
+            assert len(webhook.times("/email")) == 2, "重複登録分が送信されています"
+        finally:
+            outbox.stop()
+            webhook.close()
+
+def test_dedup_window_expires():
+    webhook = FakeWebhook()
+    with tempfile.TemporaryDirectory() as directory:
+        outbox = create_outbox(directory, dedup_seconds=0.3)
+        try:
+            payload = {"task": "月次レポート"}
+            first_id, _ = outbox.enqueue("task", webhook.url("/task"), payload)
+            time.sleep(0.4)
+            second_id, second_new = outbox.enqueue("task", webhook.url("/task"), payload)
+            assert second_new and second_id != first_id, "重複判定の期間を過ぎても登録できません"
+        finally:
+            outbox.stop()
+            webhook.close()
+
+def test_server_error_is_retried_with_backoff():
+    webhook = FakeWebhook()
+    webhook.responses["/flaky"] = [503, 502, 200]
+    with tempfile.TemporaryDirectory() as directory:
+        outbox = create_outbox(directory)
+        try:
+            entry_id, _ = outbox.enqueue("email", webhook.url("/flaky"), {"subject": "再送テスト"})
+            assert wait_until(lambda: outbox.get_stats()["delivered"] == 1), "再送後に配送されません"
+
+            times = webhook.times("/flaky")
+            gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+            print(f"⏱️ 再送間隔: {[round(gap, 2) for gap in gaps]}")
+            assert len(times) == 3
+            # 1回目は base_delay、2回目はその倍（揺らぎは±20%）
+            assert gaps[0] >= 0.2 * 0.8 and gaps[1] >= 0.4 * 0.8, "指数バックオフになっていません"
+
+            entry = next(entry for entry in outbox.list_entries() if entry["id"] == entry_id)
+            assert entry["status"] == "delivered" and entry["attempts"] == 3
+            assert outbox.get_stats()["failed_attempts"] == 2
+        finally:
+            outbox.stop()
+            webhook.close()
+
+def test_client_error_goes_to_dead_letters_and_replays():
+    webhook = FakeWebhook()
+    webhook.responses["/broken"] = [400, 200]
+    with tempfile.TemporaryDirectory() as directory:
+        outbox = create_outbox(directory)
+        try:
+            entry_id, _ = outbox.enqueue("email", webhook.url("/broken"), {"subject": "宛先誤り"})
+            assert wait_until(lambda: outbox.get_stats()["dead_letters"] == 1), "4xxがデッドレターに移りません"
+
+            # 4xxは再送しても成功しないため、1回で打ち切る
+            assert len(webhook.times("/broken")) == 1
+            dead_letter = outbox.list_dead_letters()[0]
+            print(f"💀 {dead_letter}")
+            assert dead_letter["outbox_id"] == entry_id and dead_letter["attempts"] == 1
+            assert dead_letter["last_error"].startswith("HTTP 400")
+            assert dead_letter["payload"] == {"subject": "宛先誤り"}
+            assert outbox.get_stats()["pending"] == 0
+
+            # Webhook側を直したあとにデッドレターを再送する
+            replayed_id = outbox.replay_dead_letter(dead_letter["id"])
+            assert replayed_id is not None and replayed_id != entry_id
+            assert wait_until(lambda: outbox.get_stats()["delivered"] == 1), "再送したデッドレターが配送されません"
+            stats = outbox.get_stats()
+            assert stats["dead_letters"] == 0 and stats["replayed"] == 1
+            assert outbox.replay_dead_letter(dead_letter["id"]) is None, "同じデッドレターを二度再送できます"
+        finally:
+            outbox.stop()
+            webhook.close()
+
+def test_too_many_requests_is_retried():
+    webhook = FakeWebhook()
+    webhook.responses["/busy"] = [429, 200]
+    with tempfile.TemporaryDirectory() as directory:
+        outbox = create_outbox(directory)
+        try:
+            outbox.enqueue("email", webhook.url("/busy"), {"subject": "混雑"})
+            assert wait_until(lambda: outbox.get_stats()["delivered"] == 1), "429の後に再送されません"
+            assert outbox.get_stats()["dead_letters"] == 0
+        finally:
+            outbox.stop()
+            webhook.close()
+
+if __name__ == "__main__":
+    print("🧪 n8nアウトボックステスト開始")
+    print("=" * 50)
+    test_duplicate_enqueue_is_skipped()
+    test_dedup_window_expires()
+    test_server_error_is_retried_with_backoff()
+    test_client_error_goes_to_dead_letters_and_replays()
+    test_too_many_requests_is_retried()
+    print("✅ n8nアウトボックステスト完了")